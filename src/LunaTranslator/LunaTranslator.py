@@ -1,5 +1,5 @@
 import time, uuid
-import os, threading, re, winreg, copy
+import os, threading, re, winreg
 from qtsymbols import *
 from traceback import print_exc
 from sometypes import TranslateResult, TranslateError, WordSegResult
@@ -312,7 +312,9 @@ class MAINUI:
         waitforresultcallbackengine_force=False,
         erroroutput=None,
         donttrans=False,
+        waitforresultcallbackend=None,
     ):
+        # waitforresultcallbackend：流式输出的中间结果也回调，且所有翻译器结束后调用一次waitforresultcallbackend()
         with self.solvegottextlock:
             succ = self.textgetmethod_1(
                 text,
@@ -322,9 +324,12 @@ class MAINUI:
                 waitforresultcallbackengine_force,
                 erroroutput,
                 donttrans,
+                waitforresultcallbackend,
             )
             if waitforresultcallback and not succ:
                 waitforresultcallback(TranslateResult())
+                if waitforresultcallbackend:
+                    waitforresultcallbackend()
 
     def __erroroutput(self, klass, erroroutput, e, t):
 
@@ -343,6 +348,7 @@ class MAINUI:
         waitforresultcallbackengine_force=False,
         erroroutput=None,
         donttrans=False,
+        waitforresultcallbackend=None,
     ):
         if not text:
             return
@@ -490,6 +496,7 @@ class MAINUI:
                 result=maybehaspremt.get(engine),
                 read_trans_once_check=read_trans_once_check,
                 erroroutput=erroroutput,
+                waitforresultcallbackend=waitforresultcallbackend,
             )
         return True
 
@@ -530,6 +537,7 @@ class MAINUI:
         result,
         read_trans_once_check: list,
         erroroutput,
+        waitforresultcallbackend=None,
     ):
         callback = partial(
             self.GetTranslationCallback,
@@ -542,6 +550,7 @@ class MAINUI:
             text,
             read_trans_once_check,
             erroroutput,
+            waitforresultcallbackend,
         )
         task = (
             callback,
@@ -558,10 +567,12 @@ class MAINUI:
 
             self.translators[engine].gettask(task)
 
-    def __safecallback(self, waitforresultcallback, klass, result=None):
+    def __safecallback(
+        self, waitforresultcallback, klass, result=None, iter_res_status=0
+    ):
         if not waitforresultcallback:
             return
-        waitforresultcallback(TranslateResult(klass, result))
+        waitforresultcallback(TranslateResult(klass, result, iter_res_status))
 
     def GetTranslationCallback(
         self,
@@ -574,89 +585,132 @@ class MAINUI:
         contentraw,
         read_trans_once_check: list,
         erroroutput,
+        waitforresultcallbackend,
         res: str,
         iter_res_status,
         iserror=False,
     ):
         with self.gettranslatelock:
-            if classname in usefultranslators:
+            finished = False
+            # 流式输出的中间结果不算结束
+            if (classname in usefultranslators) and (iserror or iter_res_status != 1):
                 usefultranslators.remove(classname)
-            if (
-                waitforresultcallback is None
-                and currentsignature != self.currentsignature
-            ):
-                return
+                finished = len(usefultranslators) == 0
+            try:
+                self.__gettranslationcallback(
+                    usefultranslators,
+                    waitforresultcallback,
+                    classname,
+                    currentsignature,
+                    optimization_params,
+                    _showrawfunction,
+                    contentraw,
+                    read_trans_once_check,
+                    erroroutput,
+                    waitforresultcallbackend,
+                    res,
+                    iter_res_status,
+                    iserror,
+                )
+            finally:
+                # 每个翻译器只会被移除一次，所以只有最后一个结束的翻译器会通知
+                if finished and waitforresultcallbackend:
+                    waitforresultcallbackend()
 
-            safe_callback = functools.partial(
-                self.__safecallback, waitforresultcallback, classname
-            )
-            __erroroutput = functools.partial(
-                self.__erroroutput, classname, erroroutput
-            )
-            if iserror:
-                if erroroutput or (currentsignature == self.currentsignature):
-                    __erroroutput(res, TextType.Error_translator)
-                if len(usefultranslators) == 0:
-                    safe_callback()
-                return
+    def __gettranslationcallback(
+        self,
+        usefultranslators: list,
+        waitforresultcallback,
+        classname,
+        currentsignature,
+        optimization_params,
+        _showrawfunction,
+        contentraw,
+        read_trans_once_check: list,
+        erroroutput,
+        waitforresultcallbackend,
+        res: str,
+        iter_res_status,
+        iserror,
+    ):
+        if (
+            waitforresultcallback is None
+            and currentsignature != self.currentsignature
+        ):
+            return
 
-            res = self.solveaftertrans(res, optimization_params)
-            if not res:
-                if len(usefultranslators) == 0:
-                    safe_callback()
-                return
-            needshowraw = (
-                _showrawfunction
-                and self.refresh_on_get_trans_signature != _showrawfunction
+        safe_callback = functools.partial(
+            self.__safecallback, waitforresultcallback, classname
+        )
+        __erroroutput = functools.partial(
+            self.__erroroutput, classname, erroroutput
+        )
+        if iserror:
+            if erroroutput or (currentsignature == self.currentsignature):
+                __erroroutput(res, TextType.Error_translator)
+            if len(usefultranslators) == 0:
+                safe_callback()
+            return
+
+        res = self.solveaftertrans(res, optimization_params)
+        if not res:
+            if len(usefultranslators) == 0:
+                safe_callback()
+            return
+        needshowraw = (
+            _showrawfunction
+            and self.refresh_on_get_trans_signature != _showrawfunction
+        )
+        if needshowraw:
+            self.refresh_on_get_trans_signature = _showrawfunction
+            _showrawfunction()
+        if waitforresultcallbackend and (iter_res_status == 1):
+            safe_callback(res, 1)
+        if (
+            (currentsignature == self.currentsignature)
+            and (iter_res_status in (0, 1))
+            and (not waitforresultcallback)
+        ):
+            displayreskwargs = dict(
+                name=_TR(dynamicapiname(classname)),
+                color=TranslateColor(classname),
+                res=res,
+                iter_context=(iter_res_status, classname),
+                klass=classname,
             )
-            if needshowraw:
-                self.refresh_on_get_trans_signature = _showrawfunction
-                _showrawfunction()
-            if (
-                (currentsignature == self.currentsignature)
-                and (iter_res_status in (0, 1))
-                and (not waitforresultcallback)
-            ):
-                displayreskwargs = dict(
-                    name=_TR(dynamicapiname(classname)),
-                    color=TranslateColor(classname),
-                    res=res,
-                    iter_context=(iter_res_status, classname),
-                    klass=classname,
-                )
-                self.translation_ui.displayres.emit(displayreskwargs)
-            if iter_res_status in (0, 2):  # 0为普通，1为iter，2为iter终止
+            self.translation_ui.displayres.emit(displayreskwargs)
+        if iter_res_status in (0, 2):  # 0为普通，1为iter，2为iter终止
 
-                self.transhis.getnewtranssignal.emit(
-                    _TR(dynamicapiname(classname)), res
-                )
-                if not waitforresultcallback:
-                    if (
-                        globalconfig["read_trans"]
-                        and (not read_trans_once_check)
-                        and (
-                            (globalconfig["toppest_translator"] == classname)
-                            or ((not globalconfig["toppest_translator"]))
-                        )
-                    ):
-                        self.currentread = res
-                        self.currentread_from_origin = False
-                        self.readcurrent()
-                        read_trans_once_check.append(classname)
+            self.transhis.getnewtranssignal.emit(
+                _TR(dynamicapiname(classname)), res
+            )
+            if not waitforresultcallback:
+                if (
+                    globalconfig["read_trans"]
+                    and (not read_trans_once_check)
+                    and (
+                        (globalconfig["toppest_translator"] == classname)
+                        or ((not globalconfig["toppest_translator"]))
+                    )
+                ):
+                    self.currentread = res
+                    self.currentread_from_origin = False
+                    self.readcurrent()
+                    read_trans_once_check.append(classname)
 
-                    self.dispatchoutputer(res, False)
-                try:
-                    self.textsource.sqlqueueput((contentraw, classname, res))
-                except:
-                    pass
-                try:
-                    gobject.edittrans.dispatch.emit(classname, res)
-                except:
-                    pass
-                if len(self.currenttranslate):
-                    self.currenttranslate += "\n"
-                self.currenttranslate += res
-                safe_callback(res)
+                self.dispatchoutputer(res, False)
+            try:
+                self.textsource.sqlqueueput((contentraw, classname, res))
+            except:
+                pass
+            try:
+                gobject.edittrans.dispatch.emit(classname, res)
+            except:
+                pass
+            if len(self.currenttranslate):
+                self.currenttranslate += "\n"
+            self.currenttranslate += res
+            safe_callback(res, iter_res_status)
 
     def __usewhich(self):
 
@@ -672,14 +726,15 @@ class MAINUI:
                 )
                 tts_skip_merge = savehook_new_data[gameuid].get("tts_skip_merge", False)
                 if tts_skip_merge or tts_repair_merge:
+                    # 只读，不需要深拷贝，这样规则的dict保持不变，parsemayberegexreplace可以复用缓存
                     _this = {"tts_repair_regex": [], "tts_skip_regex": []}
-                    _this.update(copy.deepcopy(savehook_new_data[gameuid]))
+                    _this.update(savehook_new_data[gameuid])
                     if tts_repair_merge:
-                        _ = copy.deepcopy(globalconfig["ttscommon"]["tts_repair_regex"])
-                        _this["tts_repair_regex"] += _
+                        _ = globalconfig["ttscommon"]["tts_repair_regex"]
+                        _this["tts_repair_regex"] = _this["tts_repair_regex"] + _
                     if tts_skip_merge:
-                        _ = copy.deepcopy(globalconfig["ttscommon"]["tts_skip_regex"])
-                        _this["tts_skip_regex"] += _
+                        _ = globalconfig["ttscommon"]["tts_skip_regex"]
+                        _this["tts_skip_regex"] = _this["tts_skip_regex"] + _
                     return _this
                 return savehook_new_data[gameuid]
         except:
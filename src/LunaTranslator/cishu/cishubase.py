@@ -1,9 +1,9 @@
 from myutils.config import globalconfig
-from myutils.wrapper import threader
+from myutils.wrapper import pooled
 from traceback import print_exc
-from myutils.utils import SafeFormatter
+from myutils.utils import SafeFormatter, LRUCache
 from myutils.commonbase import commonbase
-import re, uuid
+import re, uuid, hashlib
 from tinycss2 import parse_stylesheet, serialize
 from tinycss2.ast import (
     WhitespaceToken,
@@ -14,6 +14,15 @@ from tinycss2.ast import (
 )
 
 
+# 限定作用域之后的样式表，按(divclass, 原样式表的md5)缓存，所有词典共用，按总长度限制大小。
+# 同一个词典每次查词用的都是同一份样式表，解析和改写只需要做一次
+scopedstylesheets = LRUCache(16 * 1024 * 1024, sizeof=len)
+
+
+def stylesheetkey(file_content: str, divclass: str):
+    return divclass, hashlib.md5(file_content.encode("utf8", "surrogatepass")).digest()
+
+
 class DictTree:
     def text(self) -> str: ...
     def childrens(self) -> list: ...
@@ -40,7 +49,7 @@ class cishubase(commonbase):
     _globalconfig_key = "cishu"
     _setting_dict = globalconfig["cishu"]
 
-    @threader
+    @pooled("io")
     def safesearch(self, sentence, callback):
         try:
             if self.needinit:
@@ -139,13 +148,21 @@ class cishubase(commonbase):
             _divclass = divclass
         if file_content.startswith("<style>") and file_content.endswith("</style>"):
             file_content = file_content[7:-8]
-        try:
-            rules = parse_stylesheet(file_content, True, True)
-            file_content = serialize(self.__parserules(rules, _divclass))
-            # print(file_content)
-        except:
+        # 随机的divclass不会再次用到，不缓存
+        key = None if divclass is None else stylesheetkey(file_content, divclass)
+        cached = scopedstylesheets.get(key) if key else None
+        if cached is not None:
+            file_content = cached
+        else:
+            try:
+                rules = parse_stylesheet(file_content, True, True)
+                file_content = serialize(self.__parserules(rules, _divclass))
+                # print(file_content)
+                if key:
+                    scopedstylesheets.put(key, file_content)
+            except:
 
-            print_exc()
+                print_exc()
         if divclass is None:
             return file_content, _divclass
         else:
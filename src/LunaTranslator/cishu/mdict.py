@@ -5,150 +5,226 @@ from traceback import print_exc
 from myutils.audioplayer import bass_code_cast
 import json, os, re
 from cishu.mdict_.readmdict import MDX, MDD, MDict
-import hashlib, sqlite3, functools
+from cishu.mdict_ import buildindex
+import hashlib, sqlite3, functools, threading, time
 import winsharedutils
+from myutils.wrapper import pooled
 from myutils.mimehelper import query_mime
 
 
 class IndexBuilder(object):
     # todo: enable history
-    def checkinfo(self, fn):
+    # MDX_INDEX的版本，见buildindex和migrateindex
+    indexversion = buildindex.indexversion
+    # IN (...) 中一次最多放入的参数个数，旧版sqlite的上限是999
+    querychunk = 500
+    indexcolumns = "file_pos,compressed_size,decompressed_size,record_start,record_end,offset"
+    # 模糊查询索引的版本，版本变化时重建
+    fuzzyversion = 1
+    fuzzybatchsize = 10000
+    # 模糊查询索引建立失败后，隔这么多秒才会再次尝试
+    fuzzyretryinterval = 600
+
+    foldkey = staticmethod(buildindex.foldkey)
+
+    @staticmethod
+    def checkinfo(fn):
         return "{}_{}".format(os.path.getmtime(fn), os.path.getsize(fn))
 
-    def checkneedupdate(self, md, db):
+    @staticmethod
+    def checkneedupdate(md, db):
         if not os.path.isfile(db):
             return True
         need = True
         try:
             with open(db + ".txt", "r") as ff:
-                need = self.checkinfo(md) != ff.read()
+                need = IndexBuilder.checkinfo(md) != ff.read()
         except:
             pass
         return need
 
-    def checkneedupdateafter(self, md, db):
+    @staticmethod
+    def checkneedupdateafter(md, db):
         with open(db + ".txt", "w") as ff:
-            ff.write(self.checkinfo(md))
+            ff.write(IndexBuilder.checkinfo(md))
+
+    @staticmethod
+    def indexbase(fname):
+        _filename = os.path.splitext(fname)[0]
+        _mdxmd5 = (
+            os.path.basename(_filename)
+            + "_"
+            + hashlib.md5(_filename.encode("utf8")).hexdigest()
+        )
+        return gobject.getcachedir("mdict/index/" + _mdxmd5)
+
+    @staticmethod
+    def mddfiles(_filename):
+        i = 0
+        while True:
+            extra = "" if i == 0 else ".%d" % i
+            i += 1
+            end = extra + ".mdd"
+            if os.path.isfile(_filename + end):
+                yield end
+            else:
+                break
+
+    @staticmethod
+    def pendingindexes(fname):
+        # 需要（重新）建立的索引，[(mdx或mdd文件, db, ismdx)]
+        _filename = os.path.splitext(fname)[0]
+        _targetfilenamebase = IndexBuilder.indexbase(fname)
+        tasks = []
+        db_name = _targetfilenamebase + ".mdx.v3.db"
+        if IndexBuilder.checkneedupdate(fname, db_name):
+            tasks.append((fname, db_name, True))
+        for end in IndexBuilder.mddfiles(_filename):
+            db_name = _targetfilenamebase + end + ".v3.db"
+            if IndexBuilder.checkneedupdate(_filename + end, db_name):
+                tasks.append((_filename + end, db_name, False))
+        return tasks
 
     def __init__(
         self,
         fname,
         passcode=None,
         enable_history=False,
+        progress=None,
     ):
 
         self._mdx_file = fname
+        # progress(fname, done, total)，建立索引时报告进度
+        self._progress = progress
         self._mdict_mdds = []
         self._mdd_dbs = []
+        # 每个db一个常驻的只读连接，多个线程共用，用锁保护
+        self._conns = {}
+        self._connslock = threading.Lock()
+        # 模糊查询索引在第一次需要时于后台建立，建好之前用旧的LIKE查询
+        self._fuzzylock = threading.Lock()
+        self._fuzzyready = False
+        self._fuzzybuilding = False
+        self._fuzzyfailtime = None
         _filename, _file_extension = os.path.splitext(fname)
         assert _file_extension == ".mdx"
         assert os.path.isfile(fname)
         self._mdict = MDX(fname, substyle=True)
-        _mdxmd5 = (
-            os.path.basename(_filename)
-            + "_"
-            + hashlib.md5(_filename.encode("utf8")).hexdigest()
-        )
-        _targetfilenamebase = gobject.getcachedir("mdict/index/" + _mdxmd5)
+        _targetfilenamebase = self.indexbase(fname)
         self._mdx_db = _targetfilenamebase + ".mdx.v3.db"
+        self._fuzzy_db = _targetfilenamebase + ".mdx.v3.fuzzy.db"
         # make index anyway
 
         self._make_mdx_index_checked(self._mdx_db)
         self.makemdds(_filename, _targetfilenamebase)
 
     def makemdds(self, _filename, _targetfilenamebase):
-        i = 0
-        while True:
-            extra = "" if i == 0 else ".%d" % i
-            i += 1
-            end = extra + ".mdd"
-            if os.path.isfile(_filename + end):
-                mdd = MDD(_filename + end)
-                self._mdict_mdds.append(mdd)
-                self._mdd_dbs.append(_targetfilenamebase + end + ".v3.db")
-                self._make_mdd_index_checked(mdd, self._mdd_dbs[-1])
-            else:
-                break
+        for end in self.mddfiles(_filename):
+            mdd = MDD(_filename + end)
+            self._mdict_mdds.append(mdd)
+            self._mdd_dbs.append(_targetfilenamebase + end + ".v3.db")
+            self._make_mdd_index_checked(mdd, self._mdd_dbs[-1])
 
     def _make_mdd_index_checked(self, mdd: MDD, db_name):
         if self.checkneedupdate(mdd._fname, db_name):
             self._make_mdict_index(mdd, db_name, False)
             self.checkneedupdateafter(mdd._fname, db_name)
+        else:
+            self.migrateindex(db_name)
 
     def _make_mdx_index_checked(self, db_name):
         if self.checkneedupdate(self._mdx_file, db_name):
             self._make_mdict_index(self._mdict, db_name, True)
             self.checkneedupdateafter(self._mdx_file, db_name)
+        else:
+            self.migrateindex(db_name)
 
-    def _make_mdict_index(self, mdd: MDict, db_name, ismdx):
-        if os.path.exists(db_name):
-            os.remove(db_name)
-        mdd._key_list = mdd._read_keys()
-        index_list = list(mdd.items())
+    def migrateindex(self, db_name):
         conn = sqlite3.connect(db_name)
-        c = conn.cursor()
-        c.execute(
-            """ CREATE TABLE MDX_INDEX
-               (key_text text not null{},
-                file_pos integer,
-                compressed_size integer,
-                decompressed_size integer,
-                record_start integer,
-                record_end integer,
-                offset integer
-                )""".format(
-                " unique" if (not ismdx) else ""
-            )
-        )
-        tuple_list = [
-            (
-                item["key_text"],
-                item["file_pos"],
-                item["compressed_size"],
-                item["decompressed_size"],
-                item["record_start"],
-                item["record_end"],
-                item["offset"],
-            )
-            for item in index_list
-        ]
-        c.executemany("INSERT INTO MDX_INDEX VALUES (?,?,?,?,?,?,?)", tuple_list)
-
-        c.execute(
-            """
-                CREATE{} INDEX key_index ON MDX_INDEX (key_text)
-                """.format(
-                " UNIQUE" if (not ismdx) else ""
+        try:
+            version = conn.execute("PRAGMA user_version;").fetchone()[0]
+            if version >= self.indexversion:
+                return
+            columns = [_[1] for _ in conn.execute("PRAGMA table_info(MDX_INDEX);")]
+            if "key_fold" not in columns:
+                conn.create_function("foldkey", 1, self.foldkey)
+                conn.execute("ALTER TABLE MDX_INDEX ADD COLUMN key_fold text")
+                conn.execute("UPDATE MDX_INDEX SET key_fold = foldkey(key_text)")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS key_fold_index ON MDX_INDEX (key_fold)"
             )
-        )
+            conn.execute("PRAGMA user_version={};".format(self.indexversion))
+            conn.commit()
+        except:
+            print_exc()
+        finally:
+            conn.close()
 
-        conn.commit()
-        conn.close()
+    def _make_mdict_index(self, mdd: MDict, db_name, ismdx):
+        buildindex.make_mdict_index(mdd, db_name, ismdx, self._progress)
+
+    def close(self):
+        # 词典列表重新加载时调用，释放文件映射和数据库连接，之后词典文件可以被替换或删除
+        self._mdict.close()
+        for mdd in self._mdict_mdds:
+            mdd.close()
+        with self._connslock:
+            conns = list(self._conns.values())
+            self._conns.clear()
+        for conn, lock in conns:
+            with lock:
+                conn.close()
 
     def get_mdx_by_index(self, index):
         data = self._mdict.read_records(index)
         record = self._mdict._treat_record_data(data)
         return record
 
+    def _connect(self, db):
+        with self._connslock:
+            if db not in self._conns:
+                conn = sqlite3.connect(db, check_same_thread=False)
+                conn.execute("PRAGMA query_only=ON;")
+                self._conns[db] = (conn, threading.Lock())
+            return self._conns[db]
+
+    def _query(self, db, sql, args=()):
+        conn, lock = self._connect(db)
+        with lock:
+            return conn.execute(sql, args).fetchall()
+
+    @staticmethod
+    def _toindex(result):
+        return dict(
+            file_pos=result[0],
+            compressed_size=result[1],
+            decompressed_size=result[2],
+            record_start=result[3],
+            record_end=result[4],
+            offset=result[5],
+        )
+
     def lookup_indexes(self, db, keyword, ignorecase=None):
-        indexes = []
         if ignorecase:
-            sql = 'SELECT * FROM MDX_INDEX WHERE lower(key_text) = lower("{}")'.format(
-                keyword
-            )
+            sql = "SELECT {} FROM MDX_INDEX WHERE key_fold = ?"
+            keyword = self.foldkey(keyword)
         else:
-            sql = 'SELECT * FROM MDX_INDEX WHERE key_text = "{}"'.format(keyword)
-        with sqlite3.connect(db) as conn:
-            cursor = conn.execute(sql)
-            for result in cursor:
-                index = {}
-                index["file_pos"] = result[1]
-                index["compressed_size"] = result[2]
-                index["decompressed_size"] = result[3]
-                index["record_start"] = result[4]
-                index["record_end"] = result[5]
-                index["offset"] = result[6]
-                indexes.append(index)
+            sql = "SELECT {} FROM MDX_INDEX WHERE key_text = ?"
+        results = self._query(db, sql.format(self.indexcolumns), (keyword,))
+        return [self._toindex(result) for result in results]
+
+    def lookup_indexes_many(self, db, keywords: list):
+        # 一次查出多个key，返回 key -> [index]
+        indexes = {}
+        for i in range(0, len(keywords), self.querychunk):
+            chunk = keywords[i : i + self.querychunk]
+            sql = "SELECT key_text,{} FROM MDX_INDEX WHERE key_text IN ({})".format(
+                self.indexcolumns, ",".join("?" * len(chunk))
+            )
+            for result in self._query(db, sql, chunk):
+                if result[0] not in indexes:
+                    indexes[result[0]] = []
+                indexes[result[0]].append(self._toindex(result[1:]))
         return indexes
 
     def mdx_lookup(self, keyword, ignorecase=None):
@@ -166,22 +242,189 @@ class IndexBuilder(object):
                 lookup_result_list.append(self._mdict_mdds[i].read_records(index))
         return lookup_result_list
 
-    @staticmethod
-    def get_keys(db, query=""):
+    def mdd_lookup_many(self, keywords):
+        # 一个词条里引用的所有资源一起查，每个mdd只查一次；和mdd_lookup(..)[0]一样，取最先找到的
+        # 找不到的为None
+        results = {}
+        remain = list(set(keywords))
+        for i in range(len(self._mdict_mdds)):
+            if not remain:
+                break
+            indexes = self.lookup_indexes_many(self._mdd_dbs[i], remain)
+            for keyword, _indexes in indexes.items():
+                results[keyword] = self._mdict_mdds[i].read_records(_indexes[0])
+            remain = [_ for _ in remain if _ not in indexes]
+        for keyword in remain:
+            results[keyword] = None
+        return results
+
+    def get_keys(self, db, query=""):
         if not db:
             return []
-        if query:
+        if not query:
+            results = self._query(db, "SELECT key_text FROM MDX_INDEX")
+        elif ("*" in query) or ("%" in query) or ("_" in query):
+            # 和以前一样，%和_是LIKE的通配符，没有*时仍然是前缀查询
             if "*" in query:
                 query = query.replace("*", "%")
             else:
                 query = query + "%"
-            sql = 'SELECT key_text FROM MDX_INDEX WHERE key_text LIKE "' + query + '"'
+            results = self._query(
+                db, "SELECT key_text FROM MDX_INDEX WHERE key_text LIKE ?", (query,)
+            )
+        else:
+            # 前缀查询，LIKE不区分大小写，所以用key_fold的范围查询代替，可以走索引
+            query = self.foldkey(query)
+            results = self._query(
+                db,
+                "SELECT key_text FROM MDX_INDEX WHERE key_fold >= ? AND key_fold < ?",
+                (query, query + "\U0010ffff"),
+            )
+        return [item[0] for item in results]
+
+    @staticmethod
+    def grams(text: str):
+        # 首尾补位，使单字符的词也有二元组，且每次编辑最多使2个二元组不再共有
+        text = "\0" + text + "\0"
+        return set(text[i : i + 2] for i in range(len(text) - 1))
+
+    def checkfuzzyneedupdate(self):
+        if self.checkneedupdate(self._mdx_file, self._fuzzy_db):
+            return True
+        try:
+            conn = sqlite3.connect(self._fuzzy_db)
+            try:
+                version = conn.execute("PRAGMA user_version;").fetchone()[0]
+            finally:
+                conn.close()
+        except:
+            return True
+        return version != self.fuzzyversion
+
+    def fuzzyneedbuild(self):
+        if self._fuzzyready or self._fuzzybuilding:
+            return False
+        if self._fuzzyfailtime is None:
+            return True
+        return time.time() - self._fuzzyfailtime >= self.fuzzyretryinterval
+
+    def makefuzzyindex(self):
+        with self._fuzzylock:
+            if not self.fuzzyneedbuild():
+                return
+            self._fuzzybuilding = True
+        try:
+            if self.checkfuzzyneedupdate():
+                self._make_fuzzy_index(self._fuzzy_db)
+                self.checkneedupdateafter(self._mdx_file, self._fuzzy_db)
+            self._fuzzyready = True
+            self._fuzzyfailtime = None
+        except:
+            print_exc()
+            self._fuzzyfailtime = time.time()
+        finally:
+            self._fuzzybuilding = False
+
+    @pooled("io")
+    def makefuzzyindexasync(self):
+        self.makefuzzyindex()
+
+    def _make_fuzzy_index(self, db_name):
+        # KEYS：不重复的词头及其长度
+        # POSTINGS：二元组 -> 含有它的词头
+        # GRAMS：每个二元组出现在多少个词头中，查询时只取最少见的几个二元组的倒排表
+        with self._connslock:
+            old = self._conns.pop(db_name, None)
+        if old:
+            old[0].close()
+        if os.path.exists(db_name):
+            os.remove(db_name)
+        keys = [
+            _[0]
+            for _ in self._query(self._mdx_db, "SELECT DISTINCT key_text FROM MDX_INDEX")
+        ]
+        conn = sqlite3.connect(db_name)
+        try:
+            conn.execute("PRAGMA synchronous=OFF;")
+            conn.execute(
+                "CREATE TABLE KEYS (id INTEGER PRIMARY KEY, key_text text not null, length integer)"
+            )
+            conn.execute("CREATE TABLE POSTINGS (gram text not null, id integer)")
+            for i in range(0, len(keys), self.fuzzybatchsize):
+                chunk = keys[i : i + self.fuzzybatchsize]
+                conn.executemany(
+                    "INSERT INTO KEYS VALUES (?,?,?)",
+                    ((i + j, key, len(key)) for j, key in enumerate(chunk)),
+                )
+                conn.executemany(
+                    "INSERT INTO POSTINGS VALUES (?,?)",
+                    (
+                        (gram, i + j)
+                        for j, key in enumerate(chunk)
+                        for gram in self.grams(key)
+                    ),
+                )
+            conn.execute("CREATE INDEX postings_gram ON POSTINGS (gram, id)")
+            conn.execute("CREATE INDEX keys_length ON KEYS (length)")
+            conn.execute(
+                "CREATE TABLE GRAMS AS SELECT gram, COUNT(*) AS df FROM POSTINGS GROUP BY gram"
+            )
+            conn.execute("CREATE UNIQUE INDEX grams_gram ON GRAMS (gram)")
+            conn.execute("PRAGMA user_version={};".format(self.fuzzyversion))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def fuzzy_lookup(self, word: str, distance: int, limit: int):
+        # 返回与word的编辑距离不超过distance的词头，按距离排序；索引还没建好时返回None
+        if not self._fuzzyready:
+            if self.fuzzyneedbuild():
+                self.makefuzzyindexasync()
+            return None
+        db = self._fuzzy_db
+        lengths = (len(word) - distance, len(word) + distance)
+        grams = list(self.grams(word))
+        # 编辑距离为d时，最多有2d个二元组不再共有，所以任取2d+1个二元组，候选词必定至少含有其中一个
+        pick = 2 * distance + 1
+        if pick > len(grams):
+            candidates = self._query(
+                db,
+                "SELECT key_text FROM KEYS WHERE length BETWEEN ? AND ?",
+                lengths,
+            )
         else:
-            sql = "SELECT key_text FROM MDX_INDEX"
-        with sqlite3.connect(db) as conn:
-            cursor = conn.execute(sql)
-            keys = [item[0] for item in cursor]
-            return keys
+            dfs = dict(
+                self._query(
+                    db,
+                    "SELECT gram, df FROM GRAMS WHERE gram IN ({})".format(
+                        ",".join("?" * len(grams))
+                    ),
+                    grams,
+                )
+            )
+            rare = sorted(grams, key=lambda gram: dfs.get(gram, 0))[:pick]
+            rare = [gram for gram in rare if gram in dfs]
+            if not rare:
+                return []
+            candidates = self._query(
+                db,
+                "SELECT DISTINCT KEYS.key_text FROM POSTINGS JOIN KEYS ON KEYS.id = POSTINGS.id WHERE POSTINGS.gram IN ({}) AND KEYS.length BETWEEN ? AND ?".format(
+                    ",".join("?" * len(rare))
+                ),
+                rare + list(lengths),
+            )
+        # 计算编辑距离之前，先用共有二元组的个数筛掉大部分候选词
+        gramset = set(grams)
+        needed = len(grams) - 2 * distance
+        results = []
+        for (key,) in candidates:
+            if needed > 0 and len(self.grams(key) & gramset) < needed:
+                continue
+            dis = winsharedutils.distance(key, word)
+            if dis <= distance:
+                results.append((dis, key))
+        results.sort(key=lambda _: _[0])
+        return [key for _, key in results[:limit]]
 
     def get_mdd_keys(self, query=""):
         _ = []
@@ -198,6 +441,13 @@ import re
 
 
 class mdict(cishubase):
+    urlpatterns = (
+        'src="([^"]+)"',
+        'href="([^"]+)"',
+        """src='([^']+)'""",
+        """href='([^']+)'""",
+    )
+
     def getdistance(self, f):
         _ = self.extraconf[f]
 
@@ -244,32 +494,71 @@ class mdict(cishubase):
         )  # None是使用默认显示名，否则使用自定义显示名
         if os.path.exists(f):
             try:
-                index = IndexBuilder(f)
+                index = IndexBuilder(f, progress=self.indexprogress)
 
                 self.builders.append((f, index))
+                if self.getdistance(f):
+                    index.makefuzzyindexasync()
 
             except:
                 print(f)
 
                 print_exc()
 
+    def indexprogress(self, fname, done, total):
+        try:
+            gobject.baseobject.displayinfomessage(
+                "{} {}%".format(os.path.basename(fname), done * 100 // max(total, 1)),
+                "<msg_info_refresh>",
+            )
+        except:
+            pass
+
+    def prebuildindexes(self, files):
+        # 多个索引需要建立时（第一次使用或词典更新后）同时建立，剩下的（失败的）仍由IndexBuilder建立
+        tasks = []
+        dedump = set()
+        for f in files:
+            absf = os.path.abspath(f)
+            if absf in dedump or os.path.splitext(f)[1] != ".mdx":
+                continue
+            dedump.add(absf)
+            try:
+                tasks.extend(IndexBuilder.pendingindexes(f))
+            except:
+                print_exc()
+        if len(tasks) < 2:
+            return
+        for fname, db_name, _ in buildindex.make_mdict_indexes(
+            tasks, self.indexprogress
+        ):
+            IndexBuilder.checkneedupdateafter(fname, db_name)
+
     def checkpath(self):
+        for _, index in getattr(self, "builders", []):
+            index.close()
         self.builders = []
         self.dedump = set()
+        # (词典, url) -> (文件信息, 限定作用域之后的样式表)
+        self.csscache = {}
+        files = []
         for f in self.config["paths"]:
             if f.strip() == "":
                 continue
             if not os.path.exists(f):
                 continue
             if os.path.isfile(f):
-                self.init_once_mdx(f)
+                files.append(f)
                 continue
             for _dir, _, _fs in os.walk(f):
                 for _f in _fs:
                     if not _f.lower().endswith(".mdx"):
                         continue
                     _f = os.path.join(_dir, _f)
-                    self.init_once_mdx(_f)
+                    files.append(_f)
+        self.prebuildindexes(files)
+        for f in files:
+            self.init_once_mdx(f)
 
     def init(self):
         try:
@@ -290,6 +579,9 @@ class mdict(cishubase):
 
         if not distance:
             return sorted(index.get_mdx_keys(word))[: self.config["max_num"]]
+        results = index.fuzzy_lookup(word, distance, self.config["max_num"])
+        if results is not None:
+            return results
         results = []
         diss = {}
         dedump = set()
@@ -303,19 +595,47 @@ class mdict(cishubase):
                 diss[k] = dis
         return sorted(results, key=lambda x: diss[x])[: self.config["max_num"]]
 
-    def parse_url_in_mdd(self, index: IndexBuilder, url1: str):
+    @staticmethod
+    def mddkey(url1: str):
         url1 = url1.replace("/", "\\")
         if not url1.startswith("\\"):
             if url1.startswith("."):
                 url1 = url1[1:]
             else:
                 url1 = "\\" + url1
+        return url1
+
+    def parse_url_in_mdd(self, index: IndexBuilder, url1: str, resources: dict = None):
+        url1 = self.mddkey(url1)
+        if resources and (url1 in resources):
+            return resources[url1]
         find = index.mdd_lookup(url1)
         if not find:
             return None
         return find[0]
 
-    def tryloadurl(self, index: IndexBuilder, base, url: str, audiob64vals: dict):
+    def prefetchresources(self, index: IndexBuilder, base, html_content: str):
+        # 先找出词条中所有需要从mdd中读取的src/href，一次批量查询
+        keys = []
+        for patt in self.urlpatterns:
+            for url in re.findall(patt, html_content):
+                if url.startswith(("#", "https:", "http:", "entry://")):
+                    continue
+                if url.startswith("sound://"):
+                    url = url[8:]
+                elif url.lower().endswith(".css"):
+                    # 样式表见loadcss
+                    continue
+                elif os.path.isfile(os.path.join(base, url)):
+                    continue
+                keys.append(self.mddkey(url))
+        if not keys:
+            return {}
+        return index.mdd_lookup_many(keys)
+
+    def tryloadurl(
+        self, index: IndexBuilder, base, url: str, audiob64vals: dict, resources=None
+    ):
         _local = os.path.join(base, url)
         iscss = url.lower().endswith(".css")
         _type = 0
@@ -330,7 +650,7 @@ class mdict(cishubase):
         if url.startswith("entry://"):
             return 3, "javascript:safe_mdict_search_word('{}')".format(url[8:])
         if url.startswith("sound://"):
-            file_content = self.parse_url_in_mdd(index, url[8:])
+            file_content = self.parse_url_in_mdd(index, url[8:], resources)
             if not file_content:
                 return
             ext = os.path.splitext(url)[1].lower()[1:]
@@ -342,7 +662,7 @@ class mdict(cishubase):
             return 3, "javascript:mdict_play_sound('{}',{})".format(
                 query_mime(ext), varname
             )
-        file_content = self.parse_url_in_mdd(index, url)
+        file_content = self.parse_url_in_mdd(index, url, resources)
         if not file_content:
             return
         return _type, file_content
@@ -356,6 +676,7 @@ class mdict(cishubase):
         hrefsrcvals: dict,
         divclass: str,
         csscollect: dict,
+        resources: dict,
         match: re.Match,
     ):
         url: str = match.groups()[0]
@@ -363,8 +684,19 @@ class mdict(cishubase):
         if url.startswith("#") or url.startswith("https:") or url.startswith("http:"):
             return matchall
         _type_1 = matchall.split("=")[0]
+        if url.lower().endswith(".css"):
+            try:
+                css = self.loadcss(index, fn, base, url, divclass, resources)
+            except:
+                print_exc()
+                return matchall
+            if not css:
+                print(fn, url)
+                return matchall
+            csscollect[url] = css
+            return None
         try:
-            file_content = self.tryloadurl(index, base, url, audiob64vals)
+            file_content = self.tryloadurl(index, base, url, audiob64vals, resources)
         except:
             print_exc()
             print("unknown", fn, url)
@@ -377,15 +709,6 @@ class mdict(cishubase):
             return matchall
         elif _type == 3:
             return matchall.replace(url, file_content)
-        elif _type == 1:
-            css = self.parse_stylesheet(
-                file_content.decode("utf8", errors="ignore"), divclass
-            )
-            if css:
-                csscollect[url] = css
-                return None
-            else:
-                return matchall
         elif _type == 0:
             varname = "var_" + hashlib.md5(file_content).hexdigest()
             hrefsrcvals[varname] = (
@@ -397,6 +720,32 @@ class mdict(cishubase):
 
         return matchall
 
+    @staticmethod
+    def divclass(f):
+        # 每个词典固定的class，样式表限定作用域之后的结果才能缓存
+        return "luna_" + hashlib.md5(os.path.abspath(f).encode("utf8")).hexdigest()
+
+    def loadcss(self, index: IndexBuilder, fn, base, url, divclass, resources=None):
+        # 同一个词典每次查词用到的样式表都一样，按词典和url缓存限定作用域之后的结果。
+        # 本地文件修改（mtime和大小）后失效，mdd中的随mdd文件失效
+        _local = os.path.join(base, url)
+        if os.path.isfile(_local):
+            stamp = IndexBuilder.checkinfo(_local)
+        else:
+            stamp = tuple(mdd._block_key for mdd in index._mdict_mdds)
+        key = (fn, url)
+        cached = self.csscache.get(key)
+        if cached and cached[0] == stamp:
+            return cached[1]
+        file_content = self.tryloadurl(index, base, url, {}, resources)
+        css = None
+        if file_content:
+            css = self.parse_stylesheet(
+                file_content[1].decode("utf8", errors="ignore"), divclass
+            )
+        self.csscache[key] = (stamp, css)
+        return css
+
     def repairtarget(
         self,
         index,
@@ -408,6 +757,11 @@ class mdict(cishubase):
         csscollect: dict,
     ):
         base = os.path.dirname(fn)
+        try:
+            resources = self.prefetchresources(index, base, html_content)
+        except:
+            print_exc()
+            resources = None
         parser = functools.partial(
             self.subcallback,
             index,
@@ -417,13 +771,9 @@ class mdict(cishubase):
             hrefsrcvals,
             divclass,
             csscollect,
+            resources,
         )
-        for patt in (
-            'src="([^"]+)"',
-            'href="([^"]+)"',
-            """src='([^']+)'""",
-            """href='([^']+)'""",
-        ):
+        for patt in self.urlpatterns:
             html_content = re.sub(patt, parser, html_content)
 
         return '<div class="{}">{}</div>'.format(divclass, html_content)
@@ -458,7 +808,7 @@ class mdict(cishubase):
             print_exc()
         if not results:
             return
-        divclass = "luna_" + str(uuid.uuid4())
+        divclass = self.divclass(f)
         csscollect = {}
         for i in range(len(results)):
             results[i] = self.repairtarget(
@@ -0,0 +1,144 @@
+# 建立mdx/mdd的MDX_INDEX。
+# 这里只依赖readmdict和sqlite3，可以在子进程中导入，多个词典的索引可以同时在多个进程中建立。
+import os, sys, sqlite3, queue, itertools, multiprocessing, multiprocessing.pool
+from traceback import print_exc
+from cishu.mdict_.readmdict import MDX, MDD, MDict
+
+# MDX_INDEX的版本，见IndexBuilder.migrateindex
+# user_version 0 : 只有key_text及其索引，忽略大小写的查询要全表扫描
+# user_version 1 : key_fold（小写的key_text）及其索引
+indexversion = 1
+# 每个事务写入的行数，同时也是报告进度的间隔
+batchsize = 20000
+# 同时建立的索引数的上限，每个都要在内存中保留该词典的词条列表
+maxworkers = 4
+
+
+def foldkey(key: str):
+    return key.lower()
+
+
+def indexrows(mdd: MDict):
+    for item in mdd.index_items():
+        yield (
+            item["key_text"],
+            item["file_pos"],
+            item["compressed_size"],
+            item["decompressed_size"],
+            item["record_start"],
+            item["record_end"],
+            item["offset"],
+            foldkey(item["key_text"]),
+        )
+
+
+def make_mdict_index(mdd: MDict, db_name, ismdx, progress=None):
+    # progress(fname, done, total)
+    # 边读边写，每batchsize行一个事务，内存中只有词头列表，不再有全部记录的dict和元组。
+    # 先写到临时文件，索引在数据全部写入之后才建立，完成后再替换，中途失败不会留下不完整的索引
+    tmp_name = db_name + ".tmp"
+    if os.path.exists(tmp_name):
+        os.remove(tmp_name)
+    mdd._key_list = mdd._read_keys()
+    total = len(mdd._key_list)
+    conn = sqlite3.connect(tmp_name)
+    try:
+        # 索引随时可以重建，建立期间不需要崩溃保护
+        conn.execute("PRAGMA synchronous=OFF;")
+        conn.execute(
+            """ CREATE TABLE MDX_INDEX
+               (key_text text not null,
+                file_pos integer,
+                compressed_size integer,
+                decompressed_size integer,
+                record_start integer,
+                record_end integer,
+                offset integer,
+                key_fold text
+                )"""
+        )
+        rows = indexrows(mdd)
+        done = 0
+        while True:
+            chunk = list(itertools.islice(rows, batchsize))
+            if not chunk:
+                break
+            conn.executemany("INSERT INTO MDX_INDEX VALUES (?,?,?,?,?,?,?,?)", chunk)
+            conn.commit()
+            done += len(chunk)
+            if progress:
+                progress(mdd._fname, done, total)
+        conn.execute(
+            """
+                CREATE{} INDEX key_index ON MDX_INDEX (key_text)
+                """.format(
+                " UNIQUE" if (not ismdx) else ""
+            )
+        )
+        conn.execute("CREATE INDEX key_fold_index ON MDX_INDEX (key_fold)")
+        conn.execute("PRAGMA user_version={};".format(indexversion))
+        conn.commit()
+    finally:
+        conn.close()
+        # 之后的查询都走索引，不再需要词条列表
+        mdd._key_list = None
+    os.replace(tmp_name, db_name)
+
+
+_progressqueue = None
+
+
+def _initworker(progressqueue):
+    global _progressqueue
+    _progressqueue = progressqueue
+
+
+def _reportprogress(fname, done, total):
+    _progressqueue.put((fname, done, total))
+
+
+def _buildworker(fname, db_name, ismdx):
+    mdd = MDX(fname) if ismdx else MDD(fname)
+    make_mdict_index(mdd, db_name, ismdx, _reportprogress)
+
+
+def canspawn():
+    # 打包后sys.executable是启动器而不是python.exe，无法用它启动子进程，只能退回到线程
+    return os.path.basename(sys.executable).lower().startswith("python")
+
+
+def make_mdict_indexes(tasks, progress=None, workers=None):
+    # tasks: [(fname, db_name, ismdx)]，返回成功建立的任务
+    if not tasks:
+        return []
+    if workers is None:
+        workers = min(os.cpu_count() or 1, maxworkers)
+    workers = max(1, min(workers, len(tasks)))
+    if canspawn():
+        progressqueue = multiprocessing.Queue()
+        pool = multiprocessing.Pool(workers, _initworker, (progressqueue,))
+    else:
+        progressqueue = queue.Queue()
+        pool = multiprocessing.pool.ThreadPool(workers, _initworker, (progressqueue,))
+    try:
+        results = [pool.apply_async(_buildworker, task) for task in tasks]
+        pool.close()
+        while True:
+            try:
+                report = progressqueue.get(timeout=0.1)
+            except queue.Empty:
+                if all(result.ready() for result in results):
+                    break
+                continue
+            if progress:
+                progress(*report)
+        finished = []
+        for task, result in zip(tasks, results):
+            try:
+                result.get()
+                finished.append(task)
+            except:
+                print_exc()
+        return finished
+    finally:
+        pool.terminate()
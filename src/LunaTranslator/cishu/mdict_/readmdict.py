@@ -20,8 +20,12 @@
 # GNU General Public License for more details.
 
 import logging
+import mmap
+import os
 import re
 import sys
+import threading
+from collections import OrderedDict
 
 # zlib compression is used for engine version >=2.0
 import zlib
@@ -83,6 +87,77 @@ def _decrypt_regcode_by_userid(reg_code: bytes, userid: bytes) -> bytes:
 	return s20.encryptBytes(reg_code)
 
 
+class _BlockCache:
+	"""
+	Decoded record blocks shared by all MDict instances and threads,
+	keyed by (file, file_pos) and bounded by the total decoded size.
+	Entries linked by @@@LINK and resources of the same entry usually
+	live in the same block, so a lookup rarely decodes a block twice.
+
+	This is a local copy of myutils.utils.LRUCache: buildindex imports this
+	module in worker processes, where only the standard library can be
+	imported (myutils.utils pulls in Qt and the Windows helpers).
+	"""
+
+	def __init__(self, capacity: int) -> None:
+		self.capacity = capacity
+		self.lock = threading.Lock()
+		self.blocks = OrderedDict()
+		self.size = 0
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+	def get(self, key):
+		with self.lock:
+			block = self.blocks.get(key)
+			if block is None:
+				self.misses += 1
+				return None
+			self.blocks.move_to_end(key)
+			self.hits += 1
+			return block
+
+	def put(self, key, block):
+		with self.lock:
+			if len(block) > self.capacity:
+				return
+			old = self.blocks.pop(key, None)
+			if old is not None:
+				self.size -= len(old)
+			self.blocks[key] = block
+			self.size += len(block)
+			while self.size > self.capacity:
+				_, old = self.blocks.popitem(last=False)
+				self.size -= len(old)
+				self.evictions += 1
+
+	def clear(self):
+		with self.lock:
+			self.blocks.clear()
+			self.size = 0
+
+	def stats(self):
+		with self.lock:
+			total = self.hits + self.misses
+			return {
+				"blocks": len(self.blocks),
+				"size": self.size,
+				"capacity": self.capacity,
+				"hits": self.hits,
+				"misses": self.misses,
+				"evictions": self.evictions,
+				"hit_rate": self.hits / total if total else 0,
+			}
+
+
+block_cache = _BlockCache(64 * 1024 * 1024)
+
+# a 32-bit process only maps files up to this size, larger ones are read
+# block by block, so a multi-GB .mdd can not exhaust the address space
+MMAP_MAX_SIZE_32BIT = 64 * 1024 * 1024
+
+
 class MDict:
 	"""
 	Base class which reads in header and key block.
@@ -99,6 +174,14 @@ class MDict:
 		self._encoding = encoding.upper()
 		self._encrypted_key = None
 		self._passcode = passcode
+		self._mmap = None
+		self._mmap_lock = threading.Lock()
+		# cached blocks of a replaced file must not be reused
+		self._block_key = (
+			os.path.abspath(fname),
+			os.path.getmtime(fname),
+			os.path.getsize(fname),
+		)
 
 		self.header = self._read_header()
 
@@ -561,14 +644,25 @@ class MDict:
 		"""
 		return self._read_records()
 
-	def _read_records(self):
+	def index_items(self):
+		"""
+		Same as items() but without decoding the record blocks, the
+		decompressed size recorded in the file is used instead.
+		Used for building the index, where only the positions matter.
+		"""
+		return self._read_records(decode=False)
+
+	def _read_records(self, decode=True):
 		if self._version >= 3:
-			yield from self._read_records_v3()
+			yield from self._read_records_v3(decode)
 		else:
-			yield from self._read_records_v1v2()
+			yield from self._read_records_v1v2(decode)
 
-	def _read_records_v3(self):
-		f = open(self._fname, "rb")
+	def _read_records_v3(self, decode=True):
+		with open(self._fname, "rb") as f:
+			yield from self._read_records_v3_impl(f, decode)
+
+	def _read_records_v3_impl(self, f, decode):
 		f.seek(self._record_block_offset)
 
 		offset = 0
@@ -580,29 +674,36 @@ class MDict:
 			file_pos=f.tell()
 			decompressed_size = self._read_int32(f)
 			compressed_size = self._read_int32(f)
-			record_block = self._decode_block(
-				f.read(compressed_size),
-				decompressed_size,
-			)
+			if decode:
+				block_size = len(self._decode_block(
+					f.read(compressed_size),
+					decompressed_size,
+				))
+			else:
+				f.seek(compressed_size, 1)
+				block_size = decompressed_size
 
 			# split record block according to the offset info from key block
 			while i < len(self._key_list):
 				record_start, key_text = self._key_list[i]
 				# reach the end of current record block
-				if record_start - offset >= len(record_block):
+				if record_start - offset >= block_size:
 					break
 				# record end index
 				if i < len(self._key_list) - 1:
 					record_end = self._key_list[i + 1][0]
 				else:
-					record_end = len(record_block) + offset
+					record_end = block_size + offset
 				i += 1
-				yield dict(key_text= key_text, file_pos= file_pos, decompressed_size= len(record_block),record_start=record_start, offset=offset, record_end=record_end,compressed_size=compressed_size)
-			offset += len(record_block)
+				yield dict(key_text= key_text, file_pos= file_pos, decompressed_size= block_size,record_start=record_start, offset=offset, record_end=record_end,compressed_size=compressed_size)
+			offset += block_size
 			size_counter += compressed_size
 
-	def _read_records_v1v2(self):
-		f = open(self._fname, "rb")
+	def _read_records_v1v2(self, decode=True):
+		with open(self._fname, "rb") as f:
+			yield from self._read_records_v1v2_impl(f, decode)
+
+	def _read_records_v1v2_impl(self, f, decode):
 		f.seek(self._record_block_offset)
 
 		num_record_blocks = self._read_number(f)
@@ -627,56 +728,99 @@ class MDict:
 		size_counter = 0
 		for compressed_size, decompressed_size in record_block_info_list:
 			file_pos=f.tell()
-			record_block_compressed = f.read(compressed_size)
-			try:
-				record_block = self._decode_block(
-					record_block_compressed,
-					decompressed_size,
-				)
-			except zlib.error:
-				log.error("zlib decompress error")
-				continue
+			if decode:
+				record_block_compressed = f.read(compressed_size)
+				try:
+					block_size = len(self._decode_block(
+						record_block_compressed,
+						decompressed_size,
+					))
+				except zlib.error:
+					log.error("zlib decompress error")
+					continue
+			else:
+				f.seek(compressed_size, 1)
+				block_size = decompressed_size
 			# split record block according to the offset info from key block
 			while i < len(self._key_list):
 				record_start, key_text = self._key_list[i]
 				# reach the end of current record block
-				if record_start - offset >= len(record_block):
+				if record_start - offset >= block_size:
 					break
 				# record end index
 				if i < len(self._key_list) - 1:
 					record_end = self._key_list[i + 1][0]
 				else:
-					record_end = len(record_block) + offset
+					record_end = block_size + offset
 				i += 1
-				yield dict(key_text= key_text, file_pos= file_pos, decompressed_size= len(record_block),record_start=record_start, offset=offset, record_end=record_end,compressed_size=compressed_size)
-			offset += len(record_block)
+				yield dict(key_text= key_text, file_pos= file_pos, decompressed_size= block_size,record_start=record_start, offset=offset, record_end=record_end,compressed_size=compressed_size)
+			offset += block_size
 			size_counter += compressed_size
 		# assert size_counter == record_block_size
 
 		f.close()
  
-	def read_records(self, index):
-		f = open(self._fname, "rb")
-		f.seek(index["file_pos"])
-		record_block_compressed = f.read(index["compressed_size"]) 
-		f.close()
-		decompressed_size = index["decompressed_size"] 
-		
+	def _get_mmap(self):
+		# map the whole file once and slice compressed blocks out of it,
+		# fall back to plain reads when it can not or should not be mapped.
+		# must be called with self._mmap_lock held
+		if self._mmap is None:
+			self._mmap = False
+			if sys.maxsize > 2**32 or self._block_key[2] <= MMAP_MAX_SIZE_32BIT:
+				try:
+					with open(self._fname, "rb") as f:
+						self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+				except (OSError, ValueError, OverflowError):
+					pass
+		return self._mmap
+
+	def _read_block_compressed(self, file_pos, compressed_size):
+		# the slice is taken under the lock so close() can not unmap it midway
+		with self._mmap_lock:
+			mm = self._get_mmap()
+			if mm:
+				return mm[file_pos : file_pos + compressed_size]
+		with open(self._fname, "rb") as f:
+			f.seek(file_pos)
+			return f.read(compressed_size)
+
+	def read_record_block(self, index):
+		key = self._block_key + (index["file_pos"],)
+		record_block = block_cache.get(key)
+		if record_block is not None:
+			return record_block
+		record_block_compressed = self._read_block_compressed(
+			index["file_pos"], index["compressed_size"]
+		)
 		try:
 			record_block = self._decode_block(
 				record_block_compressed,
-				decompressed_size,
+				index["decompressed_size"],
 			)
 		except zlib.error:
 			log.error("zlib decompress error")
-			
-		# split record block according to the offset info from key block
+			raise
+		block_cache.put(key, record_block)
+		return record_block
+
+	def read_records(self, index):
+		record_block = self.read_record_block(index)
+		# split record block according to the offset info from key block,
+		# only the record itself is copied out of the cached block
 		data = record_block[
-            index["record_start"]
-            - index["offset"] : index["record_end"]
-            - index["offset"]
-        ]
+			index["record_start"]
+			- index["offset"] : index["record_end"]
+			- index["offset"]
+		]
 		return data
+
+	def close(self):
+		# on Windows an open mapping keeps the file from being replaced or deleted.
+		# reads after close fall back to plain reads instead of mapping it again
+		with self._mmap_lock:
+			if self._mmap:
+				self._mmap.close()
+			self._mmap = False
 	# assert size_counter == record_block_size
 
 class MDD(MDict):
@@ -67,6 +67,8 @@ function safe_weblio_search_word(word){
                 links.append(_)
         ts = []
         for _ in links:
+            if self.cache.get(_):
+                continue
             ts.append(threading.Thread(target=self.makelink, args=(_,)))
             ts[-1].start()
         for t in ts:
@@ -1,5 +1,5 @@
 from qtsymbols import *
-import functools, binascii
+import functools, binascii, threading
 from collections import OrderedDict
 from traceback import print_exc
 import qtawesome, windows, winsharedutils, gobject, os
@@ -427,8 +427,9 @@ class hookselect(closeashidewindow):
     sysmessagesignal = pyqtSignal(int, str)
     removehooksignal = pyqtSignal(tuple)
     getfoundhooksignal = pyqtSignal(dict)
-    update_item_new_line = pyqtSignal(tuple, str)
     SaveTextThreadRole = Qt.ItemDataRole.UserRole + 1
+    # 钩子列表中最新文本的刷新间隔(ms)，期间同一个钩子的多次输出只保留最后一条
+    newlineflushinterval = 100
 
     def __init__(self, parent):
         super(hookselect, self).__init__(parent, globalconfig["selecthookgeo"])
@@ -440,9 +441,14 @@ class hookselect(closeashidewindow):
         self.addnewhooksignal.connect(self.addnewhook)
         self.getnewsentencesignal.connect(self.getnewsentence)
         self.sysmessagesignal.connect(self.sysmessage)
-        self.update_item_new_line.connect(self.update_item_new_line_function)
         self.getfoundhooksignal.connect(self.getfoundhook)
         self.setWindowTitle("选择文本")
+        self.pendingnewlines = {}
+        self.pendingnewlineslock = threading.Lock()
+        self.newlinestats = {"received": 0, "coalesced": 0, "dropped": 0}
+        self.newlinetimer = QTimer(self)
+        self.newlinetimer.setInterval(self.newlineflushinterval)
+        self.newlinetimer.timeout.connect(self.flushnewlines)
         self.changeprocessclear()
 
     def querykeyofrow(self, row):
@@ -458,13 +464,32 @@ class hookselect(closeashidewindow):
                 return row
         return -1
 
-    def update_item_new_line_function(self, key, output):
-        row = self.querykeyindex(key)
-        if row == -1:
-            return
-        output = output[:200].replace("\n", " ")
+    def queue_item_new_line(self, key, output):
+        # 在钩子输出的线程中调用，只记录每个钩子的最新一条，由界面线程定时刷新
+        with self.pendingnewlineslock:
+            self.newlinestats["received"] += 1
+            if key in self.pendingnewlines:
+                self.newlinestats["coalesced"] += 1
+            self.pendingnewlines[key] = output
+
+    def flushnewlines(self):
+        with self.pendingnewlineslock:
+            if not self.pendingnewlines:
+                return
+            pending = self.pendingnewlines
+            self.pendingnewlines = {}
+        keyrows = {}
+        for row in range(self.ttCombomodelmodel.rowCount()):
+            keyrows[self.querykeyofrow(row)] = row
         colidx = 2 + int(bool(self.embedablenum))
-        self.ttCombomodelmodel.item(row, colidx).setText(output)
+        for key, output in pending.items():
+            row = keyrows.get(key, -1)
+            if row == -1:
+                # 钩子已被移除
+                self.newlinestats["dropped"] += 1
+                continue
+            output = output[:200].replace("\n", " ")
+            self.ttCombomodelmodel.item(row, colidx).setText(output)
 
     def removehook(self, key):
         row = self.querykeyindex(key)
@@ -501,6 +526,8 @@ class hookselect(closeashidewindow):
 
     def changeprocessclear(self):
         # self.ttCombo.clear()
+        with self.pendingnewlineslock:
+            self.pendingnewlines.clear()
         self.ttCombomodelmodel.clear()
         self.at1 = 1
         self.textOutput.clear()
@@ -900,7 +927,14 @@ class hookselect(closeashidewindow):
         except:
             print_exc()
 
+    def hideEvent(self, e):
+        # 隐藏时不刷新，最新的文本留在pendingnewlines中，显示时一次性刷新
+        self.newlinetimer.stop()
+        super().hideEvent(e)
+
     def showEvent(self, e):
+        self.flushnewlines()
+        self.newlinetimer.start()
         gobject.baseobject.safecloseattachprocess()
         if len(gobject.baseobject.textsource.selectedhook) == 0:
             return
@@ -231,6 +231,19 @@ def _ocrparam_create(self, idx):
             ),
         )
     if idx in [0, 2, 3]:
+        self._ocrparaml.addRow(
+            "图像比较方法",
+            getboxlayout(
+                [
+                    D_getsimplecombobox(
+                        ["逐像素", "感知哈希", "分块"],
+                        globalconfig,
+                        "ocr_compare_method",
+                    ),
+                    QLabel,
+                ]
+            ),
+        )
         self._ocrparaml.addRow(
             "图像稳定性阈值",
             getboxlayout(
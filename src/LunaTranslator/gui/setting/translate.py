@@ -717,6 +717,10 @@ def setTabTwo_lazy(self, basel: QVBoxLayout):
                             double=True,
                         ),
                     ],
+                    [
+                        "翻译缓存内存上限_(MB)",
+                        D_getspinbox(0, 9999, globalconfig, "shorttermcache_mb"),
+                    ],
                 ],
             ),
         ],
@@ -18,7 +18,7 @@ from myutils.utils import (
 )
 from sometypes import WordSegResult
 from myutils.mecab import mecab
-from myutils.wrapper import threader, tryprint
+from myutils.wrapper import threader, pooled, tryprint
 from myutils.ocrutil import imageCut, ocr_run
 from gui.rangeselect import rangeselct_function
 from gui.usefulwidget import (
@@ -89,7 +89,7 @@ class AnkiWindow(QWidget):
                 ),
             )
 
-    @threader
+    @pooled("cpu")
     def asyncocr(self, img):
         self.__ocrsettext.emit(ocr_run(img).textonly)
 
@@ -1124,7 +1124,7 @@ class searchwordW(closeashidewindow):
         self.ocr_once_signal.connect(lambda: rangeselct_function(self.ocr_do_function))
         self.state = 0
 
-    @threader
+    @pooled("cpu")
     def ocr_do_function(self, rect, img=None):
         if not rect:
             return
@@ -2,7 +2,7 @@ from qtsymbols import *
 import time, functools, threading, os, shutil, uuid
 from traceback import print_exc
 import windows, qtawesome, gobject, winsharedutils
-from myutils.wrapper import threader, tryprint
+from myutils.wrapper import threader, pooled, tryprint
 from myutils.config import (
     globalconfig,
     saveallconfig,
@@ -592,7 +592,7 @@ class TranslatorWindow(resizableframeless):
         self.seteffect()
         self.changeextendstated()
 
-    @threader
+    @pooled("cpu")
     def ocr_do_function(self, rect, img=None):
         if not rect:
             return
@@ -0,0 +1,179 @@
+import sqlite3, sys, threading
+from queue import Queue, Empty
+from collections import OrderedDict
+from traceback import print_exc
+from myutils.config import globalconfig
+from myutils.utils import autosql
+
+
+class __shorttermcache:
+    # 所有翻译器共享的内存缓存，按字节数限制总大小，超出时按LRU淘汰
+    # key : (typename, srclang, tgtlang, src)
+    # 估算的每条记录除字符串外的额外开销（tuple、链表节点等）
+    overhead = 200
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.cache = OrderedDict()
+        self.size = 0
+        self.counters = {}
+
+    @property
+    def budget(self):
+        return globalconfig["shorttermcache_mb"] * 1024 * 1024
+
+    @property
+    def full(self):
+        return self.size >= self.budget
+
+    def __counter(self, typename):
+        if typename not in self.counters:
+            self.counters[typename] = {"hit": 0, "miss": 0, "evict": 0}
+        return self.counters[typename]
+
+    def __sizeof(self, key, value):
+        return sys.getsizeof(key[-1]) + sys.getsizeof(value) + self.overhead
+
+    def __shrink(self, budget):
+        while self.size > budget and self.cache:
+            key, value = self.cache.popitem(last=False)
+            self.size -= self.__sizeof(key, value)
+            self.__counter(key[0])["evict"] += 1
+
+    def get(self, typename, srclang, tgtlang, src):
+        key = (typename, srclang, tgtlang, src)
+        with self.lock:
+            counter = self.__counter(typename)
+            value = self.cache.get(key)
+            if value is None:
+                counter["miss"] += 1
+                return None
+            self.cache.move_to_end(key)
+            counter["hit"] += 1
+            return value
+
+    def set(self, typename, srclang, tgtlang, src, tgt):
+        key = (typename, srclang, tgtlang, src)
+        size = self.__sizeof(key, tgt)
+        with self.lock:
+            budget = self.budget
+            if size > budget:
+                return
+            old = self.cache.pop(key, None)
+            if old is not None:
+                self.size -= self.__sizeof(key, old)
+            self.cache[key] = tgt
+            self.size += size
+            self.__shrink(budget)
+
+    def clear(self, typename=None):
+        with self.lock:
+            if typename is None:
+                self.cache.clear()
+                self.size = 0
+                return
+            for key in [_ for _ in self.cache if _[0] == typename]:
+                self.size -= self.__sizeof(key, self.cache.pop(key))
+
+    def stats(self, typename):
+        with self.lock:
+            return dict(self.__counter(typename))
+
+
+shorttermcache = __shorttermcache()
+
+
+class longtermcache:
+    # cache/<typename>.sqlite
+    # user_version 0 : 旧版，无索引，每次查询都是全表扫描
+    # user_version 1 : (source,srclang,tgtlang)唯一索引，WAL
+    version = 1
+    # 一次事务中最多合并的写入数
+    batchsize = 256
+
+    def __init__(self, path):
+        self.queue = Queue()
+        self.sql = autosql(
+            sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        )
+        try:
+            self.sql.execute("PRAGMA journal_mode=WAL;")
+            self.sql.execute("PRAGMA synchronous=NORMAL;")
+        except:
+            print_exc()
+        self.sql.execute(
+            "CREATE TABLE IF NOT EXISTS cache(srclang,tgtlang,source,trans);"
+        )
+        self.migrate()
+
+    def migrate(self):
+        version = self.sql.execute("PRAGMA user_version;").fetchone()[0]
+        if version >= self.version:
+            return
+        try:
+            self.sql.execute("BEGIN;")
+            # 旧版可能因为中途失败而残留重复的行，建立唯一索引前只保留最新的一条
+            self.sql.execute(
+                "DELETE FROM cache WHERE rowid NOT IN (SELECT MAX(rowid) FROM cache GROUP BY source,srclang,tgtlang);"
+            )
+            # source放在最前，查询时srclang/tgtlang有两种组合，也都能走索引
+            self.sql.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS cache_index ON cache(source,srclang,tgtlang);"
+            )
+            self.sql.execute("PRAGMA user_version={};".format(self.version))
+            self.sql.execute("COMMIT;")
+        except:
+            print_exc()
+            self.sql.execute("ROLLBACK;")
+
+    def get(self, src, *langpairs):
+        for srclang, tgtlang in langpairs:
+            ret = self.sql.execute(
+                "SELECT trans FROM cache WHERE source=? and srclang=? and tgtlang=?",
+                (src, str(srclang), str(tgtlang)),
+            ).fetchone()
+            if ret:
+                return ret[0]
+        return None
+
+    def put(self, srclang, tgtlang, src, trans):
+        self.queue.put((str(srclang), str(tgtlang), src, trans))
+
+    def end(self):
+        self.queue.put(None)
+
+    def __collect(self):
+        # 阻塞等待第一条，然后把已经排队的一起取出，合并到同一个事务中
+        task = self.queue.get()
+        if task is None:
+            return None
+        tasks = [task]
+        while len(tasks) < self.batchsize:
+            try:
+                task = self.queue.get_nowait()
+            except Empty:
+                break
+            if task is None:
+                self.queue.put(None)
+                break
+            tasks.append(task)
+        return tasks
+
+    def writeonce(self):
+        tasks = self.__collect()
+        if tasks is None:
+            return False
+        try:
+            self.sql.execute("BEGIN;")
+            self.sql.executemany(
+                "INSERT OR REPLACE INTO cache VALUES(?,?,?,?)",
+                tasks,
+            )
+            self.sql.execute("COMMIT;")
+        except:
+            print_exc()
+            try:
+                self.sql.execute("ROLLBACK;")
+            except:
+                pass
+        return True
@@ -20,6 +20,7 @@ from myutils.keycode import vkcode_map, mod_map
 from language import Languages
 import threading, winreg
 import re, heapq, winsharedutils
+from collections import OrderedDict
 from myutils.wrapper import tryprint
 from html.parser import HTMLParser
 from myutils.audioplayer import bass_code_cast
@@ -498,6 +499,161 @@ def safe_escape(string: str) -> str:
         return string
 
 
+class LRUCache:
+    def __init__(self, capacity: int, sizeof=None):
+        # sizeof为None时每项计为1，capacity即最大条目数；
+        # 否则capacity是sizeof(value)之和的上限，例如音频数据的字节数
+        self.cache = OrderedDict()
+        self.Lock = threading.Lock()
+        self.capacity = capacity
+        self.sizeof = sizeof
+        self.size = 0
+
+    def __shrink(self):
+        while self.size > self.capacity and self.cache:
+            _, (_, weight) = self.cache.popitem(last=False)
+            self.size -= weight
+
+    def setcap(self, cap):
+        with self.Lock:
+            if cap == -1:
+                cap = 9999999999
+            self.capacity = cap
+            self.__shrink()
+
+    def __get(self, key):
+        item = self.cache.get(key)
+        if item is None:
+            return None
+        self.cache.move_to_end(key)
+        return item[0]
+
+    def get(self, key):
+        with self.Lock:
+            return self.__get(key)
+
+    def __put(self, key, value=True) -> None:
+        if not self.capacity:
+            return
+        weight = self.sizeof(value) if self.sizeof else 1
+        if weight > self.capacity:
+            return
+        old = self.cache.pop(key, None)
+        if old is not None:
+            self.size -= old[1]
+        self.cache[key] = (value, weight)
+        self.size += weight
+        self.__shrink()
+
+    def put(self, key, value=True) -> None:
+        with self.Lock:
+            self.__put(key, value)
+
+    def test(self, key):
+        with self.Lock:
+            _ = self.__get(key)
+            if not _:
+                self.__put(key)
+            return _
+
+
+class multipatternmatcher:
+    # 多个字符串的单次扫描匹配：从左到右，同一位置取最长的模式，匹配后跳过已匹配的部分
+    # finditer返回模式在patterns中的下标，重复的模式取最先出现的一个
+    __end = None
+
+    def __init__(self, patterns: "list[str]"):
+        self.root = {}
+        for idx, pattern in enumerate(patterns):
+            if not pattern:
+                continue
+            node = self.root
+            for c in pattern:
+                _next = node.get(c)
+                if _next is None:
+                    _next = node[c] = {}
+                node = _next
+            if self.__end not in node:
+                node[self.__end] = []
+            node[self.__end].append(idx)
+
+    def finditer(self, text: str):
+        root = self.root
+        end = self.__end
+        i = 0
+        length = len(text)
+        while i < length:
+            node = root.get(text[i])
+            if node is None:
+                i += 1
+                continue
+            found = None
+            j = i + 1
+            while True:
+                idxs = node.get(end)
+                if idxs:
+                    found = j, idxs[0]
+                if j >= length:
+                    break
+                node = node.get(text[j])
+                if node is None:
+                    break
+                j += 1
+            if found is None:
+                i += 1
+                continue
+            yield i, found[0], found[1]
+            i = found[0]
+
+    def findall(self, text: str) -> "set[int]":
+        # 在text中出现过的所有模式（允许重叠），重复的模式全部返回
+        root = self.root
+        end = self.__end
+        found = set()
+        length = len(text)
+        for i in range(length):
+            node = root.get(text[i])
+            j = i + 1
+            while node is not None:
+                idxs = node.get(end)
+                if idxs:
+                    found.update(idxs)
+                if j >= length:
+                    break
+                node = node.get(text[j])
+                j += 1
+        return found
+
+    def sub(self, text: str, repl) -> str:
+        # repl(idx) -> str
+        collect = []
+        last = 0
+        for start, end, idx in self.finditer(text):
+            collect.append(text[last:start])
+            collect.append(repl(idx))
+            last = end
+        if not collect:
+            return text
+        collect.append(text[last:])
+        return "".join(collect)
+
+
+def case_insensitive_replace_all(text: str, mp: dict) -> str:
+    if not mp:
+        return text
+    lower = {}
+    for k in mp:
+        lower[k.lower()] = mp[k]
+    keys = sorted(mp.keys(), key=len, reverse=True)
+
+    def replace_match(_):
+        return lower.get(_.group().lower(), _.group())
+
+    return re.sub(
+        "|".join(re.escape(_) for _ in keys), replace_match, text, flags=re.IGNORECASE
+    )
+
+
 def case_insensitive_replace(text: str, old: str, new: str) -> str:
     def replace_match(_):
         return new
@@ -505,27 +661,82 @@ def case_insensitive_replace(text: str, old: str, new: str) -> str:
     return re.sub(re.escape(old), replace_match, text, flags=re.IGNORECASE)
 
 
-@tryprint
-def parsemayberegexreplace(lst: list, line: str) -> str:
-    for fil in lst:
-        regex = fil.get("regex", False)
-        escape = fil.get("escape", regex)
-        key = fil.get("key", "")
-        value = fil.get("value", "")
-        if key == "":
-            continue
-        if regex:
-            if escape:
-                line = re.sub(safe_escape(key), safe_escape(value), line)
-            else:
-                line = re.sub(key, value, line)
-        else:
+class mayberegexreplacer:
+    # parsemayberegexreplace的规则列表预处理：转义只做一次，正则预先编译。
+    # 相邻的普通字符串规则合并到一个multipatternmatcher中，扫描一次就能跳过所有没有出现的规则，
+    # 只有出现的规则才按原顺序执行，文本被改变后再重新扫描后面的规则，因此结果与逐条替换相同。
+    def __init__(self, lst: list):
+        # 保持引用，使缓存的key中的id不会被复用
+        self.lst = list(lst)
+        self.steps = []
+        plains = []
+        for fil in lst:
+            regex = fil.get("regex", False)
+            escape = fil.get("escape", regex)
+            key = fil.get("key", "")
+            value = fil.get("value", "")
+            if key == "":
+                continue
             if escape:
-                line = line.replace(safe_escape(key), safe_escape(value))
-            else:
-                line = line.replace(key, value)
+                key = safe_escape(key)
+                value = safe_escape(value)
+            if not regex:
+                plains.append((key, value))
+                continue
+            try:
+                pattern = re.compile(key)
+            except:
+                print_exc()
+                continue
+            self.__addplains(plains)
+            plains = []
+            self.steps.append(functools.partial(self.__regexsub, pattern, value))
+        self.__addplains(plains)
+
+    def __addplains(self, plains: list):
+        if len(plains) == 1:
+            self.steps.append(functools.partial(self.__plainreplace, *plains[0]))
+        elif len(plains) > 1:
+            matcher = multipatternmatcher([_[0] for _ in plains])
+            self.steps.append(functools.partial(self.__plainsreplace, matcher, plains))
+
+    @staticmethod
+    def __regexsub(pattern, value: str, line: str):
+        return pattern.sub(value, line)
+
+    @staticmethod
+    def __plainreplace(key: str, value: str, line: str):
+        return line.replace(key, value)
+
+    @staticmethod
+    def __plainsreplace(matcher: multipatternmatcher, plains: list, line: str):
+        last = -1
+        while True:
+            present = [idx for idx in matcher.findall(line) if idx > last]
+            if not present:
+                return line
+            last = min(present)
+            key, value = plains[last]
+            line = line.replace(key, value)
+
+    def __call__(self, line: str) -> str:
+        for step in self.steps:
+            line = step(line)
+        return line
 
-    return line
+
+__mayberegexreplacercache = LRUCache(32)
+
+
+@tryprint
+def parsemayberegexreplace(lst: list, line: str) -> str:
+    # 编辑规则时，各个设置窗口都是重新生成整个列表中的dict，所以用dict的id作为key就能发现变化
+    key = tuple(map(id, lst))
+    replacer = __mayberegexreplacercache.get(key)
+    if replacer is None:
+        replacer = mayberegexreplacer(lst)
+        __mayberegexreplacercache.put(key, replacer)
+    return replacer(line)
 
 
 def checklangisusing(langs):
@@ -660,55 +871,6 @@ def get_time_stamp(ct=None, ms=True):
         return data_head
 
 
-class LRUCache:
-    def __init__(self, capacity: int):
-        self.cache = {}
-        self.Lock = threading.Lock()
-        self.capacity = capacity
-        self.order = []
-
-    def setcap(self, cap):
-        with self.Lock:
-            if cap == -1:
-                cap = 9999999999
-            self.capacity = cap
-            while len(self.cache) > self.capacity:
-                self.cache.popitem(last=False)
-
-    def __get(self, key):
-        if key in self.cache:
-            self.order.remove(key)
-            self.order.append(key)
-            return self.cache[key]
-        return None
-
-    def get(self, key):
-        with self.Lock:
-            return self.__get(key)
-
-    def __put(self, key, value=True) -> None:
-        if not self.capacity:
-            return
-        if key in self.cache:
-            self.order.remove(key)
-        elif len(self.order) == self.capacity:
-            old_key = self.order.pop(0)
-            del self.cache[old_key]
-        self.cache[key] = value
-        self.order.append(key)
-
-    def put(self, key, value=True) -> None:
-        with self.Lock:
-            self.__put(key, value)
-
-    def test(self, key):
-        with self.Lock:
-            _ = self.__get(key)
-            if not _:
-                self.__put(key)
-            return _
-
-
 globalcachedmodule = {}
 
 
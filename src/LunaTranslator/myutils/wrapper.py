@@ -1,4 +1,4 @@
-import time
+import time, os, queue
 import random, threading
 from traceback import print_exc
 
@@ -107,6 +107,126 @@ def threader(func):
     return _wrapper
 
 
+class threadpool:
+    # 有上限的线程池。线程按需创建，空闲一段时间后退出；所有线程都在忙时任务排队，
+    # 队列满时blocking的池让调用方等待，否则丢弃该任务。
+    # 适用于短任务，常驻的循环仍然用threader
+    pools = {}
+    poolslock = threading.Lock()
+    idletimeout = 60
+
+    def __init__(self, name, max_workers, max_queue=0, blocking=True):
+        self.name = name
+        self.max_workers = max_workers
+        self.blocking = blocking
+        self.tasks = queue.Queue(max_queue)
+        self.lock = threading.Lock()
+        self.workers = 0
+        self.idle = 0
+        # 已提交但还没有被线程取走的任务数
+        self.pending = 0
+        self.active = 0
+        self.completed = 0
+        self.rejected = 0
+
+    @staticmethod
+    def get(name, key=None) -> "threadpool":
+        # 指定key时，每个key各有一个按name的配置建立的池，例如每个翻译器一个
+        poolname = name if key is None else "{}/{}".format(name, key)
+        with threadpool.poolslock:
+            if poolname not in threadpool.pools:
+                max_workers, max_queue, blocking = threadpoolconfigs[name]
+                threadpool.pools[poolname] = threadpool(
+                    poolname, max_workers, max_queue, blocking
+                )
+            return threadpool.pools[poolname]
+
+    @staticmethod
+    def allstats():
+        with threadpool.poolslock:
+            pools = list(threadpool.pools.values())
+        return {pool.name: pool.stats() for pool in pools}
+
+    def stats(self):
+        with self.lock:
+            return dict(
+                workers=self.workers,
+                active=self.active,
+                queued=self.tasks.qsize(),
+                completed=self.completed,
+                rejected=self.rejected,
+            )
+
+    def submit(self, func, *args, **kwargs):
+        task = (func, args, kwargs)
+        try:
+            self.tasks.put(task, block=self.blocking)
+        except queue.Full:
+            with self.lock:
+                self.rejected += 1
+            return False
+        with self.lock:
+            self.pending += 1
+            if self.idle >= self.pending or self.workers >= self.max_workers:
+                return True
+            self.workers += 1
+        threading.Thread(target=self.__worker, name=self.name).start()
+        return True
+
+    def __worker(self):
+        while True:
+            with self.lock:
+                self.idle += 1
+            try:
+                func, args, kwargs = self.tasks.get(timeout=self.idletimeout)
+            except queue.Empty:
+                with self.lock:
+                    self.idle -= 1
+                    if self.pending <= 0:
+                        self.workers -= 1
+                        return
+                continue
+            with self.lock:
+                self.idle -= 1
+                self.pending -= 1
+                self.active += 1
+            try:
+                func(*args, **kwargs)
+            except:
+                print_exc()
+            with self.lock:
+                self.active -= 1
+                self.completed += 1
+
+
+# name : (max_workers, max_queue, blocking)
+threadpoolconfigs = {
+    # 网络请求、词典查询、语音合成等以等待为主的任务
+    "io": (32, 256, True),
+    # 批量翻译等不属于某个翻译器的请求
+    "translate": (16, 64, True),
+    # 每个翻译器的请求，按翻译器分开，一个翻译器积压的请求不会拖慢其他翻译器。
+    # 被新请求打断后已经开始的请求仍会在后台跑完，还没开始的直接放弃
+    "translator": (8, 32, True),
+    # OCR等计算为主的任务
+    "cpu": (max(2, os.cpu_count() or 1), 64, True),
+    # 从界面线程发起的推送，单线程保证顺序，队列满时丢弃而不阻塞界面
+    "ui": (1, 256, False),
+    # 内置http服务的请求
+    "http": (16, 64, True),
+}
+
+
+def pooled(name):
+    def wrapper(func):
+        def _wrapper(*args, **kwargs):
+            threadpool.get(name).submit(func, *args, **kwargs)
+
+        return _wrapper
+
+    return wrapper
+
+
 def trypass(func):
     def _wrapper(*args, **kwargs):
         try:
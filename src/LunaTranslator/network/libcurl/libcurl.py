@@ -71,12 +71,43 @@ class CURLoption(c_int):
     HTTPGET = CURLOPTTYPE_LONG + 80
     SSL_VERIFYHOST = CURLOPTTYPE_LONG + 81
     COOKIEJAR = CURLOPTTYPE_STRINGPOINT + 82
+    HTTP_VERSION = CURLOPTTYPE_LONG + 84
+    DNS_CACHE_TIMEOUT = CURLOPTTYPE_LONG + 92
     COOKIESESSION = CURLOPTTYPE_LONG + 96
     SHARE = CURLOPTTYPE_OBJECTPOINT + 100
     ACCEPT_ENCODING = CURLOPTTYPE_STRINGPOINT + 102
+    COOKIELIST = CURLOPTTYPE_STRINGPOINT + 135
     CONNECT_ONLY = CURLOPTTYPE_LONG + 141
     TIMEOUT_MS = CURLOPTTYPE_LONG + 155
     CONNECTTIMEOUT_MS = CURLOPTTYPE_LONG + 156
+    TCP_KEEPALIVE = CURLOPTTYPE_LONG + 213
+
+
+class CURL_HTTP_VERSION:
+    NONE = 0
+    V1_0 = 1
+    V1_1 = 2
+    V2_0 = 3
+    V2TLS = 4
+    V2_PRIOR_KNOWLEDGE = 5
+
+
+class CURLSHoption(c_int):
+    SHARE = 1
+    UNSHARE = 2
+    LOCKFUNC = 3
+    UNLOCKFUNC = 4
+    USERDATA = 5
+
+
+class curl_lock_data:
+    NONE = 0
+    SHARE = 1
+    COOKIE = 2
+    DNS = 3
+    SSL_SESSION = 4
+    CONNECT = 5
+    PSL = 6
 
 
 class CURLINFO(c_int):
@@ -198,6 +229,13 @@ curl_easy_duphandle.argtypes = (CURL,)
 curl_easy_duphandle.restype = CURL
 curl_easy_reset = libcurl.curl_easy_reset
 curl_easy_reset.argtypes = (CURL,)
+curl_share_init = libcurl.curl_share_init
+curl_share_init.restype = CURLSH
+curl_share_setopt = libcurl.curl_share_setopt
+curl_share_setopt.argtypes = CURLSH, CURLSHoption, c_void_p
+curl_share_setopt.restype = c_int
+curl_share_cleanup = libcurl.curl_share_cleanup
+curl_share_cleanup.argtypes = (CURLSH,)
 
 try:
     curl_ws_recv = libcurl.curl_ws_recv
@@ -225,6 +263,8 @@ CURLWS_TEXT = 1 << 0
 CURLWS_BINARY = 1 << 1
 CURLWS_CLOSE = 1 << 3
 WRITEFUNCTION = CFUNCTYPE(c_size_t, c_void_p, c_size_t, c_size_t, c_void_p)
+LOCKFUNCTION = CFUNCTYPE(None, CURL, c_int, c_int, c_void_p)
+UNLOCKFUNCTION = CFUNCTYPE(None, CURL, c_int, c_void_p)
 
 
 class Autoslist(c_void_p):
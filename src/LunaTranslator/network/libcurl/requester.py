@@ -1,5 +1,6 @@
 from .libcurl import *
 import threading, functools, queue
+from collections import OrderedDict
 from ctypes import c_long, cast, pointer, POINTER, c_char
 from requests import Response, Requester_common
 
@@ -10,49 +11,175 @@ class Response_1(Response):
         self.keeprefs = []
         self.queue = queue.Queue()
 
-    def iter_content_impl(self, chunk_size=1):
-
-        downloadeddata = b""
-        canend = False
-        allbs = 0
-        while not (self.queue.empty() and canend):
+    def iter_queue(self):
+        while True:
             buff = self.queue.get()
             if buff is None:
-                canend = True
-                continue
-            allbs += len(buff)
-            if chunk_size:
-                downloadeddata += buff
-                while len(downloadeddata) > chunk_size:
-                    yield downloadeddata[:chunk_size]
-                    downloadeddata = downloadeddata[chunk_size:]
-            else:
-                yield buff
-        while len(downloadeddata):
-            yield downloadeddata[:chunk_size]
-            downloadeddata = downloadeddata[chunk_size:]
-
-
-class autostatus:
-    def __init__(self, ref) -> None:
-        self.ref = ref
-        ref.occupied = True
+                break
+            yield buff
+
+    def iter_content_impl(self, chunk_size=1):
+        return self.iter_chunks(self.iter_queue(), chunk_size)
+
+
+class curlpool:
+    # 进程内所有Requester共用的easy句柄池，按(主机, 代理)存放。
+    # 连接缓存在easy句柄里，用完的句柄按上次请求的主机放回，下次请求同一主机时优先取出，
+    # 所以不同翻译器、重建session之后仍然可以复用已经建立的连接，而不必重新握手。
+    # DNS缓存和TLS会话放在share句柄中，所有句柄共用，新建的连接也可以恢复TLS会话。
+    # 连接缓存不放入share句柄，多线程同时使用共享的连接缓存会崩溃。
+    # easy句柄只在一个请求的响应被释放后才放回，同一时刻不会被两个请求使用。
+    maxidle = 32
+    dnscachetimeout = 300
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.idle: "OrderedDict[tuple, list[AutoCURLHandle]]" = OrderedDict()
+        self.idlecount = 0
+        self.created = 0
+        self.requests = 0
+        self.reused = 0
+        self.hosts = {}
+        self.shared = []
+        self.sharelocks = {}
+        self.share = self.initshare()
+
+    def __lock(self, handle, data, access, userptr):
+        self.sharelocks[data].acquire()
+
+    def __unlock(self, handle, data, userptr):
+        self.sharelocks[data].release()
+
+    def initshare(self):
+        share = curl_share_init()
+        if not share:
+            return None
+        self.keeprefs = (LOCKFUNCTION(self.__lock), UNLOCKFUNCTION(self.__unlock))
+        curl_share_setopt(share, CURLSHoption.LOCKFUNC, cast(self.keeprefs[0], c_void_p))
+        curl_share_setopt(
+            share, CURLSHoption.UNLOCKFUNC, cast(self.keeprefs[1], c_void_p)
+        )
+        for data in range(curl_lock_data.PSL + 1):
+            self.sharelocks[data] = threading.Lock()
+        for data in (curl_lock_data.DNS, curl_lock_data.SSL_SESSION):
+            if curl_share_setopt(share, CURLSHoption.SHARE, data) == 0:
+                self.shared.append(data)
+        return share
+
+    def __pop(self, key):
+        handles = self.idle.get(key)
+        if not handles:
+            # 没有连到这个主机的空闲句柄，取最久没用过的
+            key = next(iter(self.idle), None)
+            if key is None:
+                return None
+            handles = self.idle[key]
+        curl = handles.pop()
+        if not handles:
+            self.idle.pop(key)
+        self.idlecount -= 1
+        return curl
+
+    def acquire(self, key, useragent: str):
+        with self.lock:
+            self.requests += 1
+            curl = self.__pop(key)
+            if curl is None:
+                self.created += 1
+        if curl is None:
+            curl = AutoCURLHandle(curl_easy_init())
+        else:
+            # reset不会清除句柄里的cookie，上一个使用者的cookie不能带到这里
+            curl_easy_setopt(curl, CURLoption.COOKIELIST, b"ALL")
+        curl_easy_reset(curl)
+        if self.share:
+            curl_easy_setopt(curl, CURLoption.SHARE, self.share)
+        curl_easy_setopt(curl, CURLoption.DNS_CACHE_TIMEOUT, self.dnscachetimeout)
+        curl_easy_setopt(curl, CURLoption.TCP_KEEPALIVE, 1)
+        # https优先协商HTTP/2，服务器不支持时自动退回HTTP/1.1
+        curl_easy_setopt(curl, CURLoption.HTTP_VERSION, CURL_HTTP_VERSION.V2TLS)
+        curl_easy_setopt(curl, CURLoption.USERAGENT, useragent.encode("utf8"))
+        return curl
+
+    def release(self, key, curl: AutoCURLHandle):
+        with self.lock:
+            if self.idlecount >= self.maxidle:
+                self.__pop(None)
+            if key not in self.idle:
+                self.idle[key] = []
+            self.idle[key].append(curl)
+            self.idle.move_to_end(key)
+            self.idlecount += 1
+
+    def record(self, curl: AutoCURLHandle, key):
+        host = "{}://{}:{}".format(*key[:3])
+        if key[3]:
+            host += " via " + key[3]
+        num_connects = c_long()
+        if curl_easy_getinfo(curl, CURLINFO.NUM_CONNECTS, pointer(num_connects)):
+            return
+        http_version = c_long()
+        curl_easy_getinfo(curl, CURLINFO.HTTP_VERSION, pointer(http_version))
+        with self.lock:
+            if host not in self.hosts:
+                self.hosts[host] = {"requests": 0, "connects": 0, "http2": 0}
+            stat = self.hosts[host]
+            stat["requests"] += 1
+            stat["connects"] += num_connects.value
+            stat["http2"] += int(http_version.value >= CURL_HTTP_VERSION.V2_0)
+            if num_connects.value == 0:
+                self.reused += 1
+
+    def stats(self):
+        with self.lock:
+            return dict(
+                requests=self.requests,
+                reused=self.reused,
+                handles=self.created,
+                idle=self.idlecount,
+                shared=list(self.shared),
+                hosts={k: dict(v) for k, v in self.hosts.items()},
+            )
+
+
+pool = curlpool()
+
+
+class autorelease:
+    def __init__(self, key, curl):
+        self.key = key
+        self.curl = curl
 
     def __del__(self):
-        self.ref.occupied = False
+        pool.release(self.key, self.curl)
 
 
 class Requester(Requester_common):
-
+    # 每个Session有自己的Requester。句柄是共用的，所以Session的cookie不能留在句柄里，
+    # 每次请求后从句柄取出cookie引擎的内容，下次请求时再放回取到的句柄中
     def __init__(self) -> None:
-        # 用tls不太行，因为为了防止阻塞，每次请求都是完全重新开的线程，会100%重新initcurl
-        self.occupied = 0
-        self.curl = self.initcurl()
+        self.cookielist = []
 
-    def initcurl(self):
-        curl = AutoCURLHandle(curl_easy_init())
-        curl_easy_setopt(curl, CURLoption.USERAGENT, self.default_UA.encode("utf8"))
-        return curl
+    @staticmethod
+    def stats():
+        return pool.stats()
+
+    def _loadcookies(self, curl):
+        for line in self.cookielist:
+            curl_easy_setopt(curl, CURLoption.COOKIELIST, line)
+
+    def _savecookies(self, curl):
+        cookies = POINTER(curl_slist)()
+        if curl_easy_getinfo(curl, CURLINFO.COOKIELIST, pointer(cookies)):
+            return
+        lines = []
+        node = cookies
+        while node:
+            lines.append(node.contents.data)
+            node = node.contents.next
+        if cookies:
+            curl_slist_free_all(cookies)
+        self.cookielist = lines
 
     def _getrespurl(self, curl):
         url = c_char_p()
@@ -167,15 +294,13 @@ class Requester(Requester_common):
         timeout,
         allow_redirects,
     ):
-        if self.occupied == False:
-            curl = self.curl
-            __ = autostatus(self)
-        else:
-            curl = AutoCURLHandle(curl_easy_duphandle(self.curl))
-            __ = 0
+        key = (scheme, server, port, proxy)
+        curl = pool.acquire(key, self.default_UA)
+        # 响应（以及流式读取的线程）都不再引用时，句柄才放回池中
+        __ = autorelease(key, curl)
 
-        curl_easy_reset(curl)
         curl_easy_setopt(curl, CURLoption.COOKIEJAR, "")
+        self._loadcookies(curl)
         if timeout[0]:
             curl_easy_setopt(curl, CURLoption.CONNECTTIMEOUT_MS, timeout[0])
         if timeout[1]:
@@ -228,18 +353,22 @@ class Requester(Requester_common):
 
         if stream:
 
-            def ___perform():
+            def ___perform(__):
                 try:
                     self._perform(curl)
+                    pool.record(curl, key)
+                    self._savecookies(curl)
                 except Exception as e:
                     headerqueue.put(e)
                 resp.queue.put(None)
 
-            threading.Thread(target=___perform, daemon=True).start()
+            threading.Thread(target=___perform, args=(__,), daemon=True).start()
 
         else:
 
             self._perform(curl)
+            pool.record(curl, key)
+            self._savecookies(curl)
         header = self.__getrealheader(headerqueue)
         if not stream:
             resp.content = b"".join(resp.queue)
@@ -12,10 +12,9 @@ class Response_1(Response):
         self.hSession = None
         self.hconn = None
 
-    def iter_content_impl(self, chunk_size=1):
+    def iter_read(self):
         availableSize = DWORD()
         downloadedSize = DWORD()
-        downloadeddata = b""
         while True:
             MaybeRaiseException0(
                 WinHttpQueryDataAvailable(self.hreq, pointer(availableSize))
@@ -26,16 +25,10 @@ class Response_1(Response):
             MaybeRaiseException0(
                 WinHttpReadData(self.hreq, buff, availableSize, pointer(downloadedSize))
             )
-            if chunk_size:
-                downloadeddata += buff[: downloadedSize.value]
-                while len(downloadeddata) > chunk_size:
-                    yield downloadeddata[:chunk_size]
-                    downloadeddata = downloadeddata[chunk_size:]
-            else:
-                yield buff[: downloadedSize.value]
-        while len(downloadeddata):
-            yield downloadeddata[:chunk_size]
-            downloadeddata = downloadeddata[chunk_size:]
+            yield buff[: downloadedSize.value]
+
+    def iter_content_impl(self, chunk_size=1):
+        return self.iter_chunks(self.iter_read(), chunk_size)
 
 
 class Requester(Requester_common):
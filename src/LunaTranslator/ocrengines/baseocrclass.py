@@ -1,7 +1,7 @@
 from myutils.config import globalconfig, ocrsetting, ocrerrorfix, _TR, isascii
 from myutils.commonbase import commonbase
 from language import Languages
-from myutils.utils import qimage2binary
+from myutils.utils import qimage2binary, mayberegexreplacer, LRUCache
 import re, gobject, math
 from qtsymbols import *
 
@@ -249,6 +249,32 @@ class OCRResult:
                     return i, j
 
 
+def ocrerrorfixer(filters: dict) -> mayberegexreplacer:
+    # 非ASCII的按普通字符串依次替换，一次扫描找出出现的词条。
+    # ASCII的一直是按整词替换为其自身，不起作用，这里直接跳过，不改变识别结果
+    literals = []
+    for fil in filters:
+        if fil == "":
+            continue
+        if isascii(fil):
+            continue
+        literals.append({"key": fil, "value": filters[fil]})
+    return mayberegexreplacer(literals)
+
+
+__ocrerrorfixercache = LRUCache(1)
+
+
+def getocrerrorfixer(filters: dict) -> mayberegexreplacer:
+    # 设置窗口是原地修改这个dict的，所以用内容作为key
+    key = tuple(filters.items())
+    fixer = __ocrerrorfixercache.get(key)
+    if fixer is None:
+        fixer = ocrerrorfixer(filters)
+        __ocrerrorfixercache.put(key, fixer)
+    return fixer
+
+
 class OCRResultParsed:
     @property
     def json(self):
@@ -295,16 +321,7 @@ class OCRResultParsed:
     def _100_f(self, line):
         if ocrerrorfix["use"] == False:
             return line
-        filters = ocrerrorfix["args"]["替换内容"]
-        for fil in filters:
-            if fil == "":
-                continue
-            else:
-                if isascii(fil):
-                    line = re.sub(r"\b{}\b".format(re.escape(fil)), fil, line)
-                else:
-                    line = line.replace(fil, filters[fil])
-        return line
+        return getocrerrorfixer(ocrerrorfix["args"]["替换内容"])(line)
 
     def __bool__(self):
         return bool(self.result)
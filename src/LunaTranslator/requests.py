@@ -89,13 +89,7 @@ class Response:
             raise RequestException("")
         self.iter_once = False
 
-        def __generate():
-            for chunk in self.iter_content_impl(chunk_size):
-                yield chunk
-
-        stream_chunks = __generate()
-
-        chunks = stream_chunks
+        chunks = self.iter_content_impl(chunk_size)
 
         if decode_unicode:
             chunks = self.stream_decode_response_unicode(chunks)
@@ -105,32 +99,60 @@ class Response:
     def iter_content_impl(self, chunk_size=1):
         pass
 
+    @staticmethod
+    def iter_chunks(buffers, chunk_size):
+        # chunk_size是每一块的上限：收到的数据块不超过它时原样交出，不再拼接等待凑满，
+        # 流式输出的每一段都能立刻被处理；更大的数据块按chunk_size切开，每个字节只复制一次
+        for buff in buffers:
+            if not buff:
+                continue
+            if (not chunk_size) or (len(buff) <= chunk_size):
+                yield buff
+                continue
+            view = memoryview(buff)
+            for i in range(0, len(buff), chunk_size):
+                yield view[i : i + chunk_size].tobytes()
+
     def iter_lines(
         self, chunk_size=ITER_CHUNK_SIZE, decode_unicode=False, delimiter=None
     ):
-        pending = None
-        size = 0
+        # 还没结束的一行分段存放，读到换行时才拼接一次，很长的行也不会被反复复制
+        pending = []
+        # 多个字符的分隔符可能被切在两块之间
+        keep = len(delimiter) - 1 if delimiter else 0
         for chunk in self.iter_content(
             chunk_size=chunk_size, decode_unicode=decode_unicode
         ):
-            size += len(chunk)
-            if pending is not None:
-                chunk = pending + chunk
+            if not chunk:
+                continue
+            if keep and pending:
+                last = pending.pop()
+                if len(last) > keep:
+                    pending.append(last[:-keep])
+                    last = last[-keep:]
+                chunk = last + chunk
 
             if delimiter:
                 lines = chunk.split(delimiter)
             else:
                 lines = chunk.splitlines()
 
-            if lines and lines[-1] and chunk and lines[-1][-1] == chunk[-1]:
-                pending = lines.pop()
+            if lines and lines[-1] and lines[-1][-1] == chunk[-1]:
+                unfinished = lines.pop()
             else:
-                pending = None
+                unfinished = None
 
-            yield from lines
+            if lines:
+                if pending:
+                    pending.append(lines[0])
+                    lines[0] = chunk[:0].join(pending)
+                    pending = []
+                yield from lines
+            if unfinished is not None:
+                pending.append(unfinished)
 
-        if pending is not None:
-            yield pending
+        if pending:
+            yield pending[0][:0].join(pending)
 
     def raise_for_status(self):
         which = None
@@ -275,6 +297,11 @@ class Requester_common:
 
     def request_impl(self, *argc) -> Response: ...
 
+    @staticmethod
+    def stats():
+        # 连接池的统计信息，不支持的实现返回空
+        return {}
+
     def _parseheader(self, headers: CaseInsensitiveDict, cookies: dict):
         _x = []
 
@@ -9,7 +9,7 @@ from services.tcpservice import (
 )
 from sometypes import TranslateResult, TranslateError, WordSegResult
 from urllib.parse import quote
-import json, gobject, base64
+import json, gobject, base64, requests
 from myutils.ocrutil import ocr_run
 from gui.rendertext.webview import TextBrowser, somecommon as somecommon_1
 from gui.transhist import somecommon as somecommon_2, wvtranshist
@@ -18,11 +18,13 @@ from services.servicecollection_1 import (
     transhistwsoutputsave,
     wsoutputsave,
 )
-import threading, functools
+import threading, functools, queue
 from qtsymbols import *
 from myutils.config import globalconfig, _TR
-from myutils.utils import dynamiccishuname, dynamicapiname
+from myutils.utils import dynamiccishuname, dynamicapiname, stringfyerror
 from tts.basettsclass import TTSResult
+from myutils.wrapper import threadpool
+from myutils.post import POSTSOLVE
 
 
 class internalservicetranshistws(WSHandler, somecommon_2):
@@ -220,23 +222,134 @@ class APITranslate(HTTPHandler):
         sema.release()
 
 
+# 流式翻译中所有翻译器都已结束，不会和翻译结果混淆
+_END = object()
+
+
+class APITranslateStream(HTTPHandler):
+    # 以SSE逐条输出各个翻译器的结果，流式翻译的中间结果status为1，最终结果status为0或2
+    path = "/api/translate/stream"
+
+    def parse(self, _: RequestInfo):
+        text = _.query.get("text")
+        if not text:
+            raise Exception("")
+        tsid = _.query.get("id")
+
+        ret = queue.Queue()
+        gobject.baseobject.textgetmethod(
+            text,
+            False,
+            waitforresultcallback=ret.put,
+            waitforresultcallbackengine=tsid,
+            waitforresultcallbackengine_force=bool(tsid),
+            erroroutput=ret.put,
+            waitforresultcallbackend=functools.partial(ret.put, _END),
+        )
+        return self.iterhelper(ret)
+
+    def iterhelper(self, ret: queue.Queue):
+        while True:
+            result = ret.get()
+            if result is _END:
+                break
+            if isinstance(result, TranslateError):
+                err = dict(error=result.message)
+                if result.id:
+                    err.update(name=_TR(dynamicapiname(result.id)), id=result.id)
+                yield err
+                continue
+            result: TranslateResult
+            if not result:
+                continue
+            yield dict(
+                name=_TR(dynamicapiname(result.id)),
+                result=result.result,
+                id=result.id,
+                status=result.iter_res_status,
+            )
+
+
+class APITranslateBatch(HTTPHandler):
+    # {"texts": [...], "id": 可选}，每个翻译器一次性翻译所有行，支持批量翻译的翻译器合并请求
+    path = "/api/translate/batch"
+    method = "POST"
+
+    def parse(self, _: RequestInfo):
+        body: dict = _.body.json
+        texts = body.get("texts")
+        if not isinstance(texts, list) or not texts:
+            raise Exception("")
+        tsid = body.get("id")
+        if tsid:
+            engines = [tsid] if tsid in gobject.baseobject.translators else []
+        else:
+            engines = [
+                engine
+                for engine in globalconfig["fix_translate_rank_rank"]
+                if engine in gobject.baseobject.translators
+            ]
+        # 预翻译等没有批量接口
+        engines = [
+            engine
+            for engine in engines
+            if gobject.baseobject.translators[engine].transtype != "pre"
+        ]
+        lines = []
+        # 译前/译后处理的对象是共用的，和textgetmethod、GetTranslationCallback使用同一把锁
+        with gobject.baseobject.solvegottextlock:
+            for text in texts:
+                text = POSTSOLVE(str(text), isEx=True)
+                lines.append(gobject.baseobject.solvebeforetrans(text))
+
+        ret = {}
+        sema = threading.Semaphore(0)
+        for engine in engines:
+            threadpool.get("translate").submit(
+                self.__translate, engine, lines, sema, ret
+            )
+        for _ in engines:
+            sema.acquire()
+        return [ret[engine] for engine in engines]
+
+    def __translate(self, engine, lines: list, sema: threading.Semaphore, ret: dict):
+        res = dict(name=_TR(dynamicapiname(engine)), id=engine)
+        try:
+            results = gobject.baseobject.translators[
+                engine
+            ].translate_batch_and_collect([_[0] for _ in lines])
+            with gobject.baseobject.gettranslatelock:
+                res.update(
+                    result=[
+                        gobject.baseobject.solveaftertrans(result, mp)
+                        for result, (_, mp) in zip(results, lines)
+                    ]
+                )
+        except Exception as e:
+            res.update(error=stringfyerror(e))
+        ret[engine] = res
+        sema.release()
+
+
 class APISearchWord(HTTPHandler):
     path = "/api/dictionary"
 
     def iterhelper(self, word):
+        # 按完成的先后输出，慢的词典不会挡住后面的
         cnt = 0
-        ret = []
-        sema = threading.Semaphore(0)
+        ret = queue.Queue()
         for k, cishu in gobject.baseobject.cishus.items():
             cnt += 1
-            cishu.safesearch(word, functools.partial(self.__notify, k, sema, ret))
+            cishu.safesearch(word, functools.partial(self.__notifyqueue, k, ret))
         for _ in range(cnt):
-            sema.acquire()
-            k, result = ret[_]
+            k, result = ret.get()
             if not result:
                 continue
             yield dict(name=_TR(dynamiccishuname(k)), result=result, id=k)
 
+    def __notifyqueue(self, k, ret: queue.Queue, result):
+        ret.put((k, result))
+
     def parse(self, _: RequestInfo):
         word = _.query.get("word")
         if not word:
@@ -262,6 +375,17 @@ class APISearchWord(HTTPHandler):
         sema.release()
 
 
+class APIstats(HTTPHandler):
+    path = "/api/stats"
+
+    def parse(self, _: RequestInfo):
+        return dict(
+            endpoints=gobject.baseobject.service.stats(),
+            threadpools=threadpool.allstats(),
+            network=requests.Session().requester.stats(),
+        )
+
+
 class PageMainui(HTTPHandler):
     path = "/page/mainui"
 
@@ -307,6 +431,9 @@ def registerall(service: TCPService):
     service.register(APItts)
     service.register(APIocr)
     service.register(APITranslate)
+    service.register(APITranslateStream)
+    service.register(APITranslateBatch)
+    service.register(APIstats)
     service.register(PageSearchWord)
     service.register(Pagetranslate)
     service.register(Pageocr)
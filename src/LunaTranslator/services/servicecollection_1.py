@@ -1,6 +1,6 @@
 from services.tcpservice import WSHandler
 from typing import List
-from myutils.wrapper import threader
+from myutils.wrapper import pooled
 from traceback import print_exc
 
 mainuiwsoutputsave: List["internalservicemainuiws"] = []
@@ -8,7 +8,7 @@ transhistwsoutputsave: List["internalservicetranshistws"] = []
 wsoutputsave: List[WSHandler] = []
 
 
-@threader
+@pooled("ui")
 def WSForEach(LS: list, func):
     for L in tuple(LS):
         try:
@@ -1,13 +1,15 @@
 from traceback import print_exc
 import socket
 from base64 import encodebytes as base64encode
-import hashlib, os
-import types
+import hashlib, os, time, threading
+import types, gzip, queue
 import io, json, struct
+from email.utils import formatdate, parsedate_tz, mktime_tz
 from urllib.parse import parse_qsl, urlsplit
 from network.structures import CaseInsensitiveDict
-from myutils.wrapper import threader
+from myutils.wrapper import threader, pooled, threadpool
 from myutils.mimehelper import query_mime
+from myutils.utils import LRUCache
 
 
 class ResponseWithHeader:
@@ -17,13 +19,47 @@ class ResponseWithHeader:
 
 
 class FileResponse:
+    # 小文件的内容缓存在内存中，以(文件名, 修改时间, 大小)为键，文件修改后自然失效
+    cachemaxfile = 1024 * 1024
+    cache = LRUCache(16 * 1024 * 1024, sizeof=len)
 
     def __init__(self, filename):
         self.filename = filename
         if not os.path.isfile(filename):
             raise Exception("")
-        self.length = os.stat(filename).st_size
+        stat = os.stat(filename)
+        self.length = stat.st_size
+        self.mtime = stat.st_mtime
         self.type = query_mime(filename)
+        self.etag = '"{:x}-{:x}"'.format(int(self.mtime * 1000000), self.length)
+        self.lastmodified = formatdate(self.mtime, usegmt=True)
+
+    def notmodified(self, request: "RequestInfo"):
+        inm = request.headers.get("If-None-Match")
+        if inm:
+            return self.etag in [_.strip() for _ in inm.split(",")] or inm == "*"
+        ims = request.headers.get("If-Modified-Since")
+        if ims:
+            try:
+                return int(self.mtime) <= mktime_tz(parsedate_tz(ims))
+            except:
+                pass
+        return False
+
+    def read(self, compress=False):
+        # 小文件返回内容（以及压缩后的内容），大文件返回None，由sendfile直接发送
+        if self.length > self.cachemaxfile:
+            return None
+        key = (self.filename, self.mtime, self.length, compress)
+        data = self.cache.get(key)
+        if data is None:
+            if compress:
+                data = gzip.compress(self.read(), 6)
+            else:
+                with open(self.filename, "rb") as ff:
+                    data = ff.read()
+            self.cache.put(key, data)
+        return data
 
 
 class RedirectResponse:
@@ -32,6 +68,16 @@ class RedirectResponse:
 
 
 class ResponseInfo:
+    # 超过这个大小的文本类响应，在客户端支持时用gzip压缩
+    compressmin = 1024
+    compresstypes = (
+        "text/",
+        "application/json",
+        "application/javascript",
+        "application/xml",
+        "image/svg+xml",
+    )
+
     @staticmethod
     def _404(sock: socket.socket):
         ResponseInfo(404, "Not Found", body="Not Found").write(sock)
@@ -44,6 +90,7 @@ class ResponseInfo:
         version="HTTP/1.1",
         headers: CaseInsensitiveDict = {},
         body=None,
+        request: "RequestInfo" = None,
     ):
         self.code, self.reason, self.headers = (
             code,
@@ -68,38 +115,80 @@ class ResponseInfo:
         elif isinstance(body, FileResponse):
             self.headers["Content-Type"] = body.type
             self.headers["Content-Length"] = body.length
+            self.headers["ETag"] = body.etag
+            self.headers["Last-Modified"] = body.lastmodified
+            self.headers["Cache-Control"] = "no-cache"
+            if request and body.notmodified(request):
+                self.code, self.reason = 304, "Not Modified"
+                self.headers.pop("Content-Length")
+                self.headers.pop("Content-Type")
+                body = None
+            else:
+                data = body.read()
+                if data is not None:
+                    if self.__shouldcompress(len(data), request):
+                        data = body.read(compress=True)
+                        self.headers["Content-Encoding"] = "gzip"
+                        self.headers["Content-Length"] = len(data)
+                    body = data
         elif isinstance(body, RedirectResponse):
             self.code = 302
             self.headers["Location"] = body.target
             body = None
         elif isinstance(body, types.GeneratorType):
             self.headers["Content-Type"] = "text/event-stream; charset=utf-8"
+        if isinstance(body, bytes) and self.__shouldcompress(len(body), request):
+            body = gzip.compress(body, 6)
+            self.headers["Content-Encoding"] = "gzip"
+            self.headers["Content-Length"] = len(body)
+        if (body is None) and (self.code >= 200) and (self.code != 304):
+            self.headers["Content-Length"] = 0
         self.body = body
 
+    def __shouldcompress(self, length: int, request: "RequestInfo"):
+        if (not request) or (length < self.compressmin):
+            return False
+        if not self.headers.get("Content-Type", "").startswith(self.compresstypes):
+            return False
+        if "Content-Encoding" in self.headers:
+            return False
+        self.headers["Vary"] = "Accept-Encoding"
+        return "gzip" in request.headers.get("Accept-Encoding", "").lower()
+
+    @property
+    def keepalive(self):
+        # 流式输出没有Content-Length，只能以关闭连接来结束
+        return (self.code == 304) or ("Content-Length" in self.headers)
+
     def write(self, client_socket: socket.socket):
         resp = "{} {} {}\r\n".format(self.version, self.code, self.reason)
         for k, v in self.headers.items():
             resp += "{}: {}\r\n".format(k, v)
         resp += "\r\n"
-        client_socket.send(resp.encode())
+        resp = resp.encode()
+        if isinstance(self.body, bytes):
+            # 响应头和响应体一次发出
+            return client_socket.sendall(resp + self.body)
+        client_socket.sendall(resp)
         if not self.body:
             return
-        if isinstance(self.body, bytes):
-            return client_socket.send(self.body)
         if isinstance(self.body, FileResponse):
             with open(self.body.filename, "rb") as ff:
-                while True:
-                    bs = ff.read(1024)
-                    if not bs:
-                        break
-                    client_socket.send(bs)
+                if hasattr(client_socket, "sendfile"):
+                    client_socket.sendfile(ff)
+                else:
+                    while True:
+                        bs = ff.read(65536)
+                        if not bs:
+                            break
+                        client_socket.sendall(bs)
         if isinstance(self.body, types.GeneratorType):
             for body in self.body:
                 if isinstance(body, str):
                     body: bytes = body.encode()
                 elif isinstance(body, (dict, list, tuple)):
                     body: bytes = json.dumps(body, ensure_ascii=False).encode()
-                client_socket.send(b"data: " + body + b"\n\n")
+                client_socket.sendall(b"data: " + body + b"\n\n")
 
 
 class RequestBody:
@@ -112,10 +201,20 @@ class RequestBody:
 
 
 class RequestInfo:
+    # 请求头的行数和请求体的大小上限
+    maxheaders = 100
+    maxbody = 64 * 1024 * 1024
+
     @property
     def log(self):
         return "{} {}".format(self.method, self.rawpath)
 
+    def __keepalive(self):
+        connection = self.headers.get("Connection", "").lower()
+        if self.version == "HTTP/1.1":
+            return "close" not in connection
+        return "keep-alive" in connection
+
     def __str__(self):
         vis = dict(
             method=self.method,
@@ -126,16 +225,26 @@ class RequestInfo:
         return str(vis)
 
     @staticmethod
-    def readfrom(client_socket: socket.socket):
-        fp = client_socket.makefile("rb")
-        info = RequestInfo._parseheader(RequestInfo._read_headers(fp))
+    def readfrom(client_socket: socket.socket, fp: io.BufferedReader = None):
+        # 保持连接时，同一连接上的多个请求要共用一个fp，否则缓冲区中已读入的下一个请求会丢失
+        if fp is None:
+            fp = client_socket.makefile("rb")
+        lines = RequestInfo._read_headers(fp)
+        if not lines:
+            # 对方关闭了连接
+            return None
+        info = RequestInfo._parseheader(lines)
+        # 升级为websocket后继续从这个fp读取，缓冲区中已读入的数据不会丢失
+        info.fp = fp
         clen = info.headers.get("Content-Length")
         if clen:
-            try:
-                clen = int(clen)
-                info.body = RequestBody(fp.read(clen))
-            except:
-                pass
+            clen = int(clen)
+            if clen > RequestInfo.maxbody:
+                raise Exception("request body too large")
+            bs = fp.read(clen)
+            if len(bs) < clen:
+                raise Exception("incomplete request body")
+            info.body = RequestBody(bs)
         return info
 
     def __init__(
@@ -148,6 +257,9 @@ class RequestInfo:
         self.method, self.version = (method.upper(), version)
         self.headers = headers
         self.body: RequestBody = None
+        self.fp: io.BufferedReader = None
+        # 客户端是否希望保持连接，服务端繁忙时会改为False
+        self.keepalive = self.__keepalive()
 
     @staticmethod
     def _parseheader(lines: str):
@@ -172,7 +284,7 @@ class RequestInfo:
             line: bytes = fp.readline(65536 + 1)
             if len(line) > 65536:
                 raise Exception("")
-            if len(headers) > 65536:
+            if len(headers) > RequestInfo.maxheaders:
                 raise Exception("")
             if line in (b"\r\n", b"\n", b""):
                 break
@@ -194,6 +306,13 @@ class HandlerBase:
 
 class WSHandler(HandlerBase):
     path = ...
+    # 每个连接待发送的帧数上限，超出说明客户端太慢，断开它而不影响其他客户端
+    maxpending = 256
+    # 没有数据发送时，每隔这么久发送一次ping
+    pinginterval = 30
+    # 广播时各个客户端发送的是同一条消息，只编码一次
+    __lastframe = (None, None)
+    __lastframelock = threading.Lock()
 
     def _upgrade(self, headers: dict):
         Upgrade: str = headers.get("Upgrade")
@@ -214,31 +333,89 @@ class WSHandler(HandlerBase):
 
     def __init__(self, info: RequestInfo, sock: socket.socket):
         self.sock = sock
+        self.fp = info.fp
+        self.closed = False
+        self.pending = queue.Queue(self.maxpending)
         ResponseInfo(
             101, "Switching Protocols", headers=self._upgrade(info.headers)
         ).write(sock)
         self.parse(info)
+        self.__send()
         self.__recv()
 
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.pending.put_nowait(None)
+        except queue.Full:
+            pass
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except:
+            pass
+        self.sock.close()
+
     @threader
     def __recv(self):
+        fp = self.fp
+        if fp is None:
+            fp = self.sock.makefile("rb")
+        while not self.closed:
+            msg = self.__readstr(fp)
+            if msg is None:
+                break
+            try:
+                self.onmessage(msg)
+            except:
+                print_exc()
+        # makefile的引用没有关闭时，sock.close()不会真正关闭连接
+        fp.close()
+        # 让发送线程发完已排队的帧（例如关闭帧）后再关闭
+        try:
+            self.pending.put_nowait(None)
+        except queue.Full:
+            self.close()
+
+    @threader
+    def __send(self):
         while True:
-            msg = self.__readstr()
-            if not msg:
+            try:
+                frame = self.pending.get(timeout=self.pinginterval)
+            except queue.Empty:
+                frame = self.build_frame(0x9, b"")
+            if frame is None:
                 break
-            self.onmessage(msg)
-        self.sock.close()
+            try:
+                self.sock.sendall(frame)
+            except:
+                break
+        self.close()
 
     @staticmethod
-    def receive_frame(client_socket: socket.socket):
-        """接收并解析WebSocket帧"""
-        try:
-            # 读取前2字节
-            header = client_socket.recv(2)
-            if len(header) < 2:
-                return None, None
+    def unmask(payload: bytes, masking_key: bytes):
+        # 按大整数一次异或，代替逐字节循环
+        length = len(payload)
+        if not length:
+            return payload
+        mask = (masking_key * (length // 4 + 1))[:length]
+        return (
+            int.from_bytes(payload, "big") ^ int.from_bytes(mask, "big")
+        ).to_bytes(length, "big")
+
+    @staticmethod
+    def receive_frame(fp: io.BufferedReader):
+        """接收并解析WebSocket帧，返回(fin, opcode, payload)"""
+
+        def readexactly(n):
+            data = fp.read(n)
+            if len(data) < n:
+                raise EOFError()
+            return data
 
-            first_byte, second_byte = header[0], header[1]
+        try:
+            first_byte, second_byte = readexactly(2)
             fin = (first_byte & 0x80) >> 7
             opcode = first_byte & 0x0F
             mask = (second_byte & 0x80) >> 7
@@ -246,57 +423,68 @@ class WSHandler(HandlerBase):
 
             # 处理扩展长度
             if payload_length == 126:
-                extended_length = client_socket.recv(2)
-                if len(extended_length) < 2:
-                    return None, None
-                payload_length = struct.unpack(">H", extended_length)[0]
+                payload_length = struct.unpack(">H", readexactly(2))[0]
             elif payload_length == 127:
-                extended_length = client_socket.recv(8)
-                if len(extended_length) < 8:
-                    return None, None
-                payload_length = struct.unpack(">Q", extended_length)[0]
+                payload_length = struct.unpack(">Q", readexactly(8))[0]
+            if payload_length > RequestInfo.maxbody:
+                return None, None, None
 
             # 读取掩码键
-            masking_key = client_socket.recv(4) if mask else None
+            masking_key = readexactly(4) if mask else None
 
             # 读取载荷数据
-            payload = client_socket.recv(payload_length)
-            if len(payload) < payload_length:
-                return None, None
+            payload = readexactly(payload_length)
 
             # 如果有掩码，解码数据
-            if mask and masking_key:
-                payload = bytearray(payload)
-                for i in range(len(payload)):
-                    payload[i] ^= masking_key[i % 4]
-
-            # 如果是文本帧，解码为字符串
-            if opcode == 0x1:
-                return opcode, payload.decode("utf-8")
-            else:
-                return opcode, payload
+            if masking_key:
+                payload = WSHandler.unmask(payload, masking_key)
+            return fin, opcode, payload
 
         except Exception as e:
-            return None, None
-
-    def __readstr(self):
-        # 读取WebSocket帧
-        opcode, payload = self.receive_frame(self.sock)
-
-        if opcode is None:
-            return
-
-        if opcode == 0x1:  # 文本帧
-            return payload
+            return None, None, None
 
-        elif opcode == 0x8:  # 关闭帧
-            status_code = (payload[0] << 8) + payload[1] if len(payload) >= 2 else None
-            reason = (
-                payload[2:].decode("utf-8", errors="ignore")
-                if len(payload) > 2
-                else None
-            )
-            self.send_close_frame(self.sock, status_code, reason)
+    def __readstr(self, fp: io.BufferedReader):
+        # 读取一条完整的消息，合并分片，处理控制帧
+        message = None
+        msgopcode = None
+        while True:
+            fin, opcode, payload = self.receive_frame(fp)
+
+            if opcode is None:
+                return
+
+            if opcode == 0x8:  # 关闭帧
+                status_code = (
+                    (payload[0] << 8) + payload[1] if len(payload) >= 2 else 1000
+                )
+                reason = (
+                    payload[2:].decode("utf-8", errors="ignore")
+                    if len(payload) > 2
+                    else None
+                )
+                try:
+                    self.send_close_frame(self.sock, status_code, reason)
+                except OSError:
+                    pass
+                return
+            elif opcode == 0x9:  # ping
+                self.__enqueue(self.build_frame(0xA, payload))
+                continue
+            elif opcode == 0xA:  # pong
+                continue
+            elif opcode == 0x0:  # 后续分片
+                if message is None:
+                    return
+                message += payload
+            else:
+                msgopcode = opcode
+                message = payload
+            if not fin:
+                continue
+            if msgopcode == 0x1:  # 文本帧
+                return message.decode("utf-8")
+            # 其他数据帧忽略
+            message = None
 
     def send_close_frame(
         self, client_socket: socket.socket, status_code=1000, reason=""
@@ -305,9 +493,10 @@ class WSHandler(HandlerBase):
             reason.encode("utf-8") if reason else b""
         )
         frame = self.build_frame(0x8, payload)
-        client_socket.send(frame)
+        self.__enqueue(frame)
 
-    def build_frame(self, opcode, payload):
+    @staticmethod
+    def build_frame(opcode, payload):
         """构建WebSocket帧"""
         fin = 0x80
         frame = bytearray()
@@ -331,14 +520,30 @@ class WSHandler(HandlerBase):
         # 添加载荷
         frame.extend(payload)
 
-        return frame
+        return bytes(frame)
 
     def onmessage(self, message: str): ...
 
+    def __enqueue(self, frame: bytes):
+        if self.closed:
+            raise OSError("websocket closed")
+        try:
+            self.pending.put_nowait(frame)
+        except queue.Full:
+            self.close()
+            raise OSError("websocket client too slow")
+
+    @classmethod
+    def textframe(cls, message: str):
+        with cls.__lastframelock:
+            lastmessage, frame = cls.__lastframe
+            if lastmessage != message:
+                frame = cls.build_frame(0x1, message.encode("utf-8"))
+                cls.__lastframe = (message, frame)
+            return frame
+
     def send_text(self, message: str):
-        payload = message.encode("utf-8")
-        frame = self.build_frame(0x1, payload)
-        self.sock.send(frame)
+        self.__enqueue(self.textframe(message))
 
 
 class HTTPHandler(HandlerBase):
@@ -346,18 +551,26 @@ class HTTPHandler(HandlerBase):
     method: "str|list[str]|tuple[str]" = None
 
     def __init__(self, info: RequestInfo, client_socket: socket.socket):
+        # 处理完后连接是否还可以继续使用
+        self.keepalive = False
+        self.failed = False
         try:
             if not self._checkmethod(info.method):
                 raise Exception("")
             ret = self.parse(info)
-            resp = ResponseInfo(body=ret)
+            resp = ResponseInfo(body=ret, request=info)
+            self.keepalive = info.keepalive and resp.keepalive
+            resp.headers["Connection"] = ("close", "keep-alive")[self.keepalive]
             try:
                 resp.write(client_socket)
             except:
                 print_exc()
-            client_socket.close()
+                self.keepalive = False
+            if not self.keepalive:
+                client_socket.close()
         except Exception as e:
             print_exc()
+            self.failed = True
             self._404(client_socket)
 
     def _checkmethod(self, method: str):
@@ -374,9 +587,17 @@ class HTTPHandler(HandlerBase):
 
 
 class TCPService:
+    backlog = 128
+    # 保持连接时，等待下一个请求的时间，以及每个连接最多处理的请求数
+    keepalivetimeout = 5
+    keepalivemax = 1000
+
     def __init__(self):
         self.server_socket = None
         self.handlers: "list[HandlerBase]" = []
+        self.endpoints = {}
+        self.endpointslock = threading.Lock()
+        self.starttime = time.time()
 
     def register(self, Handler):
         self.handlers.append(Handler)
@@ -393,19 +614,42 @@ class TCPService:
     @threader
     def listen(self):
 
-        self.server_socket.listen(1)
+        self.server_socket.listen(self.backlog)
         while True:
             client_socket, _ = self.server_socket.accept()
+            # http线程池满时在这里等待，新连接留在backlog中
             self.handle_client(client_socket)
 
     def __checkifwebsocket(self, headers: dict):
         Upgrade: str = headers.get("Upgrade")
         return Upgrade and Upgrade.lower() == "websocket"
 
-    @threader
-    def handle_client(self, client_socket: socket.socket):
-        info = RequestInfo.readfrom(client_socket)
-        print(info.log)
+    def __record(self, path, cost, failed):
+        with self.endpointslock:
+            if path not in self.endpoints:
+                self.endpoints[path] = dict(count=0, errors=0, totaltime=0, maxtime=0)
+            record = self.endpoints[path]
+            record["count"] += 1
+            record["errors"] += failed
+            record["totaltime"] += cost
+            record["maxtime"] = max(record["maxtime"], cost)
+
+    def stats(self):
+        uptime = max(time.time() - self.starttime, 0.001)
+        with self.endpointslock:
+            return {
+                path: dict(
+                    count=record["count"],
+                    errors=record["errors"],
+                    avg_ms=1000 * record["totaltime"] / record["count"],
+                    max_ms=1000 * record["maxtime"],
+                    rps=record["count"] / uptime,
+                )
+                for path, record in self.endpoints.items()
+            }
+
+    def __dispatch(self, info: RequestInfo, client_socket: socket.socket):
+        # 返回连接是否还可以继续读取下一个请求，连接由websocket接管时返回None
         iswsreq = self.__checkifwebsocket(info.headers)
         for handler in self.handlers:
             if (iswsreq and issubclass(handler, HTTPHandler)) or (
@@ -413,5 +657,53 @@ class TCPService:
             ):
                 continue
             if info.path == handler.path:
-                return handler(info, client_socket)
-        return ResponseInfo._404(client_socket)
+                t = time.perf_counter()
+                handler = handler(info, client_socket)
+                if isinstance(handler, HTTPHandler):
+                    self.__record(
+                        info.path, time.perf_counter() - t, handler.failed
+                    )
+                    return handler.keepalive
+                # websocket由handler接管
+                return None
+        self.__record("404", 0, True)
+        ResponseInfo._404(client_socket)
+        return False
+
+    @pooled("http")
+    def handle_client(self, client_socket: socket.socket):
+        fp = None
+        try:
+            # 保持连接时，响应头和响应体分开发送会与客户端的延迟确认相互等待
+            client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            fp = client_socket.makefile("rb")
+            for i in range(self.keepalivemax):
+                client_socket.settimeout(self.keepalivetimeout)
+                try:
+                    info = RequestInfo.readfrom(client_socket, fp)
+                except socket.timeout:
+                    info = None
+                if not info:
+                    break
+                client_socket.settimeout(None)
+                print(info.log)
+                # 有连接在排队时，响应后关闭连接，不再占用线程等待下一个请求
+                if (i == self.keepalivemax - 1) or threadpool.get("http").stats()[
+                    "queued"
+                ]:
+                    info.keepalive = False
+                keepalive = self.__dispatch(info, client_socket)
+                if keepalive is None:
+                    # fp和连接都交给websocket了
+                    fp = client_socket = None
+                    return
+                if not keepalive:
+                    break
+        except:
+            print_exc()
+        finally:
+            # 不依赖垃圾回收释放连接；fp也要关闭，否则连接不会真正关闭
+            if fp is not None:
+                fp.close()
+            if client_socket is not None:
+                client_socket.close()
@@ -1,7 +1,9 @@
 class TranslateResult:
-    def __init__(self, id=None, result=None):
+    def __init__(self, id=None, result=None, iter_res_status=0):
         self.id = id
         self.result = result
+        # 0为普通，1为流式输出的中间结果，2为流式输出的最终结果
+        self.iter_res_status = iter_res_status
 
     def __bool__(self):
         return bool(self.result)
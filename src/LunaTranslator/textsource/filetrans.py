@@ -1,162 +1,206 @@
 from textsource.textsourcebase import basetext
 from myutils.wrapper import threader
+from myutils.post import POSTSOLVE
+from myutils.utils import stringfyerror, dynamicapiname
+from traceback import print_exc
 import json, time, os, gobject, winsharedutils
+from collections import OrderedDict
 from myutils.config import globalconfig
 
 
-class parsejson:
-    def __del__(self):
-
-        with open(
-            os.path.join(
-                os.path.dirname(self.file), "ts_" + os.path.basename(self.file)
-            ),
-            "w",
-            encoding="utf8",
-        ) as ff:
-            json.dump(self.data, ff, ensure_ascii=False, indent=4)
+def readlines(file):
+    # 和read().split("\n")的结果相同，但是逐行读取，不把整个文件读入内存
+    with open(file, "r", encoding="utf8") as ff:
+        tail = ""
+        for line in ff:
+            if line.endswith("\n"):
+                yield line[:-1]
+            else:
+                tail = line
+        yield tail
+
+
+def splitblocks(lines):
+    # 和"\n".join(lines).split("\n\n")的结果相同，返回每块的行
+    block = None
+    # 空行是否为分隔符要看后面还有没有行
+    pending = False
+    for line in lines:
+        if block is None:
+            block = [line]
+        elif pending:
+            pending = False
+            yield block
+            block = [line]
+        elif line == "":
+            pending = True
+        else:
+            block.append(line)
+    if pending:
+        block.append("")
+    if block is not None:
+        yield block
+
+
+def droplastempty(lines):
+    last = None
+    for line in lines:
+        if last is not None:
+            yield last
+        last = line
+    if last:
+        yield last
+
+
+class parsebase:
+    # 逐个读出翻译单元，按顺序写入输出文件。单元之间用sep连接
+    prefix = "luna_"
+    sep = "\n"
 
     def __init__(self, file):
         self.file = file
-        with open(file, "r", encoding="utf8") as ff:
-            self.data = json.load(ff)
+        self.ff = None
 
     def __len__(self):
-        return len(self.data)
+        return sum(1 for _ in self.load())
 
-    def save(self, _, k, ts):
-        self.data[k] = ts
-
-    def load(self):
-        for k in self.data:
-            if not (isinstance(k, str) and (self.data[k], str)):
-                yield None
-                continue
-            if self.data[k] and winsharedutils.similarity(self.data[k], k) < 0.2:
-                yield None
-                continue
-            yield k
-
-
-class parsetxt:
-    def __del__(self):
-
-        with open(
+    def __enter__(self):
+        self.ff = open(
             os.path.join(
-                os.path.dirname(self.file), "luna_" + os.path.basename(self.file)
+                os.path.dirname(self.file), self.prefix + os.path.basename(self.file)
             ),
             "w",
             encoding="utf8",
-        ) as ff:
-            ff.write("\n".join(self.data))
+        )
+        self.first = True
+        return self
 
-    def __init__(self, file):
-        self.file = file
-        with open(file, "r", encoding="utf8") as ff:
-            self.data = ff.read().split("\n")
+    def __exit__(self, *_):
+        self.ff.close()
 
-    def __len__(self):
-        return len(self.data)
+    def load(self):
+        # 返回(单元, 要翻译的文本)，文本为空则不翻译
+        return iter(())
 
-    def save(self, index, k, ts):
-        self.data[index] = ts
+    def dump(self, unit, ts):
+        # 返回写入输出文件的内容，ts为None时原样输出
+        return unit
 
-    def load(self):
-        for k in self.data:
-            yield k
+    def save(self, unit, ts):
+        if not self.first:
+            self.ff.write(self.sep)
+        self.first = False
+        self.ff.write(self.dump(unit, ts))
 
 
-class parsesrt:
-    def __del__(self):
-        with open(
-            os.path.join(
-                os.path.dirname(self.file), "luna_" + os.path.basename(self.file)
-            ),
-            "w",
-            encoding="utf8",
-        ) as ff:
-            ff.write("\n\n".join(self.blocks))
+class parsejson(parsebase):
+    # json没有办法逐个读取，仍然一次读入
+    prefix = "ts_"
 
     def __init__(self, file):
-        self.file = file
+        super().__init__(file)
         with open(file, "r", encoding="utf8") as ff:
-            text = ff.read()
-            if text.endswith("\n"):
-                text = text[:-1]
-            self.blocks = text.split("\n\n")
+            self.data = json.load(ff)
 
     def __len__(self):
-        return len(self.blocks)
-
-    def save(self, index, k, ts):
-        self.blocks[index] = "\n".join(self.blocks[index].split("\n")[:2]) + "\n" + ts
-
-    def load(self):
-        for k in self.blocks:
-            yield "\n".join(k.split("\n")[2:])
+        return len(self.data)
 
+    def __enter__(self):
+        return self
 
-class parsevtt:
-    def __del__(self):
+    def __exit__(self, *_):
         with open(
             os.path.join(
-                os.path.dirname(self.file), "luna_" + os.path.basename(self.file)
+                os.path.dirname(self.file), self.prefix + os.path.basename(self.file)
             ),
             "w",
             encoding="utf8",
         ) as ff:
-            ff.write("\n".join(self.header + self.blocks))
+            json.dump(self.data, ff, ensure_ascii=False, indent=4)
 
-    def __init__(self, file):
-        self.file = file
-        with open(file, "r", encoding="utf8") as ff:
-            text = ff.read()
-            lines = text.split("\n")
-            if lines[0] != "WEBVTT":
-                raise Exception("invalid")
-            self.header = lines[:2]
-            self.blocks = lines[2:]
+    def save(self, k, ts):
+        if ts:
+            self.data[k] = ts
 
-    def __len__(self):
-        return (len(self.blocks) + 1) // 3
+    def load(self):
+        for k in list(self.data):
+            if not (isinstance(k, str) and (self.data[k], str)):
+                yield k, None
+                continue
+            if self.data[k] and winsharedutils.similarity(self.data[k], k) < 0.2:
+                yield k, None
+                continue
+            yield k, k
+
+
+class parsetxt(parsebase):
 
-    def save(self, index, k, ts):
-        self.blocks[3 * index + 1] = ts
+    def dump(self, unit, ts):
+        return unit if ts is None else ts
 
     def load(self):
-        for i in range((len(self.blocks) + 1) // 3):
-            yield self.blocks[3 * i + 1]
+        for k in readlines(self.file):
+            yield k, k
 
 
-class parselrc:
-    def __del__(self):
+class parsesrt(parsebase):
+    sep = "\n\n"
 
-        with open(
-            os.path.join(
-                os.path.dirname(self.file), "luna_" + os.path.basename(self.file)
-            ),
-            "w",
-            encoding="utf8",
-        ) as ff:
-            ff.write("\n".join(self.data))
+    def dump(self, unit, ts):
+        if ts is None:
+            return unit
+        return "\n".join(unit.split("\n")[:2]) + "\n" + ts
 
-    def __init__(self, file):
-        self.file = file
-        with open(file, "r", encoding="utf8") as ff:
-            self.data = ff.read().split("\n")
+    def load(self):
+        # 去掉文件末尾的一个换行
+        lines = droplastempty(readlines(self.file))
+        for block in splitblocks(lines):
+            yield "\n".join(block), "\n".join(block[2:])
 
-    def __len__(self):
-        return len(self.data)
 
-    def save(self, index, k, ts):
-        self.data[index] = self.data[index][: self.data[index].find("]") + 1] + ts
+class parsevtt(parsebase):
+
+    def load(self):
+        lines = readlines(self.file)
+        header = [next(lines, None), next(lines, None)]
+        if header[0] != "WEBVTT":
+            raise Exception("invalid")
+        for line in header:
+            if line is not None:
+                yield [line], None
+        block = []
+        for line in lines:
+            block.append(line)
+            if len(block) == 3:
+                yield block, block[1]
+                block = []
+        if block:
+            yield block, block[1] if len(block) > 1 else None
+
+    def dump(self, unit, ts):
+        if ts is not None:
+            unit = unit.copy()
+            unit[1] = ts
+        return "\n".join(unit)
+
+
+class parselrc(parsebase):
+
+    def dump(self, unit, ts):
+        if ts is None:
+            return unit
+        return unit[: unit.find("]") + 1] + ts
 
     def load(self):
-        for a in self.data:
-            yield a[a.find("]") + 1 :]
+        for a in readlines(self.file):
+            yield a, a[a.find("]") + 1 :]
 
 
 class filetrans(basetext):
+    # 每次读入的单元数。一块内相同的行只翻译一次，未翻译的行交给翻译器批量翻译
+    chunksize = 256
+    # 批量查询记录时，每条sql语句中的行数，低于sqlite的参数个数上限
+    querychunk = 500
 
     def end(self):
 
@@ -176,13 +220,128 @@ class filetrans(basetext):
         except:
             return {}
 
-    def query(self, origin):
-        ts = self.__query(origin)
+    def __querymany(self, origins):
+        ret = {}
+        for i in range(0, len(origins), self.querychunk):
+            chunk = origins[i : i + self.querychunk]
+            try:
+                gets = self.sqlwrite2.execute(
+                    "select origin, machineTrans from artificialtrans where origin in ({})".format(
+                        ",".join("?" * len(chunk))
+                    ),
+                    chunk,
+                ).fetchall()
+            except:
+                continue
+            for origin, ts in gets:
+                try:
+                    ts = self.__picktoppest(json.loads(ts))
+                except:
+                    continue
+                if ts:
+                    ret[origin] = ts
+        return ret
+
+    def __picktoppest(self, ts: dict):
         toppest = globalconfig["toppest_translator"]
         if toppest:
             return ts.get(toppest, None)
         return (list(ts.values()) + [None])[0]
 
+    def query(self, origin):
+        return self.__picktoppest(self.__query(origin))
+
+    def __pickengine(self):
+        # 使用最优先的翻译器，没有设置时使用排序中的第一个。预翻译和仅手动翻译的翻译器不用于文件翻译
+        translators = gobject.baseobject.translators
+        engines = globalconfig["fix_translate_rank_rank"]
+        toppest = globalconfig["toppest_translator"]
+        if toppest:
+            engines = [toppest]
+        for engine in engines:
+            ts = translators.get(engine)
+            if ts and (ts.transtype != "pre") and (not ts.onlymanual):
+                return ts
+
+    def __fit(self, line, ts: str):
+        if not ts:
+            return None
+        if len(ts.split("\n")) == len(line.split("\n")):
+            return ts
+        elif len(ts.split("\n")) > len(line.split("\n")):
+            # 删除空行
+            lines = [line for line in ts.split("\n") if line]
+            tsx = "\n".join(lines)
+            if len(tsx.split("\n")) == len(line.split("\n")):
+                return tsx
+
+    def __waitforrunning(self):
+        while not self.isautorunning:
+            if self.ending:
+                return False
+            time.sleep(0.1)
+        return not self.ending
+
+    def __translatelines(self, ts, origins):
+        # 和textgetmethod一样做译前译后处理并写入记录，但是整块交给翻译器批量翻译
+        base = gobject.baseobject
+        texts = []
+        with base.solvegottextlock:
+            for origin in origins:
+                try:
+                    text = POSTSOLVE(origin, isEx=True)
+                except:
+                    print_exc()
+                    continue
+                if not text.strip():
+                    continue
+                if (len(text) < globalconfig["minlength"]) or (
+                    len(text) > globalconfig["maxlength"]
+                ):
+                    continue
+                texts.append((origin, text, base.solvebeforetrans(text)))
+        if not texts:
+            return {}
+        for origin, text, _ in texts:
+            self.sqlqueueput((text, origin))
+        try:
+            results = ts.translate_batch_and_collect(
+                [solved for _, _, (solved, _) in texts], is_auto_run=True
+            )
+        except Exception as e:
+            print_exc()
+            base.displayinfomessage(
+                dynamicapiname(ts.typename) + " " + stringfyerror(e),
+                "<msg_error_Translator>",
+            )
+            return {}
+        ret = {}
+        with base.gettranslatelock:
+            for (origin, text, (_, mp)), res in zip(texts, results):
+                res = base.solveaftertrans(res, mp)
+                if not res:
+                    continue
+                self.sqlqueueput((text, ts.typename, res))
+                ret[origin] = res
+        return ret
+
+    def __translatechunk(self, file: parsebase, ts, chunk: list, running=True):
+        # 中断之后剩下的部分原样输出
+        if running:
+            lines = OrderedDict((line, None) for _, line in chunk if line)
+            cached = self.__querymany(list(lines))
+            todo = [line for line in lines if line not in cached]
+            if todo and ts:
+                running = self.__waitforrunning()
+                if running:
+                    cached.update(self.__translatelines(ts, todo))
+        for unit, line in chunk:
+            if running and line:
+                file.save(unit, self.__fit(line, cached.get(line)))
+            else:
+                file.save(unit, None)
+        return running
+
     @threader
     def starttranslatefile(self, file):
         self.startsql(file + ".sqlite")
@@ -196,44 +355,36 @@ class filetrans(basetext):
             file = parsesrt(file)
         elif file.lower().endswith(".vtt"):
             file = parsevtt(file)
-        gobject.baseobject.settin_ui.progresssignal3.emit(len(file))
+        lenfile = len(file)
+        gobject.baseobject.settin_ui.progresssignal3.emit(lenfile)
         gobject.baseobject.settin_ui.progresssignal2.emit("", 0)
-
-        for index, line in enumerate(file.load()):
-            if self.ending:
-                return
-            while not self.isautorunning:
-                if self.ending:
-                    return
-                time.sleep(0.1)
-
-            lenfile = len(file)
-
-            class __p:
-                def __del__(self):
-                    gobject.baseobject.settin_ui.progresssignal2.emit(
-                        "{}/{} {:0.2f}% ".format(
-                            index + 1, lenfile, 100 * (index + 1) / lenfile
-                        ),
-                        (index + 1),
-                    )
-
-            _ref = __p()
-            if not line:
-                continue
-            ts: str = self.query(line)
-            if not ts:
-                ts = self.waitfortranslation(line)
-            if self.ending:
-                return
-
-            if not ts:
-                continue
-            if len(ts.split("\n")) == len(line.split("\n")):
-                file.save(index, line, ts)
-            elif len(ts.split("\n")) > len(line.split("\n")):
-                # 删除空行
-                lines = [line for line in ts.split("\n") if line]
-                tsx = "\n".join(lines)
-                if len(tsx.split("\n")) == len(line.split("\n")):
-                    file.save(index, line, tsx)
+        ts = self.__pickengine()
+
+        # 记录文件同时也是进度的存档，中断后重新开始时，已翻译过的行直接从记录中取出
+        done = 0
+        starttime = time.time()
+
+        def __progress(n):
+            nonlocal done
+            done += n
+            speed = done / max(time.time() - starttime, 0.001)
+            gobject.baseobject.settin_ui.progresssignal2.emit(
+                "{}/{} {:0.2f}% {:0.1f}/s ".format(
+                    done, lenfile, 100 * done / max(lenfile, 1), speed
+                ),
+                done,
+            )
+
+        running = True
+        chunk = []
+        with file:
+            for unit in file.load():
+                chunk.append(unit)
+                if (len(chunk) < self.chunksize) and running:
+                    continue
+                running = self.__translatechunk(file, ts, chunk, running)
+                if running:
+                    __progress(len(chunk))
+                chunk = []
+            if chunk and self.__translatechunk(file, ts, chunk, running):
+                __progress(len(chunk))
@@ -1,4 +1,5 @@
 import time, copy, threading
+from ctypes import string_at
 from myutils.config import globalconfig
 import winsharedutils, windows
 from gui.rangeselect import rangeadjust
@@ -12,17 +13,117 @@ from textsource.textsourcebase import basetext
 from ocrengines.baseocrclass import OCRResultParsed
 
 
-def normqimage(img: QImage):
-    img = img.scaled(128, 8 * 3)
-    return img
+class imagethumb:
+    # 用于判断画面是否变化的缩略图。像素只在创建时读取一次，之后的比较都用大整数运算批量完成，
+    # 不再逐像素调用QImage.pixel
+    w, h = 128, 24
+    # 分块检测时每块的大小，128x24分为8x3块
+    blockw, blockh = 16, 8
+    # 把每个像素(4字节)是否有任意位不同，折叠到该像素的最低位上
+    __folds = []
+    for shift, pattern in (
+        (16, b"\xff\xff\x00\x00"),
+        (8, b"\xff\x00\x00\x00"),
+        (4, b"\x0f\x00\x00\x00"),
+        (2, b"\x03\x00\x00\x00"),
+        (1, b"\x01\x00\x00\x00"),
+    ):
+        __folds.append((shift, int.from_bytes(pattern * (w * h), "little")))
+    del shift, pattern
 
+    def __init__(self, img: QImage, keepraw=False):
+        self.image = img.scaled(self.w, self.h).convertToFormat(
+            QImage.Format.Format_RGB32
+        )
+        # RGB32每行128*4字节，没有对齐填充
+        self.data = string_at(
+            int(self.image.constBits()),
+            self.image.bytesPerLine() * self.image.height(),
+        )
+        # 严格模式要比较原图是否完全相同
+        self.raw = img if keepraw else None
+        self.__hash = None
 
-def compareImage(img1, img2, h=24, w=128):
-    cnt = 0
-    for i in range(w):
-        for j in range(h):
-            cnt += img1.pixel(i, j) == img2.pixel(i, j)
-    return cnt / (w * h)
+    def size(self):
+        return self.image.size()
+
+    def __diff(self, other: "imagethumb"):
+        # 返回的bytes中，每个像素对应4字节，不同的像素第一个字节为1，其余全为0
+        x = int.from_bytes(self.data, "little") ^ int.from_bytes(other.data, "little")
+        for shift, mask in self.__folds:
+            x = (x | (x >> shift)) & mask
+        return x.to_bytes(len(self.data), "little")
+
+    def similarity(self, other: "imagethumb"):
+        if self.data == other.data:
+            return 1.0
+        return 1 - self.__diff(other).count(b"\x01") / (self.w * self.h)
+
+    @property
+    def hash(self):
+        # 均值哈希：8x8灰度，亮于平均值的为1
+        if self.__hash is None:
+            small = self.image.scaled(
+                8,
+                8,
+                Qt.AspectRatioMode.IgnoreAspectRatio,
+                Qt.TransformationMode.SmoothTransformation,
+            ).convertToFormat(QImage.Format.Format_Grayscale8)
+            gray = b"".join(
+                string_at(int(small.constBits()) + small.bytesPerLine() * y, 8)
+                for y in range(8)
+            )
+            mean = sum(gray) / 64
+            self.__hash = sum(1 << i for i, v in enumerate(gray) if v > mean)
+        return self.__hash
+
+    def hashdistance(self, other: "imagethumb"):
+        # 0~64，越小越相似，对轻微的整体亮度、颜色变化不敏感
+        return bin(self.hash ^ other.hash).count("1")
+
+    def __blockdiffs(self, other: "imagethumb"):
+        # 返回每块中不同的像素数，按(列,行)索引
+        diffs = {}
+        diff = self.__diff(other)
+        for by in range(self.h // self.blockh):
+            for bx in range(self.w // self.blockw):
+                cnt = 0
+                for y in range(by * self.blockh, (by + 1) * self.blockh):
+                    start = (y * self.w + bx * self.blockw) * 4
+                    cnt += diff.count(b"\x01", start, start + self.blockw * 4)
+                diffs[(bx, by)] = cnt
+        return diffs
+
+    def changedblocks(self, other: "imagethumb", threshold=0.9):
+        # 返回相似度低于threshold的块的(列,行)
+        if self.data == other.data:
+            return []
+        return [
+            block
+            for block, cnt in self.__blockdiffs(other).items()
+            if cnt > (1 - threshold) * self.blockw * self.blockh
+        ]
+
+    def blocksimilarity(self, other: "imagethumb"):
+        # 变化最大的块的相似度。文本变化集中在少数几块中，会使这几块的相似度很低；
+        # 背景粒子之类零星的变化分散在各块，每块只有几个像素不同
+        if self.data == other.data:
+            return 1.0
+        return 1 - max(self.__blockdiffs(other).values()) / (self.blockw * self.blockh)
+
+
+def normqimage(img: QImage, keepraw=False):
+    return imagethumb(img, keepraw)
+
+
+def compareImage(img1: imagethumb, img2: imagethumb):
+    # ocr_compare_method 0：逐像素 1：感知哈希 2：分块
+    method = globalconfig["ocr_compare_method"]
+    if method == 1:
+        return 1 - img1.hashdistance(img2) / 64
+    elif method == 2:
+        return img1.blocksimilarity(img2)
+    return img1.similarity(img2)
 
 
 class ocrtext(basetext):
@@ -162,10 +263,13 @@ class ocrtext(basetext):
 
     def waitforstable(self, i, imgr, strict):
         if strict:
-            imgr1 = imgr
+            # 保存的仍然是缩略图，非严格模式可以直接比较
+            imgr1 = normqimage(imgr, keepraw=True)
             if self.savelastimg[i] is not None:
-                a = qimage2binary(imgr1)
-                b = qimage2binary(self.savelastimg[i])
+                last: imagethumb = self.savelastimg[i]
+                last = last.image if last.raw is None else last.raw
+                a = qimage2binary(imgr)
+                b = qimage2binary(last)
                 image_score = a != b
             else:
                 image_score = 0
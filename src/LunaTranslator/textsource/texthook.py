@@ -169,9 +169,11 @@ class texthook(basetext):
         self.keepref = []
         self.selectinghook = None
         self.selectedhook = []
+        # key -> 在selectedhook中的位置，handle_output和多行合并排序时用
+        self.selectedhookrank = {}
         self.usermanualaccepthooks = []
         self.multiselectedcollector = []
-        self.multiselectedcollectorlock = threading.Lock()
+        self.multiselectedcollectorlock = threading.Condition()
         self.lastflushtime = 0
         self.runonce_line = ""
         gobject.baseobject.autoswitchgameuid = False
@@ -179,11 +181,16 @@ class texthook(basetext):
         self.delaycollectallselectedoutput()
         self.autohookmonitorthread()
 
+    def updateselectedhookrank(self):
+        # 整体替换而不是原地修改，输出回调线程读取时无需加锁
+        self.selectedhookrank = {key: i for i, key in enumerate(self.selectedhook)}
+
     def edit_selectedhook_remove(self, key):
         try:
             self.selectedhook.remove(key)
         except:
             pass
+        self.updateselectedhookrank()
         _, _, tp = key
         self.Luna_SyncThread(tp, False)
 
@@ -191,6 +198,7 @@ class texthook(basetext):
         if idx == -1:
             idx = len(self.selectedhook)
         self.selectedhook.insert(idx, key)
+        self.updateselectedhookrank()
         _, _, tp = key
         self.Luna_SyncThread(tp, True)
 
@@ -677,23 +685,33 @@ class texthook(basetext):
 
     @threader
     def delaycollectallselectedoutput(self):
-        while not self.ending:
-            time.sleep(0.01)
-            if time.time() < self.lastflushtime + min(
-                0.1, self.config["textthreaddelay"] / 1000
-            ):
-                continue
-            if len(self.multiselectedcollector) == 0:
-                continue
+        # 没有输出时一直休眠，有输出时只在最后一次输出之后的延迟到期时醒来
+        while True:
             with self.multiselectedcollectorlock:
-                self.dispatchtextlines(self.multiselectedcollector)
-                self.multiselectedcollector.clear()
+                while True:
+                    if self.ending:
+                        return
+                    if len(self.multiselectedcollector) == 0:
+                        self.multiselectedcollectorlock.wait()
+                        continue
+                    remain = (
+                        self.lastflushtime
+                        + min(0.1, self.config["textthreaddelay"] / 1000)
+                        - time.time()
+                    )
+                    if remain <= 0:
+                        break
+                    self.multiselectedcollectorlock.wait(remain)
+                collector = self.multiselectedcollector
+                self.multiselectedcollector = []
+            try:
+                self.dispatchtextlines(collector)
+            except:
+                print_exc()
 
     def dispatchtextlines(self, keyandtexts):
-        try:
-            keyandtexts.sort(key=lambda xx: self.selectedhook.index(xx[0]))
-        except:
-            pass
+        rank = self.selectedhookrank
+        keyandtexts.sort(key=lambda xx: rank.get(xx[0], len(rank)))
         _collector = globalconfig["multihookmergeby"].join([_[1] for _ in keyandtexts])
         self.dispatchtext(_collector)
 
@@ -701,19 +719,20 @@ class texthook(basetext):
         with self.multiselectedcollectorlock:
             self.lastflushtime = time.time()
             self.multiselectedcollector.append((key, text))
+            self.multiselectedcollectorlock.notify()
 
     def handle_output(self, hc, hn, tp, output):
 
         key = (hc, hn.decode("utf8"), tp)
-        if key in self.selectedhook:
-            if len(self.selectedhook) == 1:
+        if key in self.selectedhookrank:
+            if len(self.selectedhookrank) == 1:
                 self.dispatchtext(output)
             else:
                 self.dispatchtext_multiline_delayed(key, output)
         if key == self.selectinghook:
             gobject.baseobject.hookselectdialog.getnewsentencesignal.emit(output)
 
-        gobject.baseobject.hookselectdialog.update_item_new_line.emit(key, output)
+        gobject.baseobject.hookselectdialog.queue_item_new_line(key, output)
 
         return True
 
@@ -744,6 +763,8 @@ class texthook(basetext):
         return self.runonce_line
 
     def end(self):
+        with self.multiselectedcollectorlock:
+            self.multiselectedcollectorlock.notify()
         self.detachall()
         time.sleep(0.1)
 
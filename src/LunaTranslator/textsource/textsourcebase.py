@@ -2,11 +2,17 @@ import threading, gobject, queue
 import sqlite3, json
 from traceback import print_exc
 from myutils.config import globalconfig, savehook_new_data
-from myutils.utils import autosql
+from myutils.utils import autosql, LRUCache
 from sometypes import TranslateResult
 
 
 class basetext:
+    # 打开记录文件时，从各翻译器的长期缓存中预载最近的这么多行
+    warmstartlines = 1000
+    # artificialtrans的版本，见migratesql
+    sqlversion = 1
+    # 一次事务中最多合并的写入数
+    sqlbatchsize = 256
 
     def gettextonce(self):
         return None
@@ -33,8 +39,13 @@ class basetext:
                     sqlfname_all, check_same_thread=False, isolation_level=None
                 )
             )
+            try:
+                self.sqlwrite2.execute("PRAGMA journal_mode=WAL;")
+                self.sqlwrite2.execute("PRAGMA synchronous=NORMAL;")
+            except:
+                print_exc()
             # try:
-            #     self.sqlwrite.execute('CREATE TABLE artificialtrans(id INTEGER PRIMARY KEY AUTOINCREMENT,source TEXT,machineTrans TEXT,userTrans TEXT);')
+            #     self.sqlwrite.execute('CREATE TABLE artificialtrans(id INTEGER PRIMARY KEY AUTOINCREMENT,source TEXT,machineTrans TEXT,origin TEXT);')
             # except:
             #     pass
             try:
@@ -43,9 +54,58 @@ class basetext:
                 )
             except:
                 pass
+            # 很旧的记录文件没有origin列
+            self.sqlhasorigin = "origin" in [
+                _[1]
+                for _ in self.sqlwrite2.execute(
+                    "PRAGMA table_info(artificialtrans);"
+                ).fetchall()
+            ]
+            self.migratesql(self.sqlwrite2)
+            threading.Thread(
+                target=self.sqlitethread, args=(self.sqlqueue, self.sqlwrite2)
+            ).start()
+        except:
+            print_exc()
+        threading.Thread(target=self.warmstarttranscache).start()
+
+    def migratesql(self, sql: sqlite3.Connection):
+        # user_version 0 : 旧版，没有索引，每行文本和每个翻译结果都要全表扫描
+        # user_version 1 : source、origin索引
+        version = sql.execute("PRAGMA user_version;").fetchone()[0]
+        if version >= self.sqlversion:
+            return
+        try:
+            sql.execute("BEGIN;")
+            sql.execute(
+                "CREATE INDEX IF NOT EXISTS artificialtrans_source ON artificialtrans(source);"
+            )
+            if self.sqlhasorigin:
+                sql.execute(
+                    "CREATE INDEX IF NOT EXISTS artificialtrans_origin ON artificialtrans(origin);"
+                )
+            sql.execute("PRAGMA user_version={};".format(self.sqlversion))
+            sql.execute("COMMIT;")
+        except:
+            print_exc()
+            sql.execute("ROLLBACK;")
+
+    def warmstarttranscache(self):
+        try:
+            sources = self.sqlwrite2.execute(
+                "SELECT source FROM artificialtrans ORDER BY id DESC LIMIT ?",
+                (self.warmstartlines,),
+            ).fetchall()
         except:
             print_exc()
-        threading.Thread(target=self.sqlitethread).start()
+            return
+        # 最新的文本最后载入，淘汰时最后被淘汰
+        sources = [_[0] for _ in reversed(sources)]
+        for ts in list(gobject.baseobject.translators.values()):
+            try:
+                ts.warmstart(sources)
+            except:
+                print_exc()
 
     def dispatchtext(self, *arg, **kwarg):
         if self.ending or not self.isautorunning:
@@ -79,68 +139,94 @@ class basetext:
         except:
             pass
 
-    def sqlitethread(self):
-        while not self.ending:
-            task = self.sqlqueue.get()
+    def __collectsqltasks(self, sqlqueue: queue.Queue):
+        # 阻塞等待第一条，然后把已经排队的一起取出，合并到同一个事务中
+        task = sqlqueue.get()
+        if not task:
+            return None
+        tasks = [task]
+        while len(tasks) < self.sqlbatchsize:
+            try:
+                task = sqlqueue.get_nowait()
+            except queue.Empty:
+                break
             if not task:
+                sqlqueue.put(None)
+                break
+            tasks.append(task)
+        return tasks
+
+    def __addwordcount(self, key, lensrc):
+        try:
+            if key not in savehook_new_data[gobject.baseobject.gameuid]:
+                savehook_new_data[gobject.baseobject.gameuid][key] = 0
+            savehook_new_data[gobject.baseobject.gameuid][key] += lensrc
+        except:
+            pass
+
+    def __sqlinsert(self, sql: sqlite3.Connection, src, origin):
+        self.__addwordcount("statistic_wordcount", len(src))
+        if self.sqlhasorigin:
+            cursor = sql.execute(
+                "INSERT INTO artificialtrans(source,machineTrans,origin) SELECT ?,?,? WHERE NOT EXISTS (SELECT 1 FROM artificialtrans WHERE source = ?);",
+                (src, json.dumps({}), origin, src),
+            )
+        else:
+            cursor = sql.execute(
+                "INSERT INTO artificialtrans(source,machineTrans) SELECT ?,? WHERE NOT EXISTS (SELECT 1 FROM artificialtrans WHERE source = ?);",
+                (src, json.dumps({}), src),
+            )
+        if cursor.rowcount > 0:
+            self.__addwordcount("statistic_wordcount_nodump", len(src))
+
+    def __sqlmerge(self, sql: sqlite3.Connection, machinetrans: LRUCache, src, trans):
+        # 只有本线程写入machineTrans，所以缓存解析后的结果，同一句的多个翻译结果不必每次都重新解析
+        ret = machinetrans.get(src)
+        if ret is None:
+            ret = sql.execute(
+                "SELECT machineTrans FROM artificialtrans WHERE source = ?",
+                (src,),
+            ).fetchone()
+            if not ret:
+                return
+            ret = json.loads((ret[0]))
+        ret.update(trans)
+        machinetrans.put(src, ret)
+        sql.execute(
+            "UPDATE artificialtrans SET machineTrans = ? WHERE source = ?",
+            (json.dumps(ret, ensure_ascii=False), src),
+        )
+
+    def sqlitethread(self, sqlqueue: queue.Queue, sql: sqlite3.Connection):
+        machinetrans = LRUCache(self.sqlbatchsize * 4)
+        while not self.ending:
+            tasks = self.__collectsqltasks(sqlqueue)
+            if tasks is None:
                 break
+            # 先写入所有新的行，再把同一句的所有翻译结果合并为一次更新
+            merges = {}
+            try:
+                sql.execute("BEGIN;")
+            except:
+                print_exc()
+            for task in tasks:
+                try:
+                    if len(task) == 2:
+                        self.__sqlinsert(sql, *task)
+                    elif len(task) == 3:
+                        src, clsname, trans = task
+                        if src not in merges:
+                            merges[src] = {}
+                        merges[src][clsname] = trans
+                except:
+                    print_exc()
+            for src, trans in merges.items():
+                try:
+                    self.__sqlmerge(sql, machinetrans, src, trans)
+                except:
+                    print_exc()
             try:
-                if len(task) == 2:
-                    src, origin = task
-                    lensrc = len(src)
-                    ret = self.sqlwrite2.execute(
-                        "SELECT * FROM artificialtrans WHERE source = ?", (src,)
-                    ).fetchone()
-                    try:
-                        if (
-                            "statistic_wordcount"
-                            not in savehook_new_data[gobject.baseobject.gameuid]
-                        ):
-                            savehook_new_data[gobject.baseobject.gameuid][
-                                "statistic_wordcount"
-                            ] = 0
-                        savehook_new_data[gobject.baseobject.gameuid][
-                            "statistic_wordcount"
-                        ] += lensrc
-                    except:
-                        pass
-                    if ret is None:
-                        try:
-                            self.sqlwrite2.execute(
-                                "INSERT INTO artificialtrans VALUES(NULL,?,?,?);",
-                                (src, json.dumps({}), origin),
-                            )
-                        except:
-                            self.sqlwrite2.execute(
-                                "INSERT INTO artificialtrans VALUES(NULL,?,?);",
-                                (src, json.dumps({})),
-                            )
-                        try:
-                            if (
-                                "statistic_wordcount_nodump"
-                                not in savehook_new_data[gobject.baseobject.gameuid]
-                            ):
-                                savehook_new_data[gobject.baseobject.gameuid][
-                                    "statistic_wordcount_nodump"
-                                ] = 0
-                            savehook_new_data[gobject.baseobject.gameuid][
-                                "statistic_wordcount_nodump"
-                            ] += lensrc
-                        except:
-                            pass
-                elif len(task) == 3:
-                    src, clsname, trans = task
-                    ret = self.sqlwrite2.execute(
-                        "SELECT machineTrans FROM artificialtrans WHERE source = ?",
-                        (src,),
-                    ).fetchone()
-                    ret = json.loads((ret[0]))
-                    ret[clsname] = trans
-                    ret = json.dumps(ret, ensure_ascii=False)
-                    self.sqlwrite2.execute(
-                        "UPDATE artificialtrans SET machineTrans = ? WHERE source = ?",
-                        (ret, src),
-                    )
+                sql.execute("COMMIT;")
             except:
                 print_exc()
 
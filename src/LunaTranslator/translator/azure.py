@@ -3,7 +3,14 @@ import uuid
 
 
 class TS(basetrans):
+    # https://learn.microsoft.com/azure/ai-services/translator/service-limits : up to 1000 elements, 50000 characters
+    batch_max_lines = 1000
+    batch_max_chars = 50000
+
     def translate(self, query):
+        return self.translate_batch([query])[0]
+
+    def translate_batch(self, queries):
         self.checkempty(["key1"])
 
         # Add your key and endpoint
@@ -28,13 +35,13 @@ class TS(basetrans):
         }
 
         # You can pass more than one object in body.
-        body = [{"text": query}]
+        body = [{"text": query} for query in queries]
 
         request = self.proxysession.post(
             constructed_url, params=params, headers=headers, json=body
         )
         response = request.json()
         try:
-            return response[0]["translations"][0]["text"]
+            return [_["translations"][0]["text"] for _ in response]
         except:
             raise Exception(request)
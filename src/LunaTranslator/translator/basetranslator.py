@@ -1,19 +1,20 @@
 from traceback import print_exc
-from queue import Queue
-from threading import Thread
+from threading import Thread, Event, Lock
 import time, types
 import zhconv, gobject
-import sqlite3, json
+import json
 import functools
+from collections import OrderedDict
 from myutils.config import globalconfig, translatorsetting
 from myutils.utils import (
     stringfyerror,
-    autosql,
     PriorityQueue,
     SafeFormatter,
     dynamicapiname,
 )
 from myutils.commonbase import ArgsEmptyExc, commonbase
+from myutils.wrapper import threadpool
+from myutils.transcache import longtermcache, shorttermcache
 from language import Languages
 
 
@@ -21,27 +22,39 @@ class Interrupted(Exception):
     pass
 
 
-class Threadwithresult(Thread):
-    def __init__(self, func):
-        super(Threadwithresult, self).__init__()
+class Threadwithresult:
+    # 在该翻译器的线程池中运行，不再每次请求都新建线程
+    def __init__(self, func, key):
         self.func = func
+        self.key = key
         self.isInterrupted = True
+        self.abandoned = False
         self.exception = None
+        self.finished = Event()
+
+    def start(self):
+        threadpool.get("translator", self.key).submit(self.run)
 
     def run(self):
+        # 还在排队时就已经被新请求打断的，不再发出请求。
+        # 只有不需要等待结果的请求会被打断，调用方已经按Interrupted处理，所以不需要再回调
+        if self.abandoned:
+            return
         try:
             self.result = self.func()
         except Exception as e:
             self.exception = e
         self.isInterrupted = False
+        self.finished.set()
 
     def get_result(self, checktutukufunction=None):
         # Thread.join(self,timeout)
         # 不再超时等待，只检查是否是最后一个请求，若是则无限等待，否则立即放弃。
         while checktutukufunction and checktutukufunction() and self.isInterrupted:
-            Thread.join(self, 0.1)
+            self.finished.wait(0.1)
 
         if self.isInterrupted:
+            self.abandoned = True
             raise Interrupted()
         elif self.exception:
             raise self.exception
@@ -49,8 +62,8 @@ class Threadwithresult(Thread):
             return self.result
 
 
-def timeoutfunction(func, checktutukufunction=None):
-    t = Threadwithresult(func)
+def timeoutfunction(func, key, checktutukufunction=None):
+    t = Threadwithresult(func, key)
     t.start()
     return t.get_result(checktutukufunction)
 
@@ -67,18 +80,35 @@ class basetrans(commonbase):
     def translate(self, content):
         return ""
 
+    def translate_batch(self, contents):
+        # Translate several sentences in one request and return a list in the same order. Only implemented when the api supports it, otherwise translate them one by one.
+        # Each batch contains at most batch_max_lines sentences and batch_max_chars characters.
+        results = []
+        for i, content in enumerate(contents):
+            if i:
+                self.waitrequestinterval()
+            results.append(self.collectiterres(self.translate(content)))
+        return results
+
     ############################################################
     _globalconfig_key = "fanyi"
     _setting_dict = translatorsetting
     using_gpt_dict = False
     _compatible_flag_is_sakura_less_than_5_52_3 = True
+    batch_max_lines = 1
+    batch_max_chars = 5000
 
     def __init__(self, typename):
         super().__init__(typename)
         if (self.transtype == "offline") and (not self.is_gpt_like):
             globalconfig["fanyi"][self.typename]["useproxy"] = False
         self.queue = PriorityQueue()
+        # 批量翻译在translate线程池中运行，与_fythread互斥，避免同时重新初始化或同时请求
+        self.requestlock = Lock()
+        # _fythread在等待requestlock时设置，批量翻译在两批之间让出，实时翻译优先
+        self.livewaiting = Event()
         self.sqlqueue = None
+        self._longtermcache = None
         try:
             self._private_init()
         except Exception as e:
@@ -91,37 +121,25 @@ class basetrans(commonbase):
             print_exc()
 
         self.lastrequesttime = 0
-        self._cache = {}
 
         self.newline = None
 
         if self.transtype != "pre":
             try:
-
-                self.sqlwrite2 = autosql(
-                    sqlite3.connect(
-                        gobject.gettranslationrecorddir(
-                            "cache/{}.sqlite".format(self.typename)
-                        ),
-                        check_same_thread=False,
-                        isolation_level=None,
+                self._longtermcache = longtermcache(
+                    gobject.gettranslationrecorddir(
+                        "cache/{}.sqlite".format(self.typename)
                     )
                 )
-                try:
-                    self.sqlwrite2.execute(
-                        "CREATE TABLE cache(srclang,tgtlang,source,trans);"
-                    )
-                except:
-                    pass
+                self.sqlqueue = self._longtermcache.queue
+                Thread(target=self._sqlitethread).start()
             except:
-                print_exc
-            self.sqlqueue = Queue()
-            Thread(target=self._sqlitethread).start()
+                print_exc()
         Thread(target=self._fythread).start()
 
     def notifyqueuforend(self):
-        if self.sqlqueue:
-            self.sqlqueue.put(None)
+        if self._longtermcache:
+            self._longtermcache.end()
         self.queue.put(None, 999)
 
     def _private_init(self):
@@ -131,21 +149,8 @@ class basetrans(commonbase):
 
     def _sqlitethread(self):
         while self.using:
-            task = self.sqlqueue.get()
-            if task is None:
+            if not self._longtermcache.writeonce():
                 break
-            try:
-                src, trans = task
-                self.sqlwrite2.execute(
-                    "DELETE from cache WHERE (srclang=? and tgtlang=? and source=?)",
-                    (str(self.srclang_1), str(self.tgtlang_1), src),
-                )
-                self.sqlwrite2.execute(
-                    "INSERT into cache VALUES(?,?,?,?)",
-                    (str(self.srclang_1), str(self.tgtlang_1), src, trans),
-                )
-            except:
-                print_exc()
 
     @property
     def use_trans_cache(self):
@@ -191,42 +196,39 @@ class basetrans(commonbase):
         self.queue.put(content, priority)
 
     def longtermcacheget(self, src):
-        try:
-            ret = self.sqlwrite2.execute(
-                "SELECT trans FROM cache WHERE (( (srclang=? and tgtlang=?) or  (srclang=? and tgtlang=?)) and source=?)",
-                (
-                    str(self.srclang_1),
-                    str(self.tgtlang_1),
-                    str(self.srclang),
-                    str(self.tgtlang),
-                    src,
-                ),
-            ).fetchone()
-            if ret:
-                return ret[0]
+        if not self._longtermcache:
             return None
+        try:
+            return self._longtermcache.get(
+                src,
+                (self.srclang_1, self.tgtlang_1),
+                (self.srclang, self.tgtlang),
+            )
         except:
             print_exc()
             return None
 
     def longtermcacheset(self, src, tgt):
-        self.sqlqueue.put((src, tgt))
+        if not self._longtermcache:
+            return
+        self._longtermcache.put(self.srclang_1, self.tgtlang_1, src, tgt)
 
     def shorttermcacheget(self, src):
-        langkey = (self.srclang_1, self.tgtlang_1)
-        if langkey not in self._cache:
-            self._cache[langkey] = {}
-        try:
-            return self._cache[langkey][src]
-        except KeyError:
-            return None
+        return shorttermcache.get(self.typename, self.srclang_1, self.tgtlang_1, src)
 
     def shorttermcacheset(self, src, tgt):
-        langkey = (self.srclang_1, self.tgtlang_1)
+        shorttermcache.set(self.typename, self.srclang_1, self.tgtlang_1, src, tgt)
 
-        if langkey not in self._cache:
-            self._cache[langkey] = {}
-        self._cache[langkey][src] = tgt
+    def warmstart(self, sources):
+        # 从长期缓存中预先载入当前游戏最近的文本
+        if not self._longtermcache:
+            return
+        for src in sources:
+            if shorttermcache.full:
+                break
+            res = self.longtermcacheget(src)
+            if res:
+                self.shorttermcacheset(src, res)
 
     def shortorlongcacheget(self, content, is_auto_run):
         if self.is_gpt_like and not is_auto_run:
@@ -241,6 +243,14 @@ class basetrans(commonbase):
             return res
         return None
 
+    def waitrequestinterval(self):
+        sleeptime = globalconfig["requestinterval"] - (
+            time.time() - self.lastrequesttime
+        )
+        if sleeptime > 0:
+            time.sleep(sleeptime)
+        self.lastrequesttime = time.time()
+
     def intervaledtranslate(self, content):
         interval = globalconfig["requestinterval"]
         current = time.time()
@@ -352,6 +362,75 @@ class basetrans(commonbase):
         self.shorttermcacheset(cache_use, res)
         self.longtermcacheset(cache_use, res)
 
+    @staticmethod
+    def collectiterres(res):
+        if not isinstance(res, types.GeneratorType):
+            return res
+        collectiterres = ""
+        for _res in res:
+            if _res == "\0":
+                collectiterres = ""
+            else:
+                collectiterres += _res
+        return collectiterres
+
+    def splitbatches(self, contents):
+        batch = []
+        chars = 0
+        for content in contents:
+            if batch and (
+                (len(batch) >= self.batch_max_lines)
+                or (chars + len(content) > self.batch_max_chars)
+            ):
+                yield batch
+                batch = []
+                chars = 0
+            batch.append(content)
+            chars += len(content)
+        if batch:
+            yield batch
+
+    def translate_batch_and_collect(self, contents, is_auto_run=False):
+        # 批量翻译：先逐句查缓存，相同的句子只翻译一次，其余的按批量上限分组交给translate_batch，结果逐句存入缓存
+        if self.srclang_1 == self.tgtlang_1:
+            return list(contents)
+        results = {}
+        todo = OrderedDict()
+        for content in contents:
+            if (content in results) or (content in todo):
+                continue
+            if not content.strip():
+                results[content] = content
+                continue
+            res = self.shortorlongcacheget(content, is_auto_run)
+            if res:
+                results[content] = res
+            else:
+                todo[content] = None
+        for batch in self.splitbatches(todo):
+            # 每批单独加锁，批与批之间_fythread可以插入实时的翻译请求
+            while self.livewaiting.is_set() and self.using:
+                time.sleep(0.01)
+            with self.requestlock:
+                self.maybeneedreinit()
+                self.waitrequestinterval()
+                try:
+                    ress = self.multiapikeywrapper(self.translate_batch)(batch)
+                    ress = [self.collectiterres(res) for res in ress]
+                except:
+                    self.needreinit = True
+                    raise
+            if len(ress) != len(batch):
+                raise Exception("batch translation result count mismatch")
+            for content, res in zip(batch, ress):
+                results[content] = res
+                self.shorttermcacheset(content, res)
+                self.longtermcacheset(content, res)
+        results = [results[content] for content in contents]
+        if self.needzhconv:
+            results = [zhconv.convert(res, "zh-tw") for res in results]
+        return results
+
     def __parse_gpt_dict(self, contentsolved, optimization_params):
         gpt_dict = []
         contentraw = contentsolved
@@ -396,27 +475,31 @@ class basetrans(commonbase):
                     # 检查请求队列是否空，请求队列有新的请求，则放弃当前请求。但对于内嵌翻译请求，不可以放弃。
                     continue
 
-                self.maybeneedreinit()
-
-                if self.using_gpt_dict:
-                    contentsolved = self.__parse_gpt_dict(
-                        contentsolved, optimization_params
-                    )
-
-                func = functools.partial(
-                    self.translate_and_collect,
-                    contentsolved,
-                    is_auto_run,
-                    callback,
-                )
-                if self.transtype == "offline":
-                    # 离线翻译例如sakura不要被中断，因为即使中断了，部署的服务仍然在运行，直到请求结束
-                    func()
-                else:
-                    timeoutfunction(
-                        func,
-                        checktutukufunction=checktutukufunction,
+                self.livewaiting.set()
+                with self.requestlock:
+                    self.livewaiting.clear()
+                    self.maybeneedreinit()
+
+                    if self.using_gpt_dict:
+                        contentsolved = self.__parse_gpt_dict(
+                            contentsolved, optimization_params
+                        )
+
+                    func = functools.partial(
+                        self.translate_and_collect,
+                        contentsolved,
+                        is_auto_run,
+                        callback,
                     )
+                    if self.transtype == "offline":
+                        # 离线翻译例如sakura不要被中断，因为即使中断了，部署的服务仍然在运行，直到请求结束
+                        func()
+                    else:
+                        timeoutfunction(
+                            func,
+                            self.typename,
+                            checktutukufunction=checktutukufunction,
+                        )
             except Exception as e:
                 if not (self.using):
                     continue
@@ -4,6 +4,9 @@ from language import Languages
 
 
 class TS(basetrans):
+    # https://developers.deepl.com/docs/api-reference/translate : up to 50 texts, 128KiB per request
+    batch_max_lines = 50
+    batch_max_chars = 30000
 
     @property
     def srclang(self):
@@ -18,6 +21,9 @@ class TS(basetrans):
         return self.tgtlang_1.upper()
 
     def translate(self, query):
+        return self.translate_batch([query])[0]
+
+    def translate_batch(self, queries):
         if self.config["usewhich"] == 0:
             self.checkempty(["DeepL-Auth-Key"])
             appid = self.multiapikeycurrent["DeepL-Auth-Key"]
@@ -32,7 +38,8 @@ class TS(basetrans):
             "Content-Type": "application/x-www-form-urlencoded",
         }
 
-        data = "text=" + parse.quote(query) + "&target_lang=" + self.tgtlang
+        data = "&".join("text=" + parse.quote(query) for query in queries)
+        data += "&target_lang=" + self.tgtlang
         if not self.is_src_auto:
             data += "&source_lang=" + self.srclang
         response = self.proxysession.post(
@@ -40,6 +47,6 @@ class TS(basetrans):
         )
 
         try:
-            return response.json()["translations"][0]["text"]
+            return [_["text"] for _ in response.json()["translations"]]
         except:
             raise Exception(response)
@@ -4,27 +4,36 @@ from html import unescape
 
 
 class TS(basetrans):
+    # https://cloud.google.com/translate/quotas : up to 128 texts, 5k characters recommended
+    batch_max_lines = 128
+    batch_max_chars = 5000
+
     def langmap(self):
         return {Languages.Chinese: "zh-CN", Languages.TradChinese: "zh-TW"}
 
     def translate(self, query):
+        return self.translate_batch([query])[0]
+
+    def translate_batch(self, queries):
         self.checkempty(["key"])
 
         key = self.multiapikeycurrent["key"]
         params = {
             "key": key,
             "target": self.tgtlang,
-            "q": (query),
+            "q": queries,
         }
         if not self.is_src_auto:
             params["source"] = self.srclang
-        response = self.proxysession.get(
-            "https://translation.googleapis.com/language/translate/v2/", params=params
+        # 多个q放在url中可能过长，用表单提交
+        response = self.proxysession.post(
+            "https://translation.googleapis.com/language/translate/v2/", data=params
         )
 
         try:
-            return unescape(
-                response.json()["data"]["translations"][0]["translatedText"]
-            )
+            return [
+                unescape(_["translatedText"])
+                for _ in response.json()["data"]["translations"]
+            ]
         except:
             raise Exception(response)
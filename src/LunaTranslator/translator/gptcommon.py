@@ -224,6 +224,14 @@ class gptcommon(basetrans):
     def langmap(self):
         return Languages.createenglishlangmap()
 
+    batch_max_lines = 32
+
+    @property
+    def batch_max_chars(self):
+        # 每批的译文连同json的键和引号都要在max_tokens以内。
+        # 按一个字符至少一个token估计，留出一半给json和译文比原文长的部分
+        return max(1, self.config.get("max_tokens", 1024) // 2)
+
     def __init__(self, typename):
         self.context = []
         self.maybeuse = {}
@@ -300,6 +308,42 @@ class gptcommon(basetrans):
         self.context.append({"role": "user", "content": query})
         self.context.append({"role": "assistant", "content": respmessage})
 
+    def translate_batch(self, queries):
+        # 以json对象{"1": 句子1, "2": 句子2, ...}发送，要求返回相同键的json对象。
+        # 仅openai兼容的接口使用，解析失败时退回逐句翻译
+        if (len(queries) == 1) or self.apiurl.startswith(
+            ("https://generativelanguage.googleapis.com", "https://api.anthropic.com")
+        ):
+            return super().translate_batch(queries)
+        extrabody, extraheader = getcustombodyheaders(self.config.get("customparams"))
+        sysprompt = self._gptlike_createsys("使用自定义promt", "自定义promt")
+        sysprompt += "\nThe input is a JSON object whose values are the sentences to translate. Reply with only a JSON object with the same keys, whose values are the translations."
+        query = json.dumps(
+            {str(i + 1): q for i, q in enumerate(queries)}, ensure_ascii=False
+        )
+        message = [
+            {"role": "system", "content": sysprompt},
+            {"role": "user", "content": query},
+        ]
+        data = self.createdata(message, extrabody)
+        data["stream"] = False
+        response = self.proxysession.post(
+            self.createurl(),
+            headers=self.createheaders(extraheader),
+            json=data,
+        )
+        respmessage = common_parse_normal_response(
+            response, self.apiurl, hidethinking=True
+        )
+        try:
+            respmessage = respmessage[
+                respmessage.index("{") : respmessage.rindex("}") + 1
+            ]
+            result = json.loads(respmessage)
+            return [result[str(i + 1)] for i in range(len(queries))]
+        except:
+            return super().translate_batch(queries)
+
     def createurl(self):
         return createurl(self.apiurl)
 
@@ -5,9 +5,80 @@ import os
 import gobject
 import json
 import sqlite3
+import heapq, threading
 import winsharedutils
 
 
+class fuzzyindex:
+    # artificialtrans.source的二元组倒排索引，只对少量候选计算相似度
+    # 新增的行在每次查询时增量加入
+    topk = 64
+
+    def __init__(self, sql: sqlite3.Connection):
+        self.sql = sql
+        self.lock = threading.Lock()
+        self.lastid = 0
+        self.sources = {}
+        self.postings = {}
+
+    @staticmethod
+    def grams(text: str):
+        # 首尾补位，使单字符的句子也有二元组，且每次编辑最多影响2个二元组
+        text = "\0" + text + "\0"
+        return set(text[i : i + 2] for i in range(len(text) - 1))
+
+    def update(self):
+        rows = self.sql.execute(
+            "SELECT rowid, source FROM artificialtrans WHERE rowid > ?",
+            (self.lastid,),
+        ).fetchall()
+        for rowid, source in rows:
+            self.lastid = max(self.lastid, rowid)
+            if not source:
+                continue
+            self.sources[rowid] = source
+            for gram in self.grams(source):
+                if gram not in self.postings:
+                    self.postings[gram] = []
+                self.postings[gram].append(rowid)
+
+    def candidates(self, text: str, simi: int):
+        # simi为百分比的整数，用整数计算上界，避免浮点误差使允许的编辑距离少1
+        grams = self.grams(text)
+        counts = {}
+        for gram in grams:
+            for rowid in self.postings.get(gram, ()):
+                counts[rowid] = counts.get(rowid, 0) + 1
+        length = len(text)
+        candidates = []
+        for rowid, shared in counts.items():
+            _length = len(self.sources[rowid])
+            longer = max(length, _length)
+            # 编辑距离至少是长度差，相似度最多为 短/长
+            if min(length, _length) * 100 < simi * longer:
+                continue
+            # 每次编辑最多使2个二元组不再共有
+            maxdist = (100 - simi) * longer // 100
+            if shared < len(grams) - 2 * maxdist:
+                continue
+            candidates.append((shared, rowid))
+        return heapq.nlargest(self.topk, candidates)
+
+    def search(self, text: str, simi: int):
+        with self.lock:
+            self.update()
+            maxsim = 0
+            best = None
+            for _, rowid in self.candidates(text, simi):
+                dis = winsharedutils.similarity(text, self.sources[rowid])
+                if dis > maxsim:
+                    maxsim = dis
+                    best = rowid
+        if best is None or maxsim * 100 < simi:
+            return None
+        return best
+
+
 class TS(basetrans):
     def unsafegetcurrentgameconfig(self):
         try:
@@ -28,8 +99,14 @@ class TS(basetrans):
                     self.sql = autosql(sqlite3.connect(p1, check_same_thread=False))
             self.paths = (p1, p)
 
+    def getindex(self, sql):
+        if (self.index is None) or (self.index.sql is not sql):
+            self.index = fuzzyindex(sql)
+        return self.index
+
     def init(self):
         self.sql = None
+        self.index = None
         self.paths = (None, None)
         self.checkfilechanged(
             self.unsafegetcurrentgameconfig(), self.config["sqlitefile"]
@@ -47,21 +124,16 @@ class TS(basetrans):
         else:
             sql = self.sql
         if globalconfig["premtsimi2"] < 100:
-            maxsim = 0
-            savet = "{}"
-            ret = sql.execute("SELECT * FROM artificialtrans  ").fetchall()
+            rowid = self.getindex(sql).search(content, globalconfig["premtsimi2"])
+            if rowid is None:
+                return {}
+            ret = sql.execute(
+                "SELECT machineTrans FROM artificialtrans WHERE rowid = ?", (rowid,)
+            ).fetchone()
             if not ret:
                 return {}
-            for line in ret:
-                text = line[1]
-                trans = line[2]
-                dis = winsharedutils.similarity(content, text)
-                if dis > maxsim:
-                    maxsim = dis
-                    if maxsim * 100 >= globalconfig["premtsimi2"]:
-                        savet = trans
             try:
-                ret = json.loads(savet)
+                ret = json.loads(ret[0])
             except:
                 # 旧版兼容
                 ret = {"premt": ret[0]}
@@ -19,50 +19,78 @@ def sign_str(key, s, method):
 
 
 class TS(basetrans):
+    # TextTranslateBatch : 文本总长度需低于6000字符
+    batch_max_lines = 100
+    batch_max_chars = 5000
+
     def langmap(self):
         return {Languages.TradChinese: "zh-TW"}
 
     def trans_tencent(self, q, secret_id, secret_key, fromLang="auto", toLang="en"):
-
-        endpoint = "tmt.tencentcloudapi.com"
         data = {
             "SourceText": q,
             "Source": fromLang,
             "Target": toLang,
             "Action": "TextTranslate",
-            "Nonce": random.randint(32768, 65536),
-            "ProjectId": 0,
-            "Region": [
-                "ap-beijing",
-                "ap-shanghai",
-                "ap-chengdu",
-                "ap-chongqing",
-                "ap-guangzhou",
-                "ap-hongkong",
-                "ap-mumbai",
-                "ap-seoul",
-                "ap-shanghai-fsi",
-                "ap-shenzhen-fsi",
-                "ap-singapore",
-                "ap-tokyo",
-                "ap-bangkok",
-                "eu-frankfurt",
-                "na-ashburn",
-                "na-siliconvalley",
-                "na-toronto",
-            ][
-                self.config["Region"]
-            ],  # https://cloud.tencent.com/document/api/551/15615#.E5.9C.B0.E5.9F.9F.E5.88.97.E8.A1.A8
-            "SecretId": secret_id,
-            "SignatureMethod": "HmacSHA1",
-            "Timestamp": int(time.time()),
-            "Version": "2018-03-21",
         }
-        s = get_string_to_sign("GET", endpoint, data)
+        return self.request_tencent(data, secret_id, secret_key)
+
+    def trans_tencent_batch(
+        self, qs, secret_id, secret_key, fromLang="auto", toLang="en"
+    ):
+        # https://cloud.tencent.com/document/api/551/40566
+        data = {
+            "Source": fromLang,
+            "Target": toLang,
+            "Action": "TextTranslateBatch",
+        }
+        for i, q in enumerate(qs):
+            data["SourceTextList.{}".format(i)] = q
+        # 5000个汉字经过URL编码约45KB，超过GET请求的32KB上限，所以用POST
+        return self.request_tencent(data, secret_id, secret_key, "POST")
+
+    def request_tencent(self, data, secret_id, secret_key, method="GET"):
+
+        endpoint = "tmt.tencentcloudapi.com"
+        data.update(
+            {
+                "Nonce": random.randint(32768, 65536),
+                "ProjectId": 0,
+                "Region": [
+                    "ap-beijing",
+                    "ap-shanghai",
+                    "ap-chengdu",
+                    "ap-chongqing",
+                    "ap-guangzhou",
+                    "ap-hongkong",
+                    "ap-mumbai",
+                    "ap-seoul",
+                    "ap-shanghai-fsi",
+                    "ap-shenzhen-fsi",
+                    "ap-singapore",
+                    "ap-tokyo",
+                    "ap-bangkok",
+                    "eu-frankfurt",
+                    "na-ashburn",
+                    "na-siliconvalley",
+                    "na-toronto",
+                ][
+                    self.config["Region"]
+                ],  # https://cloud.tencent.com/document/api/551/15615#.E5.9C.B0.E5.9F.9F.E5.88.97.E8.A1.A8
+                "SecretId": secret_id,
+                "SignatureMethod": "HmacSHA1",
+                "Timestamp": int(time.time()),
+                "Version": "2018-03-21",
+            }
+        )
+        s = get_string_to_sign(method, endpoint, data)
         data["Signature"] = sign_str(secret_key, s, hashlib.sha1)
 
         # 此处会实际调用，成功后可能产生计费
-        r = self.proxysession.get("https://" + endpoint, params=data)
+        if method == "POST":
+            r = self.proxysession.post("https://" + endpoint, data=data)
+        else:
+            r = self.proxysession.get("https://" + endpoint, params=data)
         # print(r.json())
         return r
 
@@ -77,3 +105,19 @@ class TS(basetrans):
             return ret.json()["Response"]["TargetText"]
         except:
             raise Exception(ret)
+
+    def translate_batch(self, queries):
+        if len(queries) == 1:
+            return [self.translate(queries[0])]
+        self.checkempty(["SecretId", "SecretKey"])
+
+        appid = self.multiapikeycurrent["SecretId"]
+        secretKey = self.multiapikeycurrent["SecretKey"]
+
+        ret = self.trans_tencent_batch(
+            queries, appid, secretKey, self.srclang, self.tgtlang
+        )
+        try:
+            return ret.json()["Response"]["TargetTextList"]
+        except:
+            raise Exception(ret)
@@ -1,7 +1,11 @@
 from myutils.config import savehook_new_data, globalconfig
 import gobject
 from qtsymbols import *
-from myutils.utils import postusewhich, case_insensitive_replace
+from myutils.utils import (
+    postusewhich,
+    multipatternmatcher,
+    case_insensitive_replace_all,
+)
 from myutils.config import get_launchpath
 from myutils.hwnd import getExeIcon
 from gui.inputdialog import postconfigdialog_
@@ -57,22 +61,55 @@ class Process:
         self.zhanweifu += 1
         return xx
 
+    __matcherkey = None
+
+    def __getmatcher(self):
+        # 只有当前使用的词典内容变化时才重新构建。
+        # 设置窗口应用时会重新生成列表中所有的dict，所以和parsemayberegexreplace一样用dict的id作为key，
+        # 保留的列表使这些id不会被复用
+        glossary = self.usewhich()
+        key = tuple(map(id, glossary))
+        if key != self.__matcherkey:
+            self.__glossary = list(glossary)
+            self.__matcher = multipatternmatcher([gpt["src"] for gpt in glossary])
+            # 相同的原文只取第一条
+            srcs = set()
+            self.__firsts = set()
+            for idx, gpt in enumerate(glossary):
+                if gpt["src"] in srcs:
+                    continue
+                srcs.add(gpt["src"])
+                self.__firsts.add(idx)
+            self.__matcherkey = key
+        return self.__matcher, self.__glossary, self.__firsts
+
     def process_before(self, japanese):
-        used = []
-        gpt_dict = []
-        srcs = set()
-        for gpt in self.usewhich():
-            src = gpt["src"]
-            if src in srcs:
-                continue
-            srcs.add(src)
-            if src not in japanese:
-                continue
-            gpt_dict.append(gpt)
-            used.append((src, gpt["dst"]))
+        matcher, glossary, firsts = self.__getmatcher()
+        matches = list(matcher.finditer(japanese))
+        used = sorted(set(idx for _, _, idx in matches))
+        # 发给大模型的词典包含所有出现的词条，被更长的词条覆盖的也算，注释等从当前的词条读取
+        gpt_dict = [
+            glossary[idx]
+            for idx in sorted(matcher.findall(japanese))
+            if idx in firsts
+        ]
 
         self.zhanweifu = 0
-        japanese1, mp1 = self.process_before1(japanese, used)
+        mp1 = {}
+        fakes = {}
+        for idx in used:
+            xx = self.__createfake()
+            fakes[idx] = xx
+            mp1[xx] = glossary[idx]["dst"]
+
+        collect = []
+        last = 0
+        for start, end, idx in matches:
+            collect.append(japanese[last:start])
+            collect.append(fakes[idx])
+            last = end
+        collect.append(japanese[last:])
+        japanese1 = "".join(collect)
 
         return japanese1, {
             "gpt_dict": gpt_dict,
@@ -80,18 +117,5 @@ class Process:
             "zhanweifu": mp1,
         }
 
-    def process_before1(self, content: str, dic: list):
-        mp1 = {}
-        for k, v in dic:
-            if not k:
-                continue
-            xx = self.__createfake()
-            content = content.replace(k, xx)
-            mp1[xx] = v
-        return content, mp1
-
     def process_after(self, res: str, context):
-        mp1 = context["zhanweifu"]
-        for key in mp1:
-            res = case_insensitive_replace(res, key, mp1[key])
-        return res
+        return case_insensitive_replace_all(res, context["zhanweifu"])
@@ -1,6 +1,6 @@
 from myutils.config import globalconfig
 import functools
-from myutils.wrapper import threader
+from myutils.wrapper import pooled
 from traceback import print_exc
 from myutils.utils import LRUCache, stringfyerror
 from myutils.commonbase import commonbase
@@ -109,7 +109,8 @@ class TTSbase(commonbase):
         super().__init__(typename)
         self.playaudiofunction = playaudiofunction
         self.uid = uid
-        self.LRUCache = LRUCache(3)
+        # 按音频字节数限制缓存大小，只缓存完整的音频数据
+        self.LRUCache = LRUCache(32 * 1024 * 1024, sizeof=lambda _: len(_.data))
         if privateconfig is None:
             self.privateconfig = globalconfig["reader"][self.typename]
         else:
@@ -131,7 +132,7 @@ class TTSbase(commonbase):
 
         self.ttscallback(content, functools.partial(_, force, self.volume, timestamp))
 
-    @threader
+    @pooled("io")
     def ttscallback(self, content, callback):
 
         if len(content) == 0:
@@ -147,7 +148,9 @@ class TTSbase(commonbase):
             if data:
                 data = TTSResult(data)
                 callback(data)
-                self.LRUCache.put(key, data)
+                # 流式输出的生成器只能播放一次，无法计算大小，不缓存
+                if isinstance(data.data, bytes):
+                    self.LRUCache.put(key, data)
             else:
                 callback(None)
         except Exception as e:
@@ -0,0 +1,123 @@
+# LRUCache的基准测试。
+# 对比旧的实现（dict加list记录顺序，每次命中和淘汰都要在list中查找、删除）和现在基于OrderedDict的实现。
+# 场景为文本去重（post.dedump：每行先setcap再test）以及按大小限制的缓存（get/put，sizeof=len），
+# 并检查两者的结果相同。
+# 在src目录下运行：
+# python scripts/bench_lrucache.py
+# python scripts/bench_lrucache.py --ops 500000 --capacity 1000 10000 100000
+import os, sys, time, random, argparse, threading
+
+rootDir = os.path.dirname(__file__)
+if not rootDir:
+    rootDir = os.path.abspath(".")
+else:
+    rootDir = os.path.abspath(rootDir)
+sys.path.insert(0, os.path.abspath(os.path.join(rootDir, "../LunaTranslator")))
+
+import gobject
+from myutils.utils import LRUCache
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--ops", type=int, default=200000)
+parser.add_argument("--capacity", type=int, nargs="+", default=[100, 1000, 5000])
+args = parser.parse_args()
+
+
+class LegacyLRUCache:
+    def __init__(self, capacity: int):
+        self.cache = {}
+        self.Lock = threading.Lock()
+        self.capacity = capacity
+        self.order = []
+
+    def setcap(self, cap):
+        with self.Lock:
+            if cap == -1:
+                cap = 9999999999
+            self.capacity = cap
+            while len(self.cache) > self.capacity:
+                self.cache.popitem(last=False)
+
+    def __get(self, key):
+        if key in self.cache:
+            self.order.remove(key)
+            self.order.append(key)
+            return self.cache[key]
+        return None
+
+    def get(self, key):
+        with self.Lock:
+            return self.__get(key)
+
+    def __put(self, key, value=True) -> None:
+        if not self.capacity:
+            return
+        if key in self.cache:
+            self.order.remove(key)
+        elif len(self.order) == self.capacity:
+            old_key = self.order.pop(0)
+            del self.cache[old_key]
+        self.cache[key] = value
+        self.order.append(key)
+
+    def put(self, key, value=True) -> None:
+        with self.Lock:
+            self.__put(key, value)
+
+    def test(self, key):
+        with self.Lock:
+            _ = self.__get(key)
+            if not _:
+                self.__put(key)
+            return _
+
+
+def bench(name, legacy, current):
+    t = time.perf_counter()
+    r1 = legacy()
+    t1 = time.perf_counter() - t
+    t = time.perf_counter()
+    r2 = current()
+    t2 = time.perf_counter() - t
+    if r1 != r2:
+        print("{:<30} result mismatch".format(name))
+    print(
+        "{:<30} legacy {:>9.1f} ms   current {:>9.1f} ms   x{:.1f}".format(
+            name, t1 * 1000, t2 * 1000, t1 / max(t2, 1e-9)
+        )
+    )
+
+
+def dedump(cache, capacity, lines):
+    result = []
+    for line in lines:
+        cache.setcap(capacity)
+        result.append(cache.test(line))
+    return result
+
+
+def getput(cache, keys):
+    result = []
+    for key in keys:
+        value = cache.get(key)
+        if value is None:
+            cache.put(key, key * 8)
+        result.append(value)
+    return result
+
+
+rnd = random.Random(0)
+for capacity in args.capacity:
+    # 大约一半的行在最近capacity行内出现过
+    lines = ["line{:08d}".format(rnd.randint(0, capacity * 2)) for _ in range(args.ops)]
+    bench(
+        "dedump cap={}".format(capacity),
+        lambda: dedump(LegacyLRUCache(capacity), capacity, lines),
+        lambda: dedump(LRUCache(capacity), capacity, lines),
+    )
+    # 按大小限制时，同样大小的值相当于按条目数限制，两者的淘汰顺序相同
+    bench(
+        "get/put cap={}".format(capacity),
+        lambda: getput(LegacyLRUCache(capacity), lines),
+        lambda: getput(LRUCache(capacity * len(lines[0]) * 8, sizeof=len), lines),
+    )
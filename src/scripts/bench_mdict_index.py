@@ -0,0 +1,307 @@
+# mdict索引建立的基准测试，不需要真实的词典文件。
+# 生成合成的mdx（文本词条）和mdd（较大的资源，模拟音频包），对比旧的建立方式
+# （list(items())逐块解压、再生成一份元组列表、一次executemany）和现在的流式建立，
+# 以及多个词典依次建立和同时建立。每种方式在单独的子进程中运行，分别统计耗时和峰值内存。
+# 在src目录下运行：
+# python scripts/bench_mdict_index.py
+# python scripts/bench_mdict_index.py --keys 500000 --resources 100000 --resource-size 16 --dicts 4
+import os, sys, time, zlib, json, random, sqlite3, argparse, tempfile, subprocess
+from struct import pack
+
+rootDir = os.path.dirname(__file__)
+if not rootDir:
+    rootDir = os.path.abspath(".")
+else:
+    rootDir = os.path.abspath(rootDir)
+sys.path.insert(0, os.path.abspath(os.path.join(rootDir, "../LunaTranslator")))
+
+from cishu.mdict_.readmdict import MDX, MDD
+from cishu.mdict_ import buildindex
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--keys", type=int, default=200000, help="mdx词条数")
+parser.add_argument("--resources", type=int, default=20000, help="mdd资源数")
+parser.add_argument("--resource-size", type=int, default=16, help="KB")
+parser.add_argument("--dicts", type=int, default=4, help="同时建立的词典数")
+parser.add_argument("--child", nargs="*", help=argparse.SUPPRESS)
+args = parser.parse_args()
+
+
+def peakrss():
+    try:
+        import resource
+
+        # linux上ru_maxrss在exec之后仍保留父进程的峰值，所以自身的峰值从/proc读取
+        # 同时建立时索引在子进程中建立，取其中最大的
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if os.path.exists("/proc/self/status"):
+            with open("/proc/self/status") as ff:
+                for line in ff:
+                    if line.startswith("VmHWM:"):
+                        rss = int(line.split()[1])
+        rss = max(rss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+        return rss / 1024 if sys.platform != "darwin" else rss / 1024 / 1024
+    except ImportError:
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [
+                ("cb", wintypes.DWORD),
+                ("PageFaultCount", wintypes.DWORD),
+                ("PeakWorkingSetSize", ctypes.c_size_t),
+                ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t),
+                ("PeakPagefileUsage", ctypes.c_size_t),
+            ]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        ctypes.windll.psapi.GetProcessMemoryInfo(
+            ctypes.windll.kernel32.GetCurrentProcess(),
+            ctypes.byref(counters),
+            counters.cb,
+        )
+        return counters.PeakWorkingSetSize / 1024 / 1024
+
+
+def compressed(data: bytes):
+    return pack("<L", 2) + pack(">I", zlib.adler32(data) & 0xFFFFFFFF) + zlib.compress(data)
+
+
+def writemdict(fname, entries, utf16, block_size=64 * 1024):
+    # 最简单的MDict 2.0文件：不加密，zlib压缩
+    encoding, term = ("utf-16-le", b"\x00\x00") if utf16 else ("utf-8", b"\x00")
+    header = (
+        '<Dictionary GeneratedByEngineVersion="2.0" RequiredEngineVersion="2.0" '
+        'Encrypted="No" Encoding="UTF-8" Format="Html" Title="synthetic"/>'
+    ).encode("utf-16-le") + b"\x00\x00"
+
+    def blocks(items, size):
+        block = []
+        length = 0
+        for item in items:
+            block.append(item)
+            length += len(item[1])
+            if length >= size:
+                yield block
+                block = []
+                length = 0
+        if block:
+            yield block
+
+    keyentries = []
+    offset = 0
+    for key, data in entries:
+        keyentries.append((offset, key.encode(encoding)))
+        offset += len(data)
+    keyinfo = b""
+    keyblocks = b""
+    numkeyblocks = 0
+    for block in blocks(keyentries, 16 * 1024):
+        raw = b"".join(pack(">Q", offset) + key + term for offset, key in block)
+        data = compressed(raw)
+        head, tail = block[0][1], block[-1][1]
+        unit = 2 if utf16 else 1
+        keyinfo += pack(">Q", len(block))
+        keyinfo += pack(">H", len(head) // unit) + head + term
+        keyinfo += pack(">H", len(tail) // unit) + tail + term
+        keyinfo += pack(">Q", len(data)) + pack(">Q", len(raw))
+        keyblocks += data
+        numkeyblocks += 1
+    keyinfocompressed = (
+        b"\x02\x00\x00\x00"
+        + pack(">I", zlib.adler32(keyinfo) & 0xFFFFFFFF)
+        + zlib.compress(keyinfo)
+    )
+    recordinfo = b""
+    records = []
+    for block in blocks(entries, block_size):
+        raw = b"".join(data for _, data in block)
+        data = compressed(raw)
+        recordinfo += pack(">Q", len(data)) + pack(">Q", len(raw))
+        records.append(data)
+    with open(fname, "wb") as ff:
+        ff.write(pack(">I", len(header)) + header)
+        ff.write(pack("<I", zlib.adler32(header) & 0xFFFFFFFF))
+        numbers = pack(
+            ">QQQQQ",
+            numkeyblocks,
+            len(keyentries),
+            len(keyinfo),
+            len(keyinfocompressed),
+            len(keyblocks),
+        )
+        ff.write(numbers + pack(">I", zlib.adler32(numbers) & 0xFFFFFFFF))
+        ff.write(keyinfocompressed)
+        ff.write(keyblocks)
+        ff.write(
+            pack(
+                ">QQQQ",
+                len(records),
+                len(keyentries),
+                len(recordinfo),
+                sum(map(len, records)),
+            )
+        )
+        ff.write(recordinfo)
+        for data in records:
+            ff.write(data)
+
+
+def legacy_make_mdict_index(mdd, db_name, ismdx):
+    if os.path.exists(db_name):
+        os.remove(db_name)
+    mdd._key_list = mdd._read_keys()
+    index_list = list(mdd.items())
+    conn = sqlite3.connect(db_name)
+    c = conn.cursor()
+    c.execute(
+        """ CREATE TABLE MDX_INDEX
+           (key_text text not null{},
+            file_pos integer,
+            compressed_size integer,
+            decompressed_size integer,
+            record_start integer,
+            record_end integer,
+            offset integer,
+            key_fold text
+            )""".format(
+            " unique" if (not ismdx) else ""
+        )
+    )
+    tuple_list = [
+        (
+            item["key_text"],
+            item["file_pos"],
+            item["compressed_size"],
+            item["decompressed_size"],
+            item["record_start"],
+            item["record_end"],
+            item["offset"],
+            buildindex.foldkey(item["key_text"]),
+        )
+        for item in index_list
+    ]
+    c.executemany("INSERT INTO MDX_INDEX VALUES (?,?,?,?,?,?,?,?)", tuple_list)
+    c.execute(
+        "CREATE{} INDEX key_index ON MDX_INDEX (key_text)".format(
+            " UNIQUE" if (not ismdx) else ""
+        )
+    )
+    c.execute("CREATE INDEX key_fold_index ON MDX_INDEX (key_fold)")
+    conn.commit()
+    conn.close()
+
+
+def opendict(fname, ismdx):
+    return MDX(fname) if ismdx else MDD(fname)
+
+
+def child(mode, tasks):
+    t = time.perf_counter()
+    if mode == "legacy":
+        for fname, db_name, ismdx in tasks:
+            legacy_make_mdict_index(opendict(fname, ismdx), db_name, ismdx)
+    elif mode == "current":
+        for fname, db_name, ismdx in tasks:
+            buildindex.make_mdict_index(opendict(fname, ismdx), db_name, ismdx)
+    elif mode == "parallel":
+        reports = []
+        finished = buildindex.make_mdict_indexes(
+            tasks, lambda *report: reports.append(report)
+        )
+        assert len(finished) == len(tasks)
+    print(json.dumps(dict(time=time.perf_counter() - t, rss=peakrss())))
+
+
+def run(mode, tasks):
+    out = subprocess.check_output(
+        [sys.executable, __file__, "--child", mode, json.dumps(tasks)]
+    )
+    return json.loads(out.decode().strip().splitlines()[-1])
+
+
+def rows(db_name):
+    conn = sqlite3.connect(db_name)
+    try:
+        return conn.execute(
+            "SELECT key_text,file_pos,compressed_size,decompressed_size,record_start,record_end,offset,key_fold FROM MDX_INDEX ORDER BY rowid"
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def bench(name, legacymode, currentmode, tasks):
+    r1 = run(legacymode, tasks)
+    expect = [rows(db_name) for _, db_name, _ in tasks]
+    r2 = run(currentmode, tasks)
+    if expect != [rows(db_name) for _, db_name, _ in tasks]:
+        print("{:<24} index mismatch".format(name))
+    print(
+        "{:<24} {:<8} {:>7.1f} s {:>7.0f} MB   {:<8} {:>7.1f} s {:>7.0f} MB".format(
+            name,
+            legacymode,
+            r1["time"],
+            r1["rss"],
+            currentmode,
+            r2["time"],
+            r2["rss"],
+        )
+    )
+
+
+def main():
+    rnd = random.Random(0)
+    tmp = tempfile.mkdtemp()
+    t = time.perf_counter()
+    tasks = []
+    for d in range(args.dicts):
+        keys = sorted(
+            set(
+                "".join(rnd.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rnd.randint(3, 12)))
+                for _ in range(args.keys)
+            )
+        )
+        mdx = os.path.join(tmp, "{}.mdx".format(d))
+        writemdict(
+            mdx,
+            [(key, "<div>{} {}</div>".format(key, "text " * 20).encode()) for key in keys],
+            False,
+        )
+        mdd = os.path.join(tmp, "{}.mdd".format(d))
+        writemdict(
+            mdd,
+            [
+                ("\\audio\\{}_{}.mp3".format(d, i), os.urandom(args.resource_size * 1024))
+                for i in range(args.resources)
+            ],
+            True,
+            1024 * 1024,
+        )
+        tasks.append((mdx, mdx + ".db", True))
+        tasks.append((mdd, mdd + ".db", False))
+    print(
+        "{} dicts: {} keys mdx + {} x {} KB mdd ({:.0f} MB), generated in {:.1f} s".format(
+            args.dicts,
+            args.keys,
+            args.resources,
+            args.resource_size,
+            os.path.getsize(tasks[1][0]) / 1024 / 1024,
+            time.perf_counter() - t,
+        )
+    )
+    bench("mdx", "legacy", "current", tasks[:1])
+    bench("mdd", "legacy", "current", tasks[1:2])
+    bench("{} dicts".format(args.dicts), "legacy", "parallel", tasks)
+
+
+if __name__ == "__main__":
+    if args.child:
+        child(args.child[0], json.loads(args.child[1]))
+    else:
+        main()
@@ -0,0 +1,235 @@
+# mdict索引查询的基准测试，不需要真实的词典文件。
+# 生成若干个合成的MDX_INDEX（每个若干万词条），对比旧的查询方式（每次新建连接、拼接SQL、
+# 忽略大小写时lower()全表扫描、资源逐个查询、模糊查询扫描包含该词的全部词条）和IndexBuilder现在的查询方式。
+# 在src目录下运行：
+# python scripts/bench_mdict_lookup.py
+# python scripts/bench_mdict_lookup.py --dicts 8 --keys 500000 --lookups 2000
+import os, sys, time, random, sqlite3, argparse, tempfile, threading
+
+rootDir = os.path.dirname(__file__)
+if not rootDir:
+    rootDir = os.path.abspath(".")
+else:
+    rootDir = os.path.abspath(rootDir)
+sys.path.insert(0, os.path.abspath(os.path.join(rootDir, "../LunaTranslator")))
+
+from cishu.mdict import IndexBuilder
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--dicts", type=int, default=4)
+parser.add_argument("--keys", type=int, default=200000)
+parser.add_argument("--lookups", type=int, default=1000)
+parser.add_argument("--resources", type=int, default=30, help="每个词条引用的资源数")
+parser.add_argument("--distance", type=int, default=1, help="模糊查询的编辑距离")
+args = parser.parse_args()
+
+
+class SyntheticMDict:
+    def __init__(self, keys):
+        self.keys = keys
+        self._fname = "synthetic"
+
+    def _read_keys(self):
+        return self.keys
+
+    def index_items(self):
+        for i, key in enumerate(self.keys):
+            yield dict(
+                key_text=key,
+                file_pos=i * 64,
+                compressed_size=64,
+                decompressed_size=256,
+                record_start=i * 256,
+                record_end=i * 256 + 256,
+                offset=0,
+            )
+
+
+class SyntheticIndex(IndexBuilder):
+    def __init__(self, mdx_db, mdd_dbs):
+        self._mdx_db = mdx_db
+        self._mdd_dbs = mdd_dbs
+        self._mdict_mdds = [self] * len(mdd_dbs)
+        self._progress = None
+        self._conns = {}
+        self._connslock = threading.Lock()
+        self._mdx_file = mdx_db
+        self._fuzzy_db = mdx_db[: -len(".db")] + ".fuzzy.db"
+        self._fuzzylock = threading.Lock()
+        self._fuzzyready = False
+        self._fuzzybuilding = False
+        self._fuzzyfailtime = None
+
+    def read_records(self, index):
+        return index["file_pos"]
+
+
+def randomword(rnd: random.Random):
+    word = "".join(rnd.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rnd.randint(3, 12)))
+    if rnd.random() < 0.2:
+        word = word.capitalize()
+    return word
+
+
+def legacy_lookup_indexes(db, keyword, ignorecase=None):
+    if ignorecase:
+        sql = 'SELECT * FROM MDX_INDEX WHERE lower(key_text) = lower("{}")'.format(
+            keyword
+        )
+    else:
+        sql = 'SELECT * FROM MDX_INDEX WHERE key_text = "{}"'.format(keyword)
+    with sqlite3.connect(db) as conn:
+        return [result[1] for result in conn.execute(sql)]
+
+
+def bench(name, legacy, current):
+    t = time.perf_counter()
+    legacy()
+    t1 = time.perf_counter() - t
+    t = time.perf_counter()
+    current()
+    t2 = time.perf_counter() - t
+    print(
+        "{:<30} legacy {:>9.1f} ms   current {:>9.1f} ms   x{:.1f}".format(
+            name, t1 * 1000, t2 * 1000, t1 / max(t2, 1e-9)
+        )
+    )
+
+
+rnd = random.Random(0)
+tmp = tempfile.mkdtemp()
+indexes = []
+words = []
+t = time.perf_counter()
+for d in range(args.dicts):
+    keys = list(set(randomword(rnd) for _ in range(args.keys)))
+    mdx_db = os.path.join(tmp, "{}.mdx.v3.db".format(d))
+    mdd_db = os.path.join(tmp, "{}.mdd.v3.db".format(d))
+    resources = ["\\res\\{}_{}.png".format(d, i) for i in range(args.keys // 10)]
+    builder = SyntheticIndex(mdx_db, [mdd_db])
+    builder._make_mdict_index(SyntheticMDict(keys), mdx_db, True)
+    builder._make_mdict_index(SyntheticMDict(resources), mdd_db, False)
+    indexes.append((builder, resources))
+    words.extend(rnd.sample(keys, min(len(keys), args.lookups // args.dicts + 1)))
+print(
+    "built {} dicts x {} keys in {:.1f} s".format(
+        args.dicts, args.keys, time.perf_counter() - t
+    )
+)
+words = words[: args.lookups]
+lowerwords = [_.lower() for _ in words]
+
+bench(
+    "exact x{}".format(len(words) * args.dicts),
+    lambda: [
+        legacy_lookup_indexes(index._mdx_db, word)
+        for word in words
+        for index, _ in indexes
+    ],
+    lambda: [
+        index.lookup_indexes(index._mdx_db, word)
+        for word in words
+        for index, _ in indexes
+    ],
+)
+lookups = max(1, len(lowerwords) // 20)
+bench(
+    "ignorecase x{}".format(lookups * args.dicts),
+    lambda: [
+        legacy_lookup_indexes(index._mdx_db, word, True)
+        for word in lowerwords[:lookups]
+        for index, _ in indexes
+    ],
+    lambda: [
+        index.lookup_indexes(index._mdx_db, word, True)
+        for word in lowerwords[:lookups]
+        for index, _ in indexes
+    ],
+)
+entries = [
+    (index, rnd.sample(resources, args.resources))
+    for index, resources in indexes
+    for _ in range(max(1, args.lookups // 20))
+]
+bench(
+    "entry resources x{}".format(len(entries)),
+    lambda: [
+        legacy_lookup_indexes(index._mdd_dbs[0], key)
+        for index, keys in entries
+        for key in keys
+    ],
+    lambda: [index.mdd_lookup_many(keys) for index, keys in entries],
+)
+bench(
+    "prefix keys x{}".format(lookups * args.dicts),
+    lambda: [
+        [
+            _[0]
+            for _ in sqlite3.connect(index._mdx_db).execute(
+                'SELECT key_text FROM MDX_INDEX WHERE key_text LIKE "' + word + '%"'
+            )
+        ]
+        for word in lowerwords[:lookups]
+        for index, _ in indexes
+    ],
+    lambda: [
+        index.get_mdx_keys(word)
+        for word in lowerwords[:lookups]
+        for index, _ in indexes
+    ],
+)
+
+try:
+    from winsharedutils import distance
+except ImportError:
+    # 不在windows上时用纯python的实现，只影响两边的绝对耗时
+    def distance(a, b):
+        prev = list(range(len(b) + 1))
+        for i, ca in enumerate(a, 1):
+            cur = [i]
+            for j, cb in enumerate(b, 1):
+                cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+            prev = cur
+        return prev[-1]
+
+    sys.modules["cishu.mdict"].winsharedutils.distance = distance
+
+t = time.perf_counter()
+for index, _ in indexes:
+    index.makefuzzyindex()
+print("built fuzzy index in {:.1f} s".format(time.perf_counter() - t))
+
+
+def legacy_fuzzy(index: IndexBuilder, word):
+    return [
+        k
+        for k in index.get_mdx_keys("*" + word + "*")
+        if distance(k, word) <= args.distance
+    ]
+
+
+fuzzywords = [
+    word[:i] + rnd.choice("abcdefghijklmnopqrstuvwxyz") + word[i + 1 :]
+    for word in lowerwords[:lookups]
+    for i in [rnd.randrange(len(word))]
+]
+bench(
+    "fuzzy d={} x{}".format(args.distance, lookups * args.dicts),
+    lambda: [legacy_fuzzy(index, word) for word in fuzzywords for index, _ in indexes],
+    lambda: [
+        index.fuzzy_lookup(word, args.distance, 100)
+        for word in fuzzywords
+        for index, _ in indexes
+    ],
+)
+print(
+    "{:<30} legacy {:>9}      current {:>9}".format(
+        "fuzzy matches found",
+        sum(len(legacy_fuzzy(index, word)) for word in fuzzywords for index, _ in indexes),
+        sum(
+            len(index.fuzzy_lookup(word, args.distance, 100))
+            for word in fuzzywords
+            for index, _ in indexes
+        ),
+    )
+)
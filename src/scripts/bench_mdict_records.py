@@ -0,0 +1,120 @@
+# mdict词条读取的基准测试，不需要真实的词典文件。
+# 生成一个由zlib压缩的记录块组成的合成文件，模拟一次查词时连续读取相邻的词条
+# （@@@LINK跳转、同一词条引用的多个资源通常在同一个记录块中），
+# 对比旧的读取方式（每次打开文件、读取并解压整个记录块）和现在的mmap+解码块缓存。
+# 在src目录下运行：
+# python scripts/bench_mdict_records.py
+# python scripts/bench_mdict_records.py --blocks 2000 --block-size 128 --lookups 20000
+import os, sys, time, zlib, random, argparse, tempfile
+from struct import pack
+
+rootDir = os.path.dirname(__file__)
+if not rootDir:
+    rootDir = os.path.abspath(".")
+else:
+    rootDir = os.path.abspath(rootDir)
+sys.path.insert(0, os.path.abspath(os.path.join(rootDir, "../LunaTranslator")))
+
+from cishu.mdict_ import readmdict
+from cishu.mdict_.readmdict import MDict
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--blocks", type=int, default=1000)
+parser.add_argument("--block-size", type=int, default=64, help="KB, 解压后的记录块大小")
+parser.add_argument("--record-size", type=int, default=1024)
+parser.add_argument("--lookups", type=int, default=10000)
+parser.add_argument("--related", type=int, default=8, help="每次查词连续读取的相邻词条数")
+args = parser.parse_args()
+
+
+class SyntheticMDict(MDict):
+    def __init__(self, fname):
+        self._fname = fname
+        self._version = 2.0
+        self._encrypted_key = None
+        self._mmap = None
+        self._mmap_lock = __import__("threading").Lock()
+        self._block_key = (os.path.abspath(fname),)
+
+
+def legacy_read_records(mdict: MDict, index):
+    f = open(mdict._fname, "rb")
+    f.seek(index["file_pos"])
+    record_block_compressed = f.read(index["compressed_size"])
+    f.close()
+    record_block = mdict._decode_block(
+        record_block_compressed,
+        index["decompressed_size"],
+    )
+    return record_block[
+        index["record_start"] - index["offset"] : index["record_end"] - index["offset"]
+    ]
+
+
+rnd = random.Random(0)
+fname = os.path.join(tempfile.mkdtemp(), "synthetic.mdx")
+blocksize = args.block_size * 1024
+records_per_block = blocksize // args.record_size
+indexes = []
+t = time.perf_counter()
+with open(fname, "wb") as ff:
+    offset = 0
+    for b in range(args.blocks):
+        records = [
+            (
+                "<div>{} {}</div>".format(b * records_per_block + i, "word " * 40)
+                * (args.record_size // 220 + 1)
+            ).encode()[: args.record_size]
+            for i in range(records_per_block)
+        ]
+        block = b"".join(records)
+        data = pack("<L", 2) + pack(">I", zlib.adler32(block) & 0xFFFFFFFF)
+        data += zlib.compress(block)
+        file_pos = ff.tell()
+        for i in range(records_per_block):
+            indexes.append(
+                dict(
+                    file_pos=file_pos,
+                    compressed_size=len(data),
+                    decompressed_size=len(block),
+                    record_start=offset + i * args.record_size,
+                    record_end=offset + (i + 1) * args.record_size,
+                    offset=offset,
+                )
+            )
+        ff.write(data)
+        offset += len(block)
+print(
+    "{} blocks x {} KB, {} records, {:.1f} MB file, built in {:.1f} s".format(
+        args.blocks,
+        args.block_size,
+        len(indexes),
+        os.path.getsize(fname) / 1024 / 1024,
+        time.perf_counter() - t,
+    )
+)
+
+mdict = SyntheticMDict(fname)
+# 每次查词：随机一个词条，再读取它附近的若干个词条
+lookups = []
+for _ in range(args.lookups // args.related):
+    start = rnd.randrange(len(indexes) - args.related)
+    lookups.extend(indexes[start : start + args.related])
+
+t = time.perf_counter()
+legacy = [legacy_read_records(mdict, index) for index in lookups]
+t1 = time.perf_counter() - t
+t = time.perf_counter()
+current = [mdict.read_records(index) for index in lookups]
+t2 = time.perf_counter() - t
+assert legacy == current
+print(
+    "{:<24} legacy {:>8.1f} ms   current {:>8.1f} ms   x{:.1f}".format(
+        "{} lookups".format(len(lookups)), t1 * 1000, t2 * 1000, t1 / max(t2, 1e-9)
+    )
+)
+t = time.perf_counter()
+[mdict.read_records(index) for index in lookups]
+t3 = time.perf_counter() - t
+print("{:<24} current {:>8.1f} ms (warm)".format("repeat", t3 * 1000))
+print(readmdict.block_cache.stats())
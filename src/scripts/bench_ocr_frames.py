@@ -0,0 +1,126 @@
+# OCR自动识别中画面变化检测的基准测试，不需要截图。
+# 生成一段合成的帧序列（静止的文本框、逐字出现的文本、整体变化的背景动画），
+# 对比旧的方式（缩放后逐像素调用QImage.pixel比较）和现在的imagethumb，
+# 每帧都和上一帧比较，与自动识别的循环相同，并检查两者的相似度相同。
+# 最后列出三种比较方法（ocr_compare_method）在各场景中的相似度，文本变化时应该低，背景动画时应该高。
+# 在src目录下运行：
+# python scripts/bench_ocr_frames.py
+# python scripts/bench_ocr_frames.py --frames 1000 --width 1280 --height 240
+import os, sys, time, random, argparse
+
+rootDir = os.path.dirname(__file__)
+if not rootDir:
+    rootDir = os.path.abspath(".")
+else:
+    rootDir = os.path.abspath(rootDir)
+sys.path.insert(0, os.path.abspath(os.path.join(rootDir, "../LunaTranslator")))
+
+import gobject
+from qtsymbols import *
+from myutils.config import globalconfig
+from textsource.ocrtext import normqimage, compareImage
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--frames", type=int, default=300, help="每种场景的帧数")
+parser.add_argument("--width", type=int, default=800)
+parser.add_argument("--height", type=int, default=160)
+args = parser.parse_args()
+
+
+def legacy_normqimage(img: QImage):
+    img = img.scaled(128, 8 * 3)
+    return img
+
+
+def legacy_compareImage(img1, img2, h=24, w=128):
+    cnt = 0
+    for i in range(w):
+        for j in range(h):
+            cnt += img1.pixel(i, j) == img2.pixel(i, j)
+    return cnt / (w * h)
+
+
+def newframe(background: QColor):
+    img = QImage(args.width, args.height, QImage.Format.Format_RGB32)
+    img.fill(background)
+    return img
+
+
+def glyphs(img: QImage, count, seed):
+    # 用小方块代替文字
+    rnd = random.Random(seed)
+    painter = QPainter(img)
+    size = args.height // 6
+    for i in range(count):
+        x = 10 + (i % (args.width // size - 1)) * size
+        y = 10 + (i // (args.width // size - 1)) * size
+        painter.fillRect(
+            x, y, size * 3 // 4, size * 3 // 4, QColor(rnd.randint(200, 255), 255, 255)
+        )
+    painter.end()
+    return img
+
+
+def sparkle(img: QImage, seed):
+    # 零星闪烁的背景粒子
+    rnd = random.Random(seed)
+    painter = QPainter(img)
+    for _ in range(40):
+        x, y = rnd.randrange(args.width), rnd.randrange(args.height)
+        painter.fillRect(x, y, 3, 3, QColor(255, 255, 180))
+    painter.end()
+    return img
+
+
+def scenes():
+    n = args.frames
+    yield "static", [glyphs(newframe(QColor(20, 20, 60)), 30, 0) for _ in range(n)]
+    yield "typing", [glyphs(newframe(QColor(20, 20, 60)), i // 3, 0) for i in range(n)]
+    yield "animated", [
+        glyphs(newframe(QColor(20 + i % 50, 20, 60 + i % 30)), 30, 0) for i in range(n)
+    ]
+    yield "sparkle", [
+        sparkle(glyphs(newframe(QColor(20, 20, 60)), 30, 0), i) for i in range(n)
+    ]
+
+
+def run(frames, norm, compare):
+    scores = []
+    last = None
+    t = time.perf_counter()
+    for frame in frames:
+        thumb = norm(frame)
+        if last is not None:
+            scores.append(compare(thumb, last))
+        last = thumb
+    return time.perf_counter() - t, scores
+
+
+for name, frames in scenes():
+    t1, s1 = run(frames, legacy_normqimage, legacy_compareImage)
+    t2, s2 = run(frames, normqimage, compareImage)
+    diff = max(abs(a - b) for a, b in zip(s1, s2))
+    print(
+        "{:<10} x{:<5} legacy {:>8.1f} ms   current {:>8.1f} ms   x{:.1f}   max score diff {:.4f}".format(
+            name, len(frames), t1 * 1000, t2 * 1000, t1 / max(t2, 1e-9), diff
+        )
+    )
+
+for method, methodname in enumerate(("pixel", "hash", "block")):
+    globalconfig["ocr_compare_method"] = method
+    for name, frames in scenes():
+        if name == "static":
+            continue
+        _, scores = run(frames, normqimage, compareImage)
+        if name == "typing":
+            # 每3帧多一个字，只看多了字的帧
+            scores = scores[2::3]
+        print(
+            "{:<6} {:<10} min similarity {:.3f}   mean {:.3f}".format(
+                methodname, name, min(scores), sum(scores) / len(scores)
+            )
+        )
+
+# 严格模式保存的缩略图带有原图，非严格模式可以直接比较
+strict = normqimage(glyphs(newframe(QColor(20, 20, 60)), 30, 0), keepraw=True)
+assert compareImage(normqimage(strict.raw), strict) == 1
@@ -0,0 +1,88 @@
+# OCR结果纠错（ocrerrorfix）的基准测试，使用默认的规则文件files/defaultconfig/ocrerrorfix.json。
+# 对比旧的方式（每一行遍历全部规则，ASCII的规则每条编译一个\b...\b正则）和getocrerrorfixer，
+# 并检查两者的结果相同。
+# 在src目录下运行：
+# python scripts/bench_ocrerrorfix.py
+# python scripts/bench_ocrerrorfix.py --lines 5000 --hits 3
+import os, sys, re, json, time, random, argparse
+
+rootDir = os.path.dirname(__file__)
+if not rootDir:
+    rootDir = os.path.abspath(".")
+else:
+    rootDir = os.path.abspath(rootDir)
+sys.path.insert(0, os.path.abspath(os.path.join(rootDir, "../LunaTranslator")))
+
+import gobject
+from myutils.config import isascii
+from ocrengines.baseocrclass import getocrerrorfixer
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--lines", type=int, default=2000)
+parser.add_argument("--hits", type=int, default=2, help="每行包含的需要纠正的词条数")
+args = parser.parse_args()
+
+
+def legacy_fix(filters: dict, line: str):
+    for fil in filters:
+        if fil == "":
+            continue
+        else:
+            if isascii(fil):
+                line = re.sub(r"\b{}\b".format(re.escape(fil)), fil, line)
+            else:
+                line = line.replace(fil, filters[fil])
+    return line
+
+
+def bench(name, legacy, current):
+    t = time.perf_counter()
+    r1 = legacy()
+    t1 = time.perf_counter() - t
+    t = time.perf_counter()
+    r2 = current()
+    t2 = time.perf_counter() - t
+    if r1 != r2:
+        print("{:<30} result mismatch".format(name))
+    print(
+        "{:<30} legacy {:>9.1f} ms   current {:>9.1f} ms   x{:.1f}".format(
+            name, t1 * 1000, t2 * 1000, t1 / max(t2, 1e-9)
+        )
+    )
+
+
+with open(
+    os.path.join(rootDir, "../files/defaultconfig/ocrerrorfix.json"), "r", encoding="utf8"
+) as ff:
+    filters = json.load(ff)["args"]["替换内容"]
+keys = [_ for _ in filters if _ and not isascii(_)]
+words = [_ for _ in filters if _ and isascii(_)]
+print("{} rules, {} ascii".format(len(filters), len(words)))
+
+rnd = random.Random(0)
+kana = "あいうえおかきくけこさしすせそたちつてとなにぬねのはひふへほまみむめもやゆよらりるれろわをん"
+
+
+def randomline(hits, english):
+    parts = ["".join(rnd.choice(kana) for _ in range(rnd.randint(2, 8))) for _ in range(4)]
+    for _ in range(hits):
+        parts.insert(rnd.randint(0, len(parts)), rnd.choice(keys))
+    if english:
+        parts.insert(rnd.randint(0, len(parts)), " {} ".format(rnd.choice(words)))
+    return "".join(parts)
+
+
+t = time.perf_counter()
+getocrerrorfixer(filters)
+print("compiled in {:.1f} ms".format((time.perf_counter() - t) * 1000))
+for name, hits, english in (
+    ("clean", 0, False),
+    ("{} hits".format(args.hits), args.hits, False),
+    ("{} hits + ascii".format(args.hits), args.hits, True),
+):
+    lines = [randomline(hits, english) for _ in range(args.lines)]
+    bench(
+        "{} x{}".format(name, len(lines)),
+        lambda: [legacy_fix(filters, line) for line in lines],
+        lambda: [getocrerrorfixer(filters)(line) for line in lines],
+    )
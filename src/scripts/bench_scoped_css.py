@@ -0,0 +1,105 @@
+# 词典样式表限定作用域的基准测试，不需要真实的词典文件和网络。
+# 生成一个很大的样式表，模拟反复查词：旧的方式每次查词都用新的随机class重新解析、改写样式表，
+# 现在mdict按词典和url缓存（本地文件修改后失效），在线词典使用固定的class，相同的样式表只改写一次。
+# 在src目录下运行：
+# python scripts/bench_scoped_css.py
+# python scripts/bench_scoped_css.py --rules 20000 --lookups 50
+import os, sys, time, random, argparse, tempfile
+
+rootDir = os.path.dirname(__file__)
+if not rootDir:
+    rootDir = os.path.abspath(".")
+else:
+    rootDir = os.path.abspath(rootDir)
+sys.path.insert(0, os.path.abspath(os.path.join(rootDir, "../LunaTranslator")))
+
+import gobject
+from cishu.cishubase import cishubase, scopedstylesheets
+from cishu.mdict import mdict
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--rules", type=int, default=2000)
+parser.add_argument("--lookups", type=int, default=20)
+args = parser.parse_args()
+
+
+def makestylesheet(rnd: random.Random, rules):
+    tags = ["div", "span", "a", "p", "li", "ul", "b", "i", "img", "table", "td"]
+    lines = ['@charset "UTF-8";', ":root { --main-color: #333; }", "body { margin: 0; }"]
+    for i in range(rules):
+        selector = ", ".join(
+            "{}.c{} {}".format(rnd.choice(tags), rnd.randrange(rules), rnd.choice(tags))
+            for _ in range(rnd.randint(1, 3))
+        )
+        rule = "%s { color: #%06x; margin: %dpx %dpx; font-size: %dpx; }" % (
+            selector,
+            rnd.randrange(1 << 24),
+            rnd.randrange(20),
+            rnd.randrange(20),
+            rnd.randrange(10, 30),
+        )
+        if i % 50 == 0:
+            rule = "@media (max-width: %dpx) { %s }" % (rnd.randrange(300, 1200), rule)
+        lines.append(rule)
+    return "\n".join(lines)
+
+
+def bench(name, legacy, current):
+    t = time.perf_counter()
+    legacy()
+    t1 = time.perf_counter() - t
+    t = time.perf_counter()
+    current()
+    t2 = time.perf_counter() - t
+    print(
+        "{:<28} legacy {:>9.1f} ms   current {:>9.1f} ms   x{:.1f}".format(
+            name, t1 * 1000, t2 * 1000, t1 / max(t2, 1e-9)
+        )
+    )
+
+
+rnd = random.Random(0)
+css = makestylesheet(rnd, args.rules)
+tmp = tempfile.mkdtemp()
+fn = os.path.join(tmp, "synthetic.mdx")
+with open(os.path.join(tmp, "style.css"), "w", encoding="utf8") as ff:
+    ff.write(css)
+print("stylesheet: {} rules, {:.0f} KB".format(args.rules, len(css) / 1024))
+
+base = cishubase.__new__(cishubase)
+md = mdict.__new__(mdict)
+md.csscache = {}
+divclass = md.divclass(fn)
+expect = base.parse_stylesheet(css, divclass)
+assert md.loadcss(None, fn, tmp, "style.css", divclass) == expect
+
+
+def legacy_mdict():
+    for _ in range(args.lookups):
+        with open(os.path.join(tmp, "style.css"), "rb") as ff:
+            content = ff.read()
+        # 旧的mdict每次查词用新的随机class，和不指定class时一样
+        base.parse_stylesheet(content.decode("utf8"))
+
+
+bench(
+    "mdict x{}".format(args.lookups),
+    legacy_mdict,
+    lambda: [
+        md.loadcss(None, fn, tmp, "style.css", divclass) for _ in range(args.lookups)
+    ],
+)
+bench(
+    "online inline style x{}".format(args.lookups),
+    lambda: [
+        base.parse_stylesheet(css) for _ in range(args.lookups)
+    ],
+    lambda: [
+        base.parse_stylesheet(css, "lunawebliocsswrapper") for _ in range(args.lookups)
+    ],
+)
+print(
+    "cached {} sheets, {} chars".format(
+        len(scopedstylesheets.cache), scopedstylesheets.size
+    )
+)
@@ -0,0 +1,173 @@
+# 流式读取响应体的基准测试，对比旧的拼接实现和现在的实现。
+# 模拟网络层交出的数据块：几MB的下载（长行/短行）和很长的LLM流式输出（每个SSE事件一块）。
+# 在src目录下运行：
+# python scripts/bench_streaming.py
+# python scripts/bench_streaming.py --size 32 --events 50000
+import os, sys, time, json, argparse
+
+rootDir = os.path.dirname(__file__)
+if not rootDir:
+    rootDir = os.path.abspath(".")
+else:
+    rootDir = os.path.abspath(rootDir)
+sys.path.insert(0, os.path.abspath(os.path.join(rootDir, "../LunaTranslator")))
+
+from requests import Response, ITER_CHUNK_SIZE, CONTENT_CHUNK_SIZE
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--size", type=int, default=8, help="MB")
+parser.add_argument("--buffer", type=int, default=16, help="KB, 网络层每次交出的大小")
+parser.add_argument("--events", type=int, default=20000)
+args = parser.parse_args()
+
+
+class BenchResponse(Response):
+    def __init__(self, buffers):
+        super().__init__(True)
+        self.buffers = buffers
+
+    def iter_content_impl(self, chunk_size=1):
+        return self.iter_chunks(self.buffers, chunk_size)
+
+
+def legacy_iter_content(buffers, chunk_size):
+    downloadeddata = b""
+    for buff in buffers:
+        if chunk_size:
+            downloadeddata += buff
+            while len(downloadeddata) > chunk_size:
+                yield downloadeddata[:chunk_size]
+                downloadeddata = downloadeddata[chunk_size:]
+        else:
+            yield buff
+    while len(downloadeddata):
+        yield downloadeddata[:chunk_size]
+        downloadeddata = downloadeddata[chunk_size:]
+
+
+def legacy_iter_lines(chunks, delimiter=None):
+    pending = None
+    for chunk in chunks:
+        if pending is not None:
+            chunk = pending + chunk
+        if delimiter:
+            lines = chunk.split(delimiter)
+        else:
+            lines = chunk.splitlines()
+        if lines and lines[-1] and chunk and lines[-1][-1] == chunk[-1]:
+            pending = lines.pop()
+        else:
+            pending = None
+        yield from lines
+    if pending is not None:
+        yield pending
+
+
+def legacy_decode(chunks, charset="utf8"):
+    return BenchResponse([]).stream_decode_response_unicode(chunks)
+
+
+def split(data: bytes, size):
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+def bench(name, legacy, current):
+    t = time.perf_counter()
+    r1 = legacy()
+    t1 = time.perf_counter() - t
+    t = time.perf_counter()
+    r2 = current()
+    t2 = time.perf_counter() - t
+    if r1 != r2:
+        print("{:<28} result mismatch: {} != {}".format(name, r1, r2))
+    print(
+        "{:<28} legacy {:>8.1f} ms   current {:>8.1f} ms   x{:.1f}".format(
+            name, t1 * 1000, t2 * 1000, t1 / max(t2, 1e-9)
+        )
+    )
+
+
+size = args.size * 1024 * 1024
+buffersize = args.buffer * 1024
+
+body = os.urandom(size)
+buffers = split(body, buffersize)
+bench(
+    "content {}MB".format(args.size),
+    lambda: len(b"".join(legacy_iter_content(buffers, CONTENT_CHUNK_SIZE))),
+    lambda: len(BenchResponse(buffers).content),
+)
+
+longlines = (b"x" * (1024 * 1024) + b"\n") * args.size
+buffers = split(longlines, buffersize)
+bench(
+    "iter_lines 1MB lines",
+    lambda: sum(
+        map(len, legacy_iter_lines(legacy_iter_content(buffers, ITER_CHUNK_SIZE)))
+    ),
+    lambda: sum(map(len, BenchResponse(buffers).iter_lines())),
+)
+
+shortlines = b"".join(
+    "{} {}\n".format(i, "y" * (i % 80)).encode() for i in range(size // 48)
+)
+buffers = split(shortlines, buffersize)
+bench(
+    "iter_lines short lines",
+    lambda: len(list(legacy_iter_lines(legacy_iter_content(buffers, ITER_CHUNK_SIZE)))),
+    lambda: len(list(BenchResponse(buffers).iter_lines())),
+)
+
+events = [
+    (
+        "data: "
+        + json.dumps(
+            {"choices": [{"delta": {"content": "翻译结果的第{}段".format(i)}}]},
+            ensure_ascii=False,
+        )
+        + "\n\n"
+    ).encode("utf8")
+    for i in range(args.events)
+]
+bench(
+    "sse {} events".format(args.events),
+    lambda: len(
+        [
+            _
+            for _ in legacy_iter_lines(
+                legacy_decode(legacy_iter_content(events, ITER_CHUNK_SIZE))
+            )
+            if _.strip()
+        ]
+    ),
+    lambda: len(
+        [_ for _ in BenchResponse(events).iter_lines(decode_unicode=True) if _.strip()]
+    ),
+)
+
+# 第一个SSE事件要等到网络层又交出多少个事件之后才能被解析出来
+def consumed_before_first_line(make_lines):
+    consumed = [0]
+
+    def feed():
+        for event in events:
+            consumed[0] += 1
+            yield event
+
+    next(_ for _ in make_lines(feed()) if _.strip())
+    return consumed[0]
+
+
+print(
+    "{:<28} legacy {:>8}      current {:>8}".format(
+        "sse events read before 1st",
+        consumed_before_first_line(
+            lambda buffers: legacy_iter_lines(
+                legacy_decode(legacy_iter_content(buffers, ITER_CHUNK_SIZE))
+            )
+        ),
+        consumed_before_first_line(
+            lambda buffers: BenchResponse(buffers).iter_lines(decode_unicode=True)
+        ),
+    )
+)
@@ -0,0 +1,125 @@
+# 翻译缓存（cache/<翻译器>.sqlite）的基准测试，不需要真实的缓存文件。
+# 生成一个旧版的缓存（没有索引），对比旧的方式（每次查询全表扫描，每次写入DELETE+INSERT各自提交）
+# 和longtermcache（迁移后走唯一索引，写入合并到一个事务中），并检查查询结果相同。
+# 在src目录下运行：
+# python scripts/bench_transcache.py
+# python scripts/bench_transcache.py --rows 200000 --lookups 5000 --writes 5000
+import os, sys, time, random, shutil, sqlite3, argparse, tempfile
+
+rootDir = os.path.dirname(__file__)
+if not rootDir:
+    rootDir = os.path.abspath(".")
+else:
+    rootDir = os.path.abspath(rootDir)
+sys.path.insert(0, os.path.abspath(os.path.join(rootDir, "../LunaTranslator")))
+
+import gobject
+from myutils.transcache import longtermcache
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--rows", type=int, default=20000)
+parser.add_argument("--lookups", type=int, default=500)
+parser.add_argument("--writes", type=int, default=500)
+args = parser.parse_args()
+
+# 语言代码的两种组合：srclang_1/tgtlang_1 和 srclang/tgtlang
+pairs = (("ja", "zh"), ("auto", "zh"))
+
+
+def bench(name, legacy, current):
+    t = time.perf_counter()
+    r1 = legacy()
+    t1 = time.perf_counter() - t
+    t = time.perf_counter()
+    r2 = current()
+    t2 = time.perf_counter() - t
+    if r1 != r2:
+        print("{:<30} result mismatch".format(name))
+    print(
+        "{:<30} legacy {:>9.1f} ms   current {:>9.1f} ms   x{:.1f}".format(
+            name, t1 * 1000, t2 * 1000, t1 / max(t2, 1e-9)
+        )
+    )
+
+
+def legacy_get(sql, src):
+    ret = sql.execute(
+        "SELECT trans FROM cache WHERE (( (srclang=? and tgtlang=?) or  (srclang=? and tgtlang=?)) and source=?)",
+        (pairs[0][0], pairs[0][1], pairs[1][0], pairs[1][1], src),
+    ).fetchone()
+    if ret:
+        return ret[0]
+    return None
+
+
+def legacy_put(sql, src, trans):
+    sql.execute(
+        "DELETE from cache WHERE (srclang=? and tgtlang=? and source=?)",
+        (pairs[0][0], pairs[0][1], src),
+    )
+    sql.execute(
+        "INSERT into cache VALUES(?,?,?,?)", (pairs[0][0], pairs[0][1], src, trans)
+    )
+
+
+def legacy_puts(sql, writes):
+    for src, trans in writes:
+        legacy_put(sql, src, trans)
+
+
+def current_put(cache: longtermcache, writes):
+    for src, trans in writes:
+        cache.put(pairs[0][0], pairs[0][1], src, trans)
+    cache.end()
+    while cache.writeonce():
+        pass
+
+
+rnd = random.Random(0)
+kana = "あいうえおかきくけこさしすせそたちつてとなにぬねのはひふへほまみむめもやゆよらりるれろわをん"
+
+
+def randomline():
+    return "".join(rnd.choice(kana) for _ in range(rnd.randint(10, 40)))
+
+
+tmp = tempfile.mkdtemp()
+legacy_db = os.path.join(tmp, "legacy.sqlite")
+current_db = os.path.join(tmp, "current.sqlite")
+sources = list(set(randomline() for _ in range(args.rows)))
+conn = sqlite3.connect(legacy_db)
+conn.execute("CREATE TABLE cache(srclang,tgtlang,source,trans);")
+conn.executemany(
+    "INSERT into cache VALUES(?,?,?,?)",
+    (pairs[i % 2] + (src, "翻訳" + src) for i, src in enumerate(sources)),
+)
+conn.commit()
+conn.close()
+shutil.copy(legacy_db, current_db)
+print("{} rows, {:.1f} MB".format(len(sources), os.path.getsize(legacy_db) / 1024 / 1024))
+
+legacy = sqlite3.connect(legacy_db, check_same_thread=False, isolation_level=None)
+t = time.perf_counter()
+current = longtermcache(current_db)
+print("migrated in {:.1f} ms".format((time.perf_counter() - t) * 1000))
+
+# 一半命中，一半不在缓存中
+lookups = [
+    rnd.choice(sources) if i % 2 else randomline() for i in range(args.lookups)
+]
+bench(
+    "lookup x{}".format(len(lookups)),
+    lambda: [legacy_get(legacy, src) for src in lookups],
+    lambda: [current.get(src, *pairs) for src in lookups],
+)
+writes = [(randomline(), "翻訳") for _ in range(args.writes)]
+bench(
+    "write x{}".format(len(writes)),
+    lambda: legacy_puts(legacy, writes),
+    lambda: current_put(current, writes),
+)
+bench(
+    "lookup written x{}".format(len(writes)),
+    lambda: [legacy_get(legacy, src) for src, _ in writes],
+    lambda: [current.get(src, *pairs) for src, _ in writes],
+)
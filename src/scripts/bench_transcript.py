@@ -0,0 +1,132 @@
+# 翻译记录（0_*.sqlite中的artificialtrans表）写入的基准测试，不需要真实的记录文件。
+# 在已有若干行的旧版记录文件（没有索引）上重放一段文本，每行之后有几个翻译器的结果，
+# 对比旧的写入方式（每个任务先SELECT再INSERT/UPDATE，各自提交）和现在的sqlitethread
+# （source索引、WAL、合并到事务中、同一句的翻译结果合并为一次更新），并检查写入的内容相同。
+# 所有任务一次性排队，是事务合并最有利的情况；逐行到达时每个事务合并的任务较少，但查询走索引的收益不变。
+# 在src目录下运行：
+# python scripts/bench_transcript.py
+# python scripts/bench_transcript.py --rows 100000 --lines 5000 --engines 5
+import os, sys, time, json, queue, random, shutil, sqlite3, argparse, tempfile
+
+rootDir = os.path.dirname(__file__)
+if not rootDir:
+    rootDir = os.path.abspath(".")
+else:
+    rootDir = os.path.abspath(rootDir)
+sys.path.insert(0, os.path.abspath(os.path.join(rootDir, "../LunaTranslator")))
+
+import gobject
+from textsource.textsourcebase import basetext
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--rows", type=int, default=20000, help="记录文件中已有的行数")
+parser.add_argument("--lines", type=int, default=1000, help="重放的行数")
+parser.add_argument("--engines", type=int, default=3, help="每行的翻译结果数")
+args = parser.parse_args()
+
+
+def legacy_write(sql: sqlite3.Connection, tasks):
+    for task in tasks:
+        if len(task) == 2:
+            src, origin = task
+            ret = sql.execute(
+                "SELECT * FROM artificialtrans WHERE source = ?", (src,)
+            ).fetchone()
+            if ret is None:
+                sql.execute(
+                    "INSERT INTO artificialtrans VALUES(NULL,?,?,?);",
+                    (src, json.dumps({}), origin),
+                )
+        elif len(task) == 3:
+            src, clsname, trans = task
+            ret = sql.execute(
+                "SELECT machineTrans FROM artificialtrans WHERE source = ?",
+                (src,),
+            ).fetchone()
+            ret = json.loads((ret[0]))
+            ret[clsname] = trans
+            ret = json.dumps(ret, ensure_ascii=False)
+            sql.execute(
+                "UPDATE artificialtrans SET machineTrans = ? WHERE source = ?",
+                (ret, src),
+            )
+
+
+def current_write(db, tasks):
+    text = basetext.__new__(basetext)
+    text.ending = False
+    sql = sqlite3.connect(db, check_same_thread=False, isolation_level=None)
+    sql.execute("PRAGMA journal_mode=WAL;")
+    sql.execute("PRAGMA synchronous=NORMAL;")
+    text.sqlhasorigin = True
+    text.migratesql(sql)
+    sqlqueue = queue.Queue()
+    for task in tasks:
+        sqlqueue.put(task)
+    sqlqueue.put(None)
+    text.sqlitethread(sqlqueue, sql)
+    sql.close()
+
+
+def rows(db):
+    conn = sqlite3.connect(db)
+    try:
+        return conn.execute(
+            "SELECT source,machineTrans,origin FROM artificialtrans ORDER BY id"
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+rnd = random.Random(0)
+kana = "あいうえおかきくけこさしすせそたちつてとなにぬねのはひふへほまみむめもやゆよらりるれろわをん"
+
+
+def randomline():
+    return "".join(rnd.choice(kana) for _ in range(rnd.randint(10, 40)))
+
+
+tmp = tempfile.mkdtemp()
+legacy_db = os.path.join(tmp, "legacy.sqlite")
+current_db = os.path.join(tmp, "current.sqlite")
+conn = sqlite3.connect(legacy_db)
+conn.execute(
+    "CREATE TABLE artificialtrans(id INTEGER PRIMARY KEY AUTOINCREMENT,source TEXT,machineTrans TEXT,origin TEXT);"
+)
+existing = [randomline() for _ in range(args.rows)]
+conn.executemany(
+    "INSERT INTO artificialtrans VALUES(NULL,?,?,?);",
+    ((src, json.dumps({"premt": "x"}), src) for src in existing),
+)
+conn.commit()
+conn.close()
+shutil.copy(legacy_db, current_db)
+
+# 大约十分之一的行是重复出现的
+tasks = []
+for i in range(args.lines):
+    src = rnd.choice(existing) if i % 10 == 0 else randomline()
+    tasks.append((src, src))
+    for e in range(args.engines):
+        tasks.append((src, "engine{}".format(e), "翻訳{}{}".format(e, i)))
+print(
+    "{} rows, replaying {} lines x {} engines ({} tasks)".format(
+        args.rows, args.lines, args.engines, len(tasks)
+    )
+)
+
+legacy = sqlite3.connect(legacy_db, isolation_level=None)
+t = time.perf_counter()
+legacy_write(legacy, tasks)
+t1 = time.perf_counter() - t
+legacy.close()
+t = time.perf_counter()
+current_write(current_db, tasks)
+t2 = time.perf_counter() - t
+if rows(legacy_db) != rows(current_db):
+    print("content mismatch")
+print(
+    "{:<30} legacy {:>9.1f} ms   current {:>9.1f} ms   x{:.1f}".format(
+        "replay", t1 * 1000, t2 * 1000, t1 / max(t2, 1e-9)
+    )
+)
@@ -0,0 +1,73 @@
+# libcurl共用句柄池之后，同一Session中的cookie仍然在请求之间保留的检查。
+# 本地起一个http服务：/login在重定向的响应中设置cookie（只有libcurl的cookie引擎能看到），
+# /check返回收到的Cookie头。同一Session先后请求两次，第二次必须带上cookie；
+# 另一个Session取到同一个句柄时不能带上。
+# 在src目录下运行：
+# python scripts/check_curl_cookies.py
+import os, sys, threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+rootDir = os.path.dirname(__file__)
+if not rootDir:
+    rootDir = os.path.abspath(".")
+else:
+    rootDir = os.path.abspath(rootDir)
+sys.path.insert(0, os.path.abspath(os.path.join(rootDir, "../LunaTranslator")))
+
+import gobject
+from requests import Session
+
+
+class handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *_):
+        pass
+
+    def reply(self, code, body: bytes, headers=()):
+        self.send_response(code)
+        for k, v in headers:
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/login":
+            self.reply(
+                302, b"", [("Set-Cookie", "sid=abc; Path=/"), ("Location", "/home")]
+            )
+        elif self.path == "/home":
+            self.reply(200, b"home")
+        else:
+            self.reply(200, self.headers.get("Cookie", "").encode("utf8"))
+
+
+class threadingserver(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+server = threadingserver(("127.0.0.1", 0), handler)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+base = "http://127.0.0.1:{}".format(server.server_address[1])
+
+
+def session():
+    s = Session()
+    s.requester_idx = 1
+    return s
+
+
+s1 = session()
+assert s1.get(base + "/login").text == "home"
+got = s1.get(base + "/check").text
+assert "sid=abc" in got, "cookie lost between requests: {!r}".format(got)
+print("{:<28} ok, {}".format("same session", got))
+s2 = session()
+got = s2.get(base + "/check").text
+assert "sid=abc" not in got, "cookie leaked to another session: {!r}".format(got)
+print("{:<28} ok, {!r}".format("other session", got))
+got = s1.get(base + "/check").text
+assert "sid=abc" in got, "cookie lost after another session used the handle"
+print("{:<28} ok, {}".format("same session again", got))
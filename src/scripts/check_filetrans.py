@@ -0,0 +1,198 @@
+# 文件翻译的检查，不需要启动界面和翻译器。
+# 1. 逐行读取的解析器和以前一次读入整个文件的写法，输出完全相同（包括空行、末尾换行等边界情况）。
+# 2. 整个流程：相同的行只翻译一次，未翻译的行成批交给translate_batch_and_collect，输出保持原来的顺序；
+#    重新运行时已翻译的行直接从记录文件取出，不再请求翻译器。
+# 在src目录下运行：
+# python scripts/check_filetrans.py
+import os, sys, json, time, tempfile, threading
+
+rootDir = os.path.dirname(__file__)
+if not rootDir:
+    rootDir = os.path.abspath(".")
+else:
+    rootDir = os.path.abspath(rootDir)
+sys.path.insert(0, os.path.abspath(os.path.join(rootDir, "../LunaTranslator")))
+
+import gobject
+from LunaTranslator import MAINUI
+from myutils.config import globalconfig
+from textsource.filetrans import filetrans, parsetxt, parsesrt, parsevtt, parselrc
+
+
+def translate(text):
+    return "<" + text.replace("\n", "|") + ">" if text else None
+
+
+# 以前的写法：整个文件读入后split，按下标替换
+def legacy_txt(text):
+    data = text.split("\n")
+    return "\n".join(translate(k) or k for k in data)
+
+
+def legacy_lrc(text):
+    data = text.split("\n")
+    out = []
+    for a in data:
+        ts = translate(a[a.find("]") + 1 :])
+        out.append(a[: a.find("]") + 1] + ts if ts else a)
+    return "\n".join(out)
+
+
+def legacy_srt(text):
+    if text.endswith("\n"):
+        text = text[:-1]
+    blocks = text.split("\n\n")
+    for i, k in enumerate(blocks):
+        ts = translate("\n".join(k.split("\n")[2:]))
+        if ts:
+            blocks[i] = "\n".join(k.split("\n")[:2]) + "\n" + ts
+    return "\n\n".join(blocks)
+
+
+def legacy_vtt(text):
+    lines = text.split("\n")
+    header, blocks = lines[:2], lines[2:]
+    for i in range((len(blocks) + 1) // 3):
+        ts = translate(blocks[3 * i + 1])
+        if ts:
+            blocks[3 * i + 1] = ts
+    return "\n".join(header + blocks)
+
+
+def current(klass, fn):
+    file = klass(fn)
+    with file:
+        for unit, text in file.load():
+            file.save(unit, translate(text))
+    with open(
+        os.path.join(os.path.dirname(fn), file.prefix + os.path.basename(fn)),
+        "r",
+        encoding="utf8",
+        newline="",
+    ) as ff:
+        return ff.read()
+
+
+tmp = tempfile.mkdtemp()
+samples = {
+    "txt": [
+        "",
+        "a",
+        "a\n",
+        "a\nb",
+        "a\n\nb\n",
+        "\n\n",
+        "あ\nい\nう\n\n",
+    ],
+    "lrc": ["[00:01]a\n[00:02]b\n", "[00:01]a\nno tag\n[00:03]"],
+    "srt": [
+        "",
+        "1\n00:00 --> 00:01\na\n\n2\n00:01 --> 00:02\nb\nc\n",
+        "1\nt\na\n\n\n2\nt\nb\n\n",
+        "1\nt\na\n\n\n\n2\nt\nb",
+        "\n1\nt\na\n",
+        "1\nt\na\n\n",
+    ],
+    "vtt": [
+        "WEBVTT\n\n00:00 --> 00:01\na\n\n00:01 --> 00:02\nb\n",
+        "WEBVTT\n\n00:00 --> 00:01\na\n\n00:01 --> 00:02",
+        "WEBVTT",
+        "WEBVTT\n",
+    ],
+}
+klasses = dict(txt=parsetxt, lrc=parselrc, srt=parsesrt, vtt=parsevtt)
+legacies = dict(txt=legacy_txt, lrc=legacy_lrc, srt=legacy_srt, vtt=legacy_vtt)
+for ext, texts in samples.items():
+    for i, text in enumerate(texts):
+        fn = os.path.join(tmp, "{}.{}".format(i, ext))
+        with open(fn, "w", encoding="utf8", newline="") as ff:
+            ff.write(text)
+        expect = legacies[ext](text)
+        got = current(klasses[ext], fn)
+        assert got == expect, "{} {!r}: {!r} != {!r}".format(ext, text, got, expect)
+    print("{:<28} ok, {} samples".format("parse " + ext, len(texts)))
+
+
+class _signal:
+    def __init__(self):
+        self.values = []
+
+    def emit(self, *_):
+        self.values.append(_)
+
+
+class _settin_ui:
+    progresssignal2 = _signal()
+    progresssignal3 = _signal()
+
+
+class fakebatchtranslator:
+    typename = "baidu"
+    transtype = "free"
+    onlymanual = False
+
+    def __init__(self):
+        self.batches = []
+
+    def translate_batch_and_collect(self, contents, is_auto_run=False):
+        self.batches.append(list(contents))
+        return [translate(_) for _ in contents]
+
+
+ui = MAINUI.__new__(MAINUI)
+ui.solvegottextlock = threading.Lock()
+ui.gettranslatelock = threading.Lock()
+ui.processmethods = []
+ui.gameuid = None
+ui.settin_ui = _settin_ui()
+ui.translators = {"baidu": fakebatchtranslator()}
+ui.displayinfomessage = print
+gobject.baseobject = ui
+globalconfig["fix_translate_rank_rank"] = ["baidu"]
+globalconfig["toppest_translator"] = None
+globalconfig["autorun"] = True
+globalconfig["postprocess_rank"] = []
+
+lines = ["line {}".format(i % 700) for i in range(2000)]
+fn = os.path.join(tmp, "script.txt")
+with open(fn, "w", encoding="utf8") as ff:
+    ff.write("\n".join(lines))
+# starttranslatefile用threader包装，直接取出原函数同步运行
+starttranslatefile = filetrans.starttranslatefile.__closure__[0].cell_contents
+
+
+def run():
+    ft = filetrans.__new__(filetrans)
+    ft.ending = False
+    ft.sqlqueue = None
+    ft.warmstarttranscache = lambda: None
+    ui.textsource = ft
+    t = time.perf_counter()
+    starttranslatefile(ft, fn)
+    t = time.perf_counter() - t
+    # 等记录写完再结束，endX之后没有写入的记录会被丢弃
+    while not ft.sqlqueue.empty():
+        time.sleep(0.05)
+    time.sleep(0.2)
+    ft.endX()
+    with open(os.path.join(tmp, "luna_script.txt"), "r", encoding="utf8") as ff:
+        assert ff.read() == "\n".join(translate(_) for _ in lines), "wrong output"
+    return t
+
+
+ts = ui.translators["baidu"]
+t = run()
+# 不同块之间重复的行由翻译器自己的缓存处理，这里只检查块内去重
+for batch in ts.batches:
+    assert len(batch) == len(set(batch)), "duplicate lines were translated"
+assert max(map(len, ts.batches)) > 1
+sent = sum(ts.batches, [])
+print(
+    "{:<28} ok, {} lines, {} sent in {} requests, {:.0f} ms".format(
+        "first run", len(lines), len(sent), len(ts.batches), t * 1000
+    )
+)
+ts.batches.clear()
+t = run()
+assert not ts.batches, "resumed run translated cached lines again"
+print("{:<28} ok, 0 requests, {:.0f} ms".format("resumed run", t * 1000))
@@ -0,0 +1,53 @@
+# 大模型翻译的分批检查。
+# gptcommon的批量翻译把多句以json对象一次发送，splitbatches必须把多句分到同一批，
+# 并且每批的字数按max_tokens限制，避免译文被截断。
+# 在src目录下运行：
+# python scripts/check_gpt_batches.py
+import os, sys, importlib
+
+rootDir = os.path.dirname(__file__)
+if not rootDir:
+    rootDir = os.path.abspath(".")
+else:
+    rootDir = os.path.abspath(rootDir)
+sys.path.insert(0, os.path.abspath(os.path.join(rootDir, "../LunaTranslator")))
+
+import gobject
+from myutils.config import translatorsetting
+
+typename = "chatgpt-3rd-party"
+TS = importlib.import_module("translator." + typename).TS
+ts = TS.__new__(TS)
+ts.typename = typename
+args = translatorsetting[typename]["args"]
+
+
+def check(name, max_tokens, lines):
+    args["max_tokens"] = max_tokens
+    batches = list(ts.splitbatches(lines))
+    assert sum(batches, []) == lines, "{}: lines lost or reordered".format(name)
+    for batch in batches:
+        assert len(batch) <= ts.batch_max_lines, name
+        assert (len(batch) == 1) or (
+            sum(map(len, batch)) <= ts.batch_max_chars
+        ), "{}: batch exceeds max_tokens".format(name)
+    print(
+        "{:<28} max_tokens {:>5}: {} lines -> {} batches, largest {} lines".format(
+            name, max_tokens, len(lines), len(batches), max(map(len, batches))
+        )
+    )
+    return batches
+
+
+saved = args.get("max_tokens")
+try:
+    lines = ["これは{}番目のテストの文です。".format(i) for i in range(100)]
+    batches = check("default", 1024, lines)
+    assert max(map(len, batches)) > 1, "gpt batches hold a single line"
+    batches = check("large max_tokens", 100000, lines)
+    assert max(map(len, batches)) == ts.batch_max_lines
+    batches = check("small max_tokens", 16, lines)
+    assert max(map(len, batches)) == 1
+    check("long line", 64, ["あ" * 100, "い", "う"])
+finally:
+    args["max_tokens"] = saved
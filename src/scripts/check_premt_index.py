@@ -0,0 +1,41 @@
+# 预翻译模糊匹配的二元组索引的检查。
+# 相似度刚好等于阈值的句子（例如10个字的句子差1个字、阈值90）必须进入候选，
+# 以前用浮点数计算允许的编辑距离，(1-0.9)*10向下取整为0，这样的句子会被提前排除。
+# 在src目录下运行：
+# python scripts/check_premt_index.py
+import os, sys, sqlite3
+
+rootDir = os.path.dirname(__file__)
+if not rootDir:
+    rootDir = os.path.abspath(".")
+else:
+    rootDir = os.path.abspath(rootDir)
+sys.path.insert(0, os.path.abspath(os.path.join(rootDir, "../LunaTranslator")))
+
+import gobject
+from translator.premt import fuzzyindex
+
+
+def check(name, source, query, simi, expect=True):
+    sql = sqlite3.connect(":memory:")
+    sql.execute(
+        "CREATE TABLE artificialtrans(id INTEGER PRIMARY KEY AUTOINCREMENT, source TEXT, machineTrans TEXT)"
+    )
+    sql.execute(
+        "INSERT INTO artificialtrans (source, machineTrans) VALUES (?, ?)",
+        (source, "{}"),
+    )
+    index = fuzzyindex(sql)
+    index.update()
+    found = any(index.sources[rowid] == source for _, rowid in index.candidates(query, simi))
+    assert found == expect, "{}: {!r} / {!r} at {}".format(name, source, query, simi)
+    print("{:<36} ok".format(name))
+
+
+check("10 chars, 1 substitution, 90", "あいうえおかきくけこ", "あいうえおかきくけさ", 90)
+check("10 chars, 1 deletion, 90", "あいうえおかきくけこ", "あいうえおかきくけ", 90)
+check("10 chars, 1 insertion, 90", "あいうえおかきくけ", "あいうえおかきくけこ", 90)
+check("5 chars, 1 substitution, 80", "あいうえお", "あいうえか", 80)
+check("5 chars, 1 deletion, 80", "あいうえお", "あいうえ", 80)
+check("10 chars, 2 substitutions, 90", "あいうえおかきくけこ", "さいうえおかきくけし", 90, False)
+check("5 chars, 2 substitutions, 80", "あいうえお", "さいうえし", 80, False)
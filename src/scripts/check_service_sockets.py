@@ -0,0 +1,115 @@
+# 检查内置http服务释放连接，以及websocket升级后不丢失已经读入的数据。
+# 对非保持连接、处理出错和404的请求各发若干次，检查服务端没有留下打开的文件描述符（只在linux上检查），
+# 然后发送升级请求时把第一个websocket帧和升级请求放在同一个数据包里，检查能收到回显。
+# 在src目录下运行：
+# python scripts/check_service_sockets.py
+import os, sys, time, socket, struct, base64
+
+rootDir = os.path.dirname(__file__)
+if not rootDir:
+    rootDir = os.path.abspath(".")
+else:
+    rootDir = os.path.abspath(rootDir)
+sys.path.insert(0, os.path.abspath(os.path.join(rootDir, "../LunaTranslator")))
+
+import gobject
+from services.tcpservice import TCPService, HTTPHandler, WSHandler, RequestInfo
+
+# 服务端先关闭的连接会留在TIME_WAIT中，固定端口连续运行时可能无法绑定
+_ = socket.socket()
+_.bind(("127.0.0.1", 0))
+PORT = _.getsockname()[1]
+_.close()
+
+
+class Echo(HTTPHandler):
+    path = "/echo"
+
+    def parse(self, _: RequestInfo):
+        text = _.query.get("text")
+        if not text:
+            raise Exception("")
+        return dict(result=text)
+
+
+class EchoWS(WSHandler):
+    path = "/ws"
+
+    def onmessage(self, message: str):
+        self.send_text(message)
+
+
+def countfds():
+    if not os.path.isdir("/proc/self/fd"):
+        return None
+    return len(os.listdir("/proc/self/fd"))
+
+
+def request(path, close=True):
+    sock = socket.create_connection(("127.0.0.1", PORT), timeout=10)
+    sock.sendall(
+        "GET {} HTTP/1.1\r\nHost: 127.0.0.1\r\n{}\r\n".format(
+            path, "Connection: close\r\n" if close else ""
+        ).encode()
+    )
+    data = b""
+    while True:
+        get = sock.recv(65536)
+        if not get:
+            break
+        data += get
+    sock.close()
+    return data.split(b"\r\n", 1)[0]
+
+
+def clientframe(text: str):
+    payload = text.encode("utf8")
+    key = os.urandom(4)
+    masked = bytes(b ^ key[i % 4] for i, b in enumerate(payload))
+    assert len(payload) < 126
+    return struct.pack("!BB", 0x81, 0x80 | len(payload)) + key + masked
+
+
+service = TCPService()
+service.register(Echo)
+service.register(EchoWS)
+service.init(PORT)
+time.sleep(0.3)
+
+before = countfds()
+for path in ["/echo?text=abc", "/echo", "/notfound"] * 50:
+    status = request(path)
+    assert status.startswith(b"HTTP/1.1"), status
+# 连接由线程池中的线程关闭，稍等一下
+time.sleep(0.5)
+after = countfds()
+if before is not None:
+    print("open fds before {} after {}".format(before, after))
+    assert after - before < 5, "sockets leaked"
+
+sock = socket.create_connection(("127.0.0.1", PORT), timeout=10)
+key = base64.b64encode(os.urandom(16)).decode()
+sock.sendall(
+    (
+        "GET /ws HTTP/1.1\r\nHost: 127.0.0.1\r\nUpgrade: websocket\r\n"
+        "Connection: Upgrade\r\nSec-WebSocket-Key: {}\r\n"
+        "Sec-WebSocket-Version: 13\r\n\r\n"
+    )
+    .format(key)
+    .encode()
+    + clientframe("pipelined")
+)
+data = b""
+while b"pipelined" not in data:
+    try:
+        get = sock.recv(65536)
+    except socket.timeout:
+        break
+    if not get:
+        break
+    data += get
+sock.close()
+assert data.startswith(b"HTTP/1.1 101"), data[:40]
+assert b"pipelined" in data, "frame sent with the upgrade request was lost"
+print("ok")
+os._exit(0)
@@ -0,0 +1,105 @@
+# /api/translate/stream 的结束检查。
+# 不启动界面和翻译器，直接用MAINUI.GetTranslationCallback模拟几个翻译器的回调顺序
+# （流式输出、出错、结果为空、多个翻译器交错），检查APITranslateStream输出的生成器都会结束，
+# 不会一直占用http线程池的线程。
+# 在src目录下运行：
+# python scripts/check_translate_stream.py
+import os, sys, queue, functools, threading
+
+rootDir = os.path.dirname(__file__)
+if not rootDir:
+    rootDir = os.path.abspath(".")
+else:
+    rootDir = os.path.abspath(rootDir)
+sys.path.insert(0, os.path.abspath(os.path.join(rootDir, "../LunaTranslator")))
+
+import gobject
+from LunaTranslator import MAINUI
+from services.servicecollection import APITranslateStream, _END
+from myutils.config import globalconfig
+
+# 正常启动时由LunaTranslator_main设置
+globalconfig.setdefault("languageuse2", "en")
+
+
+class _signal:
+    def emit(self, *_):
+        pass
+
+
+class _transhis:
+    getnewtranssignal = _signal()
+
+
+def fakemainui():
+    ui = MAINUI.__new__(MAINUI)
+    ui.gettranslatelock = threading.Lock()
+    ui.currentsignature = None
+    ui.currenttranslate = ""
+    ui.refresh_on_get_trans_signature = None
+    ui.transhis = _transhis()
+    ui.solveaftertrans = lambda res, _: res
+    return ui
+
+
+def run(name, engines, events):
+    # events: [(engine, res, iter_res_status, iserror)]
+    ui = fakemainui()
+    ret = queue.Queue()
+    usefultranslators = list(engines)
+    callbacks = {
+        engine: functools.partial(
+            ui.GetTranslationCallback,
+            usefultranslators,
+            ret.put,
+            engine,
+            object(),
+            [],
+            None,
+            "",
+            [],
+            ret.put,
+            functools.partial(ret.put, _END),
+        )
+        for engine in engines
+    }
+    handler = APITranslateStream.__new__(APITranslateStream)
+    output = []
+
+    def consume():
+        for _ in handler.iterhelper(ret):
+            output.append(_)
+
+    t = threading.Thread(target=consume, daemon=True)
+    t.start()
+    for engine, res, status, iserror in events:
+        callbacks[engine](res, status, iserror)
+    t.join(5)
+    assert not t.is_alive(), "{}: stream did not terminate".format(name)
+    assert ret.empty(), "{}: items after the end".format(name)
+    print("{:<28} ok, {} events".format(name, len(output)))
+    return output
+
+
+# 翻译器的名字要从配置中读取，所以用几个内置翻译器
+a, b, c = "baidu", "bing", "microsoft"
+run("single", [a], [(a, "x", 0, False)])
+out = run(
+    "streaming",
+    [a],
+    [(a, "x", 1, False), (a, "xy", 1, False), (a, "xyz", 2, False)],
+)
+assert [_["status"] for _ in out] == [1, 1, 2]
+run("error", [a], [(a, "boom", 0, True)])
+run("empty result", [a], [(a, "", 0, False)])
+out = run(
+    "interleaved",
+    [a, b, c],
+    [
+        (a, "x", 1, False),
+        (b, "boom", 0, True),
+        (a, "xy", 2, False),
+        (c, "", 0, False),
+    ],
+)
+assert [_.get("status") for _ in out] == [1, None, 2]
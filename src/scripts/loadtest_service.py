@@ -0,0 +1,114 @@
+# 内置http服务的压力测试。
+# 启动一个只注册了替身/api/translate的TCPService（按给定延迟返回反转的文本），
+# 用多个客户端并发请求，输出吞吐量、延迟分布和服务端的统计。
+# python scripts/loadtest_service.py --clients 32 --requests 200 --latency 5
+# python scripts/loadtest_service.py --no-keepalive
+import os, sys, time, json, argparse, threading
+import http.client
+from urllib.parse import quote
+
+rootDir = os.path.dirname(__file__)
+if not rootDir:
+    rootDir = os.path.abspath(".")
+else:
+    rootDir = os.path.abspath(rootDir)
+sys.path.insert(0, os.path.abspath(os.path.join(rootDir, "../LunaTranslator")))
+
+from services.tcpservice import TCPService, HTTPHandler, RequestInfo
+from myutils.wrapper import threadpool
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--port", type=int, default=2334)
+parser.add_argument("--clients", type=int, default=32)
+parser.add_argument("--requests", type=int, default=200)
+parser.add_argument("--latency", type=float, default=5, help="ms")
+parser.add_argument("--no-keepalive", action="store_true")
+args = parser.parse_args()
+
+
+class APITranslate(HTTPHandler):
+    path = "/api/translate"
+
+    def parse(self, _: RequestInfo):
+        text = _.query.get("text")
+        if not text:
+            raise Exception("")
+        time.sleep(args.latency / 1000)
+        return dict(id="standin", name="standin", result=text[::-1])
+
+
+service = TCPService()
+service.register(APITranslate)
+service.init(args.port)
+time.sleep(0.5)
+
+latencies = []
+errors = [0]
+lock = threading.Lock()
+
+
+def client(idx):
+    conn = None
+    _latencies = []
+    for i in range(args.requests):
+        if conn is None:
+            conn = http.client.HTTPConnection("127.0.0.1", args.port, timeout=30)
+        headers = {"Connection": "close"} if args.no_keepalive else {}
+        t = time.perf_counter()
+        try:
+            conn.request(
+                "GET",
+                "/api/translate?text=" + quote("テキスト{}-{}".format(idx, i)),
+                headers=headers,
+            )
+            resp = conn.getresponse()
+            body = resp.read()
+            json.loads(body)
+            if resp.status != 200:
+                raise Exception(resp.status)
+        except:
+            with lock:
+                errors[0] += 1
+            conn.close()
+            conn = None
+            continue
+        _latencies.append(time.perf_counter() - t)
+        if args.no_keepalive or resp.getheader("Connection", "").lower() == "close":
+            conn.close()
+            conn = None
+    if conn:
+        conn.close()
+    with lock:
+        latencies.extend(_latencies)
+
+
+t = time.perf_counter()
+threads = [threading.Thread(target=client, args=(_,)) for _ in range(args.clients)]
+for _ in threads:
+    _.start()
+for _ in threads:
+    _.join()
+cost = time.perf_counter() - t
+
+latencies.sort()
+
+
+def percentile(p):
+    if not latencies:
+        return 0
+    return 1000 * latencies[min(len(latencies) - 1, int(len(latencies) * p))]
+
+
+print(
+    "{} requests, {} errors, {:.2f}s, {:.1f} req/s".format(
+        len(latencies), errors[0], cost, len(latencies) / cost
+    )
+)
+print(
+    "latency ms p50 {:.2f} p95 {:.2f} p99 {:.2f} max {:.2f}".format(
+        percentile(0.5), percentile(0.95), percentile(0.99), percentile(1)
+    )
+)
+print(json.dumps(service.stats(), indent=4))
+print(json.dumps(threadpool.allstats(), indent=4))
+os._exit(0)